@@ -1,4 +1,3 @@
-import requests
 from requests.exceptions import HTTPError
 import urllib3
 from yaml import load as yload
@@ -6,6 +5,8 @@ from yaml import FullLoader
 import os
 import itertools
 
+from fimutil.common.http_client import HttpClient
+
 urllib3.disable_warnings()
 
 def to_ranges(iterable):
@@ -54,6 +55,7 @@ class Al2sClient:
             self.config = config
         self.api_base_url = self.config['api_base_url']
         self.api_access_key = self.config['api_access_key']
+        self.http = HttpClient(name='AL2S', verify=False)
         self._auth = self.bearer_token
         self._retries = 0
 
@@ -95,7 +97,7 @@ class Al2sClient:
                "content_type": "application/json"}
         url = f"{self.api_base_url}{self.ENDPOINT_SESSIONS_ACCESS}"
         try:
-            access_response = requests.post(url, headers=hdr, verify=False)
+            access_response = self.http.request('POST', url, headers=hdr)
             access_response.raise_for_status()
         except HTTPError as http_err:
             raise Al2sAmVNError(f"POST: {url}: {http_err}")
@@ -110,7 +112,7 @@ class Al2sClient:
                "content_type": "application/json"}
         url = f"{self.api_base_url}/v1/sessions/refresh"
         try:
-            refresh_response = requests.get(url, headers=hdr, verify=False)
+            refresh_response = self.http.get(url, headers=hdr)
             access_response.raise_for_status()
         except HTTPError as http_err:
             raise Al2sAmVNError(f"POST: {url}: {http_err}")
@@ -146,7 +148,7 @@ class Al2sClient:
                "Authorization": f"{self._auth}"}
         url = f"{self.api_base_url}{self.ENDPOINT_FOOTPRINT_CLOUDCONNECT}"
         try:
-            list_response = requests.get(url, headers=hdr, verify=False)
+            list_response = self.http.get(url, headers=hdr)
             list_response.raise_for_status()
         except HTTPError as http_err:
             if list_response.status_code == 403:
@@ -184,7 +186,7 @@ class Al2sClient:
                "Authorization": f"{self._auth}"}
         url = f"{self.api_base_url}{self.ENDPOINT_FOOTPRINT_MYINTERFACES}"
         try:
-            list_response = requests.get(url, headers=hdr, verify=False)
+            list_response = self.http.get(url, headers=hdr)
             list_response.raise_for_status()
         except HTTPError as http_err:
             if list_response.status_code == 403:
@@ -223,7 +225,7 @@ class Al2sClient:
                "Authorization": f"{self._auth}"}
         url = f"{self.api_base_url}{self.ENDPOINT_VIRTUALNETWORKS_INTERFACES}/{interface_id}/availability"
         try:
-            retrieve_response = requests.get(url, headers=hdr, verify=False)
+            retrieve_response = self.http.get(url, headers=hdr)
             retrieve_response.raise_for_status()
         except HTTPError as http_err:
             if retrieve_response.status_code == 403:
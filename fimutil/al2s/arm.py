@@ -6,6 +6,7 @@ from fim.slivers.network_service import ServiceType
 
 from fimutil.al2s.al2s_api import Al2sClient
 from fimutil.al2s.cloud_cfg import REGION_NAME_MAP
+from fimutil.common.model_output import write_model
 from yaml import load as yload
 from yaml import FullLoader
 import logging
@@ -163,10 +164,14 @@ class Al2sARM:
                                         label_pools=f.Pools(atype=f.DelegationType.LABEL),
                                         capacity_pools=f.Pools(atype=f.DelegationType.CAPACITY))
 
-    def write_topology(self, file_name: str) -> None:
+    def write_topology(self, file_name: str, skip_unchanged: bool = False) -> bool:
+        """
+        Save the model, returns False if skip_unchanged found it unchanged since the last save
+        """
         if not self.topology:
             raise Al2sAmArmError("Topology is None")
-        self.topology.serialize(file_name=file_name)
+        # compressed if file_name ends with .gz or .zst
+        return write_model(self.topology, file_name, skip_unchanged=skip_unchanged)
 
     def get_config(self, config_file):
         if not config_file:
@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict
+
+
+class Hedger:
+    """
+    Hedged calls - if a call has not completed within the given percentile of recently
+    observed latencies since it started running, a duplicate is started and whichever
+    finishes first wins.
+    Hedges are capped at budget (a fraction of all calls), and are only issued
+    once min_samples latencies have been observed. The losing call is left to
+    finish in the background, its result is discarded.
+    """
+    def __init__(self, *, percentile: float = 0.95, budget: float = 0.05, min_samples: int = 20,
+                 window: int = 500, max_workers: int = 8):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.time_saved = 0.0
+
+    def threshold(self) -> float or None:
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+    def _timed(self, fn: Callable, *args, started: threading.Event = None):
+        start = time.monotonic()
+        if started is not None:
+            started.set()
+        try:
+            return fn(*args)
+        finally:
+            with self.lock:
+                self.latencies.append(time.monotonic() - start)
+
+    def call(self, fn: Callable, *args):
+        """
+        Call fn(*args), hedging it if it is slow, and return the first successful
+        result (or raise the exception of the last call to fail)
+        """
+        with self.lock:
+            self.calls += 1
+        threshold = self.threshold()
+        started = threading.Event()
+        primary = self.executor.submit(self._timed, fn, *args, started=started)
+        if threshold is None:
+            return primary.result()
+        # time the call from when it starts running - a call queued behind busy workers is not slow
+        # yet, and a hedge would only queue behind it
+        started.wait()
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+        with self.lock:
+            if self.hedges + 1 > self.budget * self.calls:
+                hedge = None
+            else:
+                self.hedges += 1
+                hedge = self.executor.submit(self._timed, fn, *args)
+        if hedge is None:
+            return primary.result()
+        logging.debug(f'Hedging call after {threshold:.3f}s')
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is not None:
+                    error = f.exception()
+                    continue
+                if f is hedge and primary in pending:
+                    won_at = time.monotonic()
+                    with self.lock:
+                        self.hedge_wins += 1
+                    primary.add_done_callback(lambda _: self._add_saved(time.monotonic() - won_at))
+                return f.result()
+        raise error
+
+    def _add_saved(self, saved: float):
+        with self.lock:
+            self.time_saved += saved
+
+    def to_json(self) -> Dict:
+        with self.lock:
+            return {'calls': self.calls, 'hedges': self.hedges, 'hedge_wins': self.hedge_wins,
+                    'time_saved': round(self.time_saved, 3)}
+
+    def __str__(self):
+        s = self.to_json()
+        return (f"{s['hedges']} hedged of {s['calls']} calls, {s['hedge_wins']} won by the hedge, "
+                f"{s['time_saved']:.3f}s of tail latency saved")
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import urllib3
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class HttpMetrics:
+    """
+    Thread-safe counters of requests made through one HttpClient
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_received = 0
+        self.wire_bytes = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, *, elapsed: float, nbytes: int = 0, wire_bytes: int = 0, retries: int = 0,
+               error: bool = False):
+        with self.lock:
+            self.requests += 1
+            self.retries += retries
+            self.bytes_received += nbytes
+            self.wire_bytes += wire_bytes
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+            if error:
+                self.errors += 1
+
+    def to_json(self) -> Dict:
+        with self.lock:
+            return {'requests': self.requests, 'errors': self.errors, 'retries': self.retries,
+                    'bytes_received': self.bytes_received, 'wire_bytes': self.wire_bytes, 'total_time': round(self.total_time, 3),
+                    'max_time': round(self.max_time, 3)}
+
+    def __str__(self):
+        m = self.to_json()
+        avg = m['total_time'] / m['requests'] if m['requests'] else 0.0
+        return (f"{m['requests']} requests ({m['errors']} failed, {m['retries']} retries), "
+                f"{m['bytes_received']} bytes ({m['wire_bytes']} on the wire), avg {avg:.3f}s, max {m['max_time']:.3f}s")
+
+
+class HttpClient:
+    """
+    HTTP client shared by the Ralph, NSO, SR-PCE and AL2S clients - one pooled
+    requests session per backend with timeouts, retries of idempotent requests on
+    connection errors and 429/502/503/504 responses, an optional limit on requests in flight
+    and metrics. Calls are synchronous; the a* variants run them on asyncio's
+    thread pool so many requests can be awaited together.
+    With http2 (requires httpx[http2]) requests that are not streamed go through an
+    httpx client instead, which multiplexes concurrent requests over a single
+    connection to servers that negotiate HTTP/2 (and uses HTTP/1.1 with the others).
+    """
+    RETRY_STATUSES = (429, 502, 503, 504)
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+    def __init__(self, *, name: str, auth=None, headers: Dict = None, verify: bool = True,
+                 timeout: Tuple[float, float] = (10, 300), retries: int = 3, backoff: float = 0.5,
+                 max_connections: int = 10, max_concurrency: int = None, http2: bool = False):
+        """
+        timeout is (connect, read) in seconds, max_concurrency limits requests
+        in flight across all threads (None for no limit)
+        """
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = HttpMetrics()
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.verify = verify
+        if not verify:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        # requests already asks for gzip, make it explicit as servers may otherwise skip compression
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        if headers:
+            self.session.headers.update(headers)
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff,
+                      status_forcelist=self.RETRY_STATUSES, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self.h2 = None
+        if http2:
+            self.h2 = self._http2_client(auth=auth, headers=headers, verify=verify, max_connections=max_connections)
+            # httpx's synchronous HTTP/2 connections are not safe to share between threads - the
+            # asyncio client runs on its own event loop and threads hand their requests to it
+            self.h2_loop = asyncio.new_event_loop()
+            threading.Thread(target=self.h2_loop.run_forever, name=f'{name}-http2', daemon=True).start()
+
+    def _http2_client(self, *, auth, headers: Dict, verify: bool, max_connections: int):
+        if httpx is None:
+            raise HttpClientError(f'{self.name}: HTTP/2 transport requires httpx[http2] to be installed')
+        if auth is not None and not isinstance(auth, tuple):
+            raise HttpClientError(f'{self.name}: HTTP/2 transport supports only (user, password) authentication')
+        # no hop-by-hop headers (e.g. Connection) here, HTTP/2 forbids them
+        h2_headers = {'Accept-Encoding': 'gzip, deflate'}
+        h2_headers.update(headers or {})
+        try:
+            # the transport retries failed connections, responses are retried in _http2_request
+            transport = httpx.AsyncHTTPTransport(http2=True, verify=verify, retries=self.retries,
+                                                 limits=httpx.Limits(max_connections=max_connections))
+        except ImportError as e:
+            raise HttpClientError(f'{self.name}: HTTP/2 transport requires httpx[http2] to be installed: {e}')
+        return httpx.AsyncClient(transport=transport, auth=auth, headers=h2_headers,
+                                 timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]))
+
+    def _http2_request(self, method: str, url: str, *, headers: Dict = None, params: Dict = None, data=None):
+        content, form = (data, None) if isinstance(data, (str, bytes)) else (None, data)
+        retries = 0
+        while True:
+            r = asyncio.run_coroutine_threadsafe(
+                self.h2.request(method, url, headers=headers, params=params, content=content, data=form),
+                self.h2_loop).result()
+            if (r.status_code not in self.RETRY_STATUSES or retries >= self.retries or
+                    method.upper() not in self.IDEMPOTENT_METHODS):
+                break
+            time.sleep(self.backoff * 2 ** retries)
+            retries += 1
+        r.extensions['retries'] = retries
+        return r
+
+    def request(self, method: str, url: str, *, headers: Dict = None, params: Dict = None,
+                data=None, stream: bool = False) -> requests.Response:
+        """
+        Make a request and return the response whatever its status, raise HttpClientError
+        if no response could be obtained. Responses of the HTTP/2 transport are httpx
+        responses, which offer the same status_code, headers, content and json()
+        """
+        start = time.monotonic()
+        if self.slots is not None:
+            self.slots.acquire()
+        try:
+            if self.h2 is not None and not stream:
+                r = self._http2_request(method, url, headers=headers, params=params, data=data)
+            else:
+                # verify per request, REQUESTS_CA_BUNDLE would otherwise override a disabled session.verify
+                r = self.session.request(method, url, headers=headers, params=params, data=data,
+                                         stream=stream, timeout=self.timeout, verify=self.session.verify)
+        except TRANSPORT_ERRORS as e:
+            self.metrics.record(elapsed=time.monotonic() - start, error=True)
+            raise HttpClientError(f'{self.name} {method} {url}: {e}')
+        finally:
+            if self.slots is not None:
+                self.slots.release()
+        retries = self.retry_count(r)
+        # streamed bodies are not read here, count what the server announced
+        if stream:
+            nbytes = wire_bytes = int(r.headers.get('Content-Length', 0))
+        else:
+            nbytes = len(r.content)
+            # bytes read from the socket, i.e. before gzip decoding
+            if hasattr(r, 'num_bytes_downloaded'):
+                wire_bytes = r.num_bytes_downloaded
+            else:
+                wire_bytes = r.raw.tell() if hasattr(r.raw, 'tell') else nbytes
+        self.metrics.record(elapsed=time.monotonic() - start, nbytes=nbytes, wire_bytes=wire_bytes,
+                            retries=retries, error=r.status_code >= 400)
+        logging.debug(f'{self.name} {method} {url}: {r.status_code} in {time.monotonic() - start:.3f}s')
+        return r
+
+    @staticmethod
+    def retry_count(r: requests.Response) -> int:
+        """
+        Number of retries it took to get this response
+        """
+        if httpx is not None and isinstance(r, httpx.Response):
+            return r.extensions.get('retries', 0)
+        retry_history = getattr(r.raw, 'retries', None)
+        return len(retry_history.history) if retry_history is not None else 0
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def get_json(self, url: str, **kwargs):
+        """
+        GET a JSON document, raise HttpClientError unless the status is 200
+        """
+        r = self.get(url, **kwargs)
+        if r.status_code != 200:
+            raise HttpClientError(f'{self.name} GET {url}: status {r.status_code}')
+        try:
+            return r.json()
+        except ValueError as e:
+            raise HttpClientError(f'{self.name} GET {url}: invalid JSON response: {e}')
+
+    async def arequest(self, method: str, url: str, **kwargs) -> requests.Response:
+        return await asyncio.to_thread(self.request, method, url, **kwargs)
+
+    async def aget_json(self, url: str, **kwargs):
+        return await asyncio.to_thread(self.get_json, url, **kwargs)
+
+    def gather_json(self, urls: Iterable[str], **kwargs) -> List:
+        """
+        Fetch several JSON documents concurrently (bounded by max_concurrency)
+        from synchronous code, results are in the order of urls
+        """
+        async def gather():
+            return await asyncio.gather(*[self.aget_json(url, **kwargs) for url in urls])
+        return asyncio.run(gather())
+
+    def close(self):
+        self.session.close()
+        if self.h2 is not None:
+            asyncio.run_coroutine_threadsafe(self.h2.aclose(), self.h2_loop).result()
+            self.h2_loop.call_soon_threadsafe(self.h2_loop.stop)
+
+
+# errors meaning no response could be obtained
+TRANSPORT_ERRORS = (requests.RequestException, httpx.HTTPError) if httpx is not None else (requests.RequestException,)
+
+
+class HttpClientError(Exception):
+    def __init__(self, msg: str):
+        super().__init__(f'HttpClientError: {msg}')
@@ -0,0 +1,141 @@
+"""
+Range compression of label lists (MACs, BDFs, VLANs, NUMA nodes). A run of at least
+MIN_RUN values that step by the same stride, when mapped to integers, is stored
+as one '<start>*<count>' element ('<start>*<count>/<stride>' unless the stride is 1),
+other values are kept as they are. E.g. the 1998 vNIC MACs of an OpenStack worker
+become ['f2:ab:03:00:00:02*1998'] and their VLANs ['0*1998/0'].
+"""
+from typing import Iterable, Iterator, List, Callable, Tuple, Any
+
+RANGE_SEP = '*'
+STRIDE_SEP = '/'
+MIN_RUN = 3
+
+
+def _mac_to_int(mac: str) -> int:
+    octets = mac.split(':')
+    if len(octets) != 6:
+        raise ValueError(mac)
+    return int(''.join(octets), 16)
+
+
+def _int_to_mac(value: int) -> str:
+    h = f'{value:012x}'
+    return f'{h[0:2]}:{h[2:4]}:{h[4:6]}:{h[6:8]}:{h[8:10]}:{h[10:12]}'
+
+
+def _bdf_to_int(bdf: str) -> int:
+    # domain:bus:device.function, device may exceed 5 bits in OpenStack vBDFs
+    domain, bus, dev_func = bdf.split(':')
+    dev, func = dev_func.split('.')
+    if int(func, 16) > 7 or int(dev, 16) > 0xff or int(bus, 16) > 0xff:
+        raise ValueError(bdf)
+    return (int(domain, 16) << 19) | (int(bus, 16) << 11) | (int(dev, 16) << 3) | int(func, 16)
+
+
+def _int_to_bdf(value: int) -> str:
+    return f'{value >> 19:04x}:{(value >> 11) & 0xff:02x}:{(value >> 3) & 0xff:02x}.{value & 0x7:x}'
+
+
+# label kind -> (to integer, from integer)
+CODECS = {
+    'mac': (_mac_to_int, _int_to_mac),
+    'bdf': (_bdf_to_int, _int_to_bdf),
+    'int': (int, str),
+}
+
+# Labels attributes that are compressed and their kinds
+LABEL_KINDS = {'mac': 'mac', 'bdf': 'bdf', 'vlan': 'int', 'numa': 'int'}
+
+
+def _encode(value: str, codec: Tuple[Callable, Callable]) -> int or None:
+    to_int, from_int = codec
+    try:
+        number = to_int(value)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    # only values that come back exactly the same can be part of a range
+    return number if from_int(number) == value else None
+
+
+def compress(values: Iterable[str], kind: str, *, min_run: int = MIN_RUN) -> List[str]:
+    """
+    Compress a list of labels of a kind ('mac', 'bdf' or 'int') into ranges
+    """
+    codec = CODECS[kind]
+    ret = list()
+    # current run of encodable values as (value, integer) pairs with a common stride
+    run = list()
+    stride = None
+
+    def flush():
+        if len(run) >= min_run:
+            token = f'{run[0][0]}{RANGE_SEP}{len(run)}'
+            ret.append(token if stride == 1 else f'{token}{STRIDE_SEP}{stride}')
+        else:
+            ret.extend(v for v, _ in run)
+        run.clear()
+
+    for value in values:
+        number = _encode(value, codec) if isinstance(value, str) else None
+        if number is None:
+            flush()
+            ret.append(value)
+            continue
+        if len(run) == 1:
+            stride = number - run[0][1]
+        elif len(run) > 1 and number - run[-1][1] != stride:
+            if len(run) >= min_run:
+                flush()
+            else:
+                # the last value may start a run with this one
+                last = run.pop()
+                ret.extend(v for v, _ in run)
+                run[:] = [last]
+                stride = number - last[1]
+        run.append((value, number))
+    flush()
+    return ret
+
+
+def iter_expand(values: Iterable[str], kind: str) -> Iterator[str]:
+    """
+    Iterate over the labels of a possibly compressed list
+    """
+    to_int, from_int = CODECS[kind]
+    for value in values:
+        if not isinstance(value, str) or RANGE_SEP not in value:
+            yield value
+            continue
+        start, spec = value.rsplit(RANGE_SEP, 1)
+        count, _, stride = spec.partition(STRIDE_SEP)
+        first = to_int(start)
+        stride = int(stride) if stride else 1
+        for i in range(int(count)):
+            yield from_int(first + i * stride)
+
+
+def expand(values: Iterable[str], kind: str) -> List[str]:
+    return list(iter_expand(values, kind))
+
+
+def compress_labels(labels: Any) -> Any:
+    """
+    Compress list-valued mac, bdf, vlan and numa of a fim Labels object in place
+    """
+    for attr, kind in LABEL_KINDS.items():
+        values = getattr(labels, attr, None)
+        if isinstance(values, list):
+            setattr(labels, attr, compress(values, kind))
+    return labels
+
+
+def expand_labels(labels: Any) -> Any:
+    """
+    Expand compressed mac, bdf, vlan and numa of a fim Labels object in place
+    """
+    for attr, kind in LABEL_KINDS.items():
+        values = getattr(labels, attr, None)
+        if isinstance(values, list):
+            setattr(labels, attr, expand(values, kind))
+    return labels
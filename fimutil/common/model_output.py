@@ -0,0 +1,154 @@
+import gzip
+import hashlib
+import json
+import os
+import xml.etree.ElementTree as ET
+from typing import BinaryIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_EXTENSIONS = ('.gz', '.gzip')
+ZSTD_EXTENSIONS = ('.zst', '.zstd')
+# serialized models are handed to the compressor in chunks of this size
+CHUNK_SIZE = 1 << 20
+# sidecar file next to a model holding its digest
+DIGEST_EXTENSION = '.sha256'
+# node/edge attributes left out of the digest - fim gives every topology a new random GraphID
+DIGEST_IGNORED_ATTRIBUTES = ('GraphID',)
+# node attribute identifying a node in the digest - GraphML node ids depend on the order nodes were added
+DIGEST_NODE_ID_ATTRIBUTE = 'NodeID'
+# exit code of scan_* utilities when --skip-unchanged found the model unchanged
+UNCHANGED_EXIT_CODE = 3
+
+
+def model_compression(file_name: str) -> str or None:
+    """
+    Compression of a model file by its extension - 'gzip', 'zstd' or None
+    """
+    name = file_name.lower()
+    if name.endswith(GZIP_EXTENSIONS):
+        return 'gzip'
+    if name.endswith(ZSTD_EXTENSIONS):
+        return 'zstd'
+    return None
+
+
+def open_model_file(file_name: str, mode: str = 'rb', compression: str = None) -> BinaryIO:
+    """
+    Open a model file for binary reading ('rb') or writing ('wb'), compressing or
+    decompressing as a stream according to compression (by default from the extension)
+    """
+    compression = compression or model_compression(file_name)
+    if compression == 'gzip':
+        return gzip.open(file_name, mode, compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ModelOutputError(f'Unable to handle {file_name}, zstd compression requires zstandard to be installed')
+        if mode == 'wb':
+            return zstandard.ZstdCompressor(level=3).stream_writer(open(file_name, 'wb'), closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(open(file_name, 'rb'), closefd=True)
+    return open(file_name, mode)
+
+
+def model_digest(graph: str) -> str:
+    """
+    Canonical SHA-256 of a GraphML model. Every node and edge is digested on its own
+    (data by attribute name rather than by generated key id, nodes and edge ends by
+    their NodeID rather than by GraphML id, ends of undirected edges sorted) and the
+    sorted digests are hashed together, so the result does not depend on the order in
+    which elements and attributes were added or serialized.
+    """
+    root = ET.fromstring(graph)
+    # key id -> attribute name
+    keys = {key.get('id'): key.get('attr.name', key.get('id')) for key in root.iter() if _local(key.tag) == 'key'}
+    # GraphML node id -> NodeID (the GraphML id of nodes without one)
+    node_ids = dict()
+    for elem in root.iter():
+        if _local(elem.tag) == 'node':
+            node_ids[elem.get('id')] = next((d.text or '' for d in elem if _local(d.tag) == 'data' and
+                                             keys.get(d.get('key')) == DIGEST_NODE_ID_ATTRIBUTE), elem.get('id'))
+    digests = list()
+    for graph_elem in (g for g in root.iter() if _local(g.tag) == 'graph'):
+        directed = graph_elem.get('edgedefault') == 'directed'
+        for elem in graph_elem:
+            tag = _local(elem.tag)
+            data = sorted((keys.get(d.get('key'), d.get('key')), d.text or '') for d in elem
+                          if _local(d.tag) == 'data' and keys.get(d.get('key')) not in DIGEST_IGNORED_ATTRIBUTES)
+            if tag == 'node':
+                canonical = ['node', node_ids[elem.get('id')], data]
+            elif tag == 'edge':
+                ends = [node_ids.get(elem.get('source'), elem.get('source')),
+                        node_ids.get(elem.get('target'), elem.get('target'))]
+                if not (directed or elem.get('directed') == 'true'):
+                    ends.sort()
+                canonical = ['edge', ends, data]
+            else:
+                continue
+            digests.append(hashlib.sha256(json.dumps(canonical).encode('utf-8')).digest())
+    digests.sort()
+    return hashlib.sha256(b''.join(digests)).hexdigest()
+
+
+def _local(tag: str) -> str:
+    # tag without its XML namespace
+    return tag.rsplit('}', 1)[-1]
+
+
+def write_model(topology, file_name: str, *, skip_unchanged: bool = False) -> bool:
+    """
+    Serialize a fim topology (GraphML) into file_name, gzip- or zstd-compressed
+    if the name ends with .gz or .zst. The model is streamed through the
+    compressor into a temporary file, which replaces file_name once complete.
+    With skip_unchanged the model digest is compared to the one saved next to the
+    previous output (<file_name>.sha256) and nothing is written if they match.
+    Returns False if the write was skipped.
+    """
+    graph = topology.serialize()
+    digest_file = file_name + DIGEST_EXTENSION
+    digest = None
+    if skip_unchanged:
+        digest = model_digest(graph)
+        try:
+            with open(digest_file, 'r') as f:
+                previous = f.read().strip()
+        except FileNotFoundError:
+            previous = None
+        if previous == digest and os.path.exists(file_name):
+            return False
+    data = graph.encode('utf-8')
+    tmp_file = file_name + '.tmp'
+    try:
+        with open_model_file(tmp_file, 'wb', compression=model_compression(file_name)) as f:
+            view = memoryview(data)
+            for offset in range(0, len(view), CHUNK_SIZE):
+                f.write(view[offset:offset + CHUNK_SIZE])
+        os.replace(tmp_file, file_name)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    if digest is not None:
+        with open(digest_file + '.tmp', 'w') as f:
+            f.write(digest + '\n')
+        os.replace(digest_file + '.tmp', digest_file)
+    elif os.path.exists(digest_file):
+        # no longer describes the model
+        os.remove(digest_file)
+    return True
+
+
+def read_model(file_name: str) -> str:
+    """
+    Read a possibly compressed model file into a GraphML string,
+    e.g. for SubstrateTopology(graph_string=...)
+    """
+    with open_model_file(file_name, 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+class ModelOutputError(Exception):
+    def __init__(self, msg: str):
+        super().__init__(f'ModelOutputError: {msg}')
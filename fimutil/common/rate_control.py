@@ -0,0 +1,70 @@
+import logging
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Request-rate cap - acquire() blocks until a token is available. Tokens
+    accumulate at rate per second up to burst.
+    """
+    def __init__(self, *, rate: float, burst: int = None):
+        if rate <= 0:
+            raise ValueError(f'Token bucket rate must be positive, not {rate}')
+        self.rate = rate
+        self.burst = burst if burst else max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AimdLimiter:
+    """
+    Adaptive limit on requests in flight (additive increase, multiplicative decrease).
+    The limit grows by about one per round of requests that complete under the latency
+    target and is cut by decrease_factor when a request is slow, is rejected with
+    429/5xx or fails - at most once per latency_target, so one burst of slow
+    responses counts as a single congestion signal.
+    """
+    def __init__(self, *, initial: int = 4, minimum: int = 1, maximum: int = 32, latency_target: float = 2.0,
+                 decrease_factor: float = 0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, *, latency: float, overloaded: bool = False):
+        with self.cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if overloaded or latency > self.latency_target:
+                if now - self.last_decrease > self.latency_target:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self.last_decrease = now
+                    logging.debug(f'Reducing concurrency limit to {int(self.limit)} '
+                                  f'({latency=:.3f}s, {overloaded=})')
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
@@ -0,0 +1,139 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Tuple, Any
+
+
+class Task:
+    def __init__(self, name: str, fn: Callable[[], Any], deps: Tuple[str, ...]):
+        self.name = name
+        self.fn = fn
+        self.deps = deps
+        self.result = None
+        self.error = None
+        self.start = None
+        self.end = None
+        self.submitted = False
+        self.done = threading.Event()
+
+
+class TaskGraph:
+    """
+    Small dependency graph of tasks run on a thread pool - a task is started as soon
+    as all tasks it depends on have completed. Tasks may add further tasks while
+    the graph runs. A failed task fails every task that depends on it; result()
+    and wait() re-raise the error.
+    """
+    def __init__(self, *, name: str, max_workers: int = 4):
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.tasks = dict()
+        self.lock = threading.Lock()
+        self.started = None
+        self.cancelled = False
+
+    def add(self, name: str, fn: Callable[[], Any], deps: Iterable[str] = ()):
+        """
+        Add a task, dependencies must already be known to the graph
+        """
+        with self.lock:
+            if name in self.tasks:
+                raise TaskGraphError(f'Task {name} already exists in {self.name}')
+            for dep in deps:
+                if dep not in self.tasks:
+                    raise TaskGraphError(f'Task {name} depends on unknown task {dep} in {self.name}')
+            self.tasks[name] = Task(name, fn, tuple(deps))
+        if self.started is not None:
+            self._schedule()
+
+    def start(self):
+        self.started = time.monotonic()
+        self._schedule()
+
+    def _schedule(self):
+        ready = list()
+        failed = list()
+        with self.lock:
+            if self.cancelled:
+                return
+            for task in self.tasks.values():
+                if task.submitted:
+                    continue
+                deps = [self.tasks[dep] for dep in task.deps]
+                if not all(dep.done.is_set() for dep in deps):
+                    continue
+                task.submitted = True
+                errors = [dep.error for dep in deps if dep.error is not None]
+                if errors:
+                    task.error = errors[0]
+                    failed.append(task)
+                else:
+                    ready.append(task)
+        for task in failed:
+            task.done.set()
+        for task in ready:
+            self.executor.submit(self._run, task)
+        if failed:
+            self._schedule()
+
+    def _run(self, task: Task):
+        task.start = time.monotonic()
+        try:
+            task.result = task.fn()
+        except BaseException as e:
+            task.error = e
+        task.end = time.monotonic()
+        task.done.set()
+        self._schedule()
+
+    def result(self, name: str):
+        """
+        Wait for a task and return its result
+        """
+        task = self.tasks[name]
+        task.done.wait()
+        if task.error is not None:
+            raise task.error
+        return task.result
+
+    def wait(self):
+        """
+        Wait for all tasks, re-raise the error of the first task to fail
+        """
+        for name in list(self.tasks):
+            self.result(name)
+        self.executor.shutdown()
+
+    def cancel(self):
+        """
+        Do not start any more tasks (running tasks complete in the background)
+        """
+        with self.lock:
+            self.cancelled = True
+        self.executor.shutdown(wait=False)
+
+    def critical_path(self) -> List[Tuple[str, float]]:
+        """
+        Chain of completed tasks that determined when the last one finished,
+        as (name, duration) pairs from first to last
+        """
+        finished = [t for t in self.tasks.values() if t.end is not None]
+        if not finished:
+            return list()
+        path = list()
+        task = max(finished, key=lambda t: t.end)
+        while task is not None:
+            path.append((task.name, task.end - task.start))
+            deps = [self.tasks[dep] for dep in task.deps if self.tasks[dep].end is not None]
+            task = max(deps, key=lambda t: t.end) if deps else None
+        return list(reversed(path))
+
+    def critical_path_str(self) -> str:
+        path = self.critical_path()
+        wall = max(t.end for t in self.tasks.values() if t.end is not None) - self.started if path else 0.0
+        return ' -> '.join(f'{name} {duration:.2f}s' for name, duration in path) + f' (wall time {wall:.2f}s)'
+
+
+class TaskGraphError(Exception):
+    def __init__(self, msg: str):
+        super().__init__(f'TaskGraphError: {msg}')
@@ -0,0 +1,293 @@
+import json
+import logging
+import os
+import threading
+import time
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Callable, Tuple
+
+from yaml import load as yload
+from yaml import FullLoader
+
+from fim.slivers.delegations import DelegationType, Pools
+
+from fimutil.ralph.ralph_uri import RalphURI, RequestSettings
+from fimutil.ralph.site import Site
+from fimutil.ralph.scan_context import ScanContext
+from fimutil.ralph.fim_helper import site_to_fim
+from fimutil.ralph.location_cache import LocationCache
+from fimutil.netam.arm import NetworkARM
+from fimutil.al2s.arm import Al2sARM
+from fimutil.common.model_output import write_model
+
+
+class InventoryJob:
+    """
+    One periodically refreshed model - a site, the inter-site network or AL2S.
+    The builder returns (topology, JSON summary or None); the last good model and
+    summary are kept in memory (serialized) and saved under the output directory.
+    fim keeps the graphs of all topologies in one process-wide store that is not
+    thread-safe, so models are built and serialized under build_lock, shared by
+    all jobs, and each graph is deleted once serialized.
+    """
+    def __init__(self, *, name: str, builder: Callable[[], Tuple[object, Dict]], interval: int, output_dir: str,
+                 build_lock: threading.Lock = None):
+        self.name = name
+        self.builder = builder
+        self.build_lock = build_lock if build_lock is not None else threading.Lock()
+        self.interval = interval
+        self.model_file = os.path.join(output_dir, name + '.graphml')
+        self.json_file = os.path.join(output_dir, name + '.json')
+        self.model = None
+        self.summary = None
+        self.last_refresh = None
+        self.last_duration = None
+        self.last_error = None
+        self.refreshing = False
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        with self.lock:
+            self.refreshing = True
+        start = time.time()
+        try:
+            with self.build_lock:
+                topo, summary = self.builder()
+                try:
+                    topo.single_delegation(delegation_id='primary',
+                                           label_pools=Pools(atype=DelegationType.LABEL),
+                                           capacity_pools=Pools(atype=DelegationType.CAPACITY))
+                    # written next to the old file and swapped in, so readers of the file never see it
+                    # half-written; left alone if nothing changed so file watchers don't reload it
+                    if not write_model(topo, self.model_file, skip_unchanged=True):
+                        logging.info(f'{self.name} model unchanged')
+                finally:
+                    # only the serialized model is kept, the graph would stay in fim's store forever
+                    topo.graph.delete_graph()
+            with open(self.model_file, 'rb') as f:
+                model = f.read()
+            summary_bytes = None
+            if summary is not None:
+                summary_bytes = json.dumps(summary, indent=2).encode('utf-8')
+                with open(self.json_file + '.tmp', 'wb') as f:
+                    f.write(summary_bytes)
+                os.replace(self.json_file + '.tmp', self.json_file)
+            with self.lock:
+                self.model = model
+                self.summary = summary_bytes
+                self.last_refresh = time.time()
+                self.last_error = None
+            logging.info(f'Refreshed {self.name} model in {time.time() - start:.1f}s')
+        except Exception as e:
+            # keep serving the previous model
+            logging.error(f'Unable to refresh {self.name} model: {e}')
+            with self.lock:
+                self.last_error = str(e)
+        finally:
+            with self.lock:
+                self.refreshing = False
+                self.last_duration = time.time() - start
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            self.refresh()
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def status(self) -> Dict:
+        with self.lock:
+            return {'name': self.name, 'model_file': self.model_file,
+                    'model_available': self.model is not None,
+                    'summary_available': self.summary is not None,
+                    'last_refresh': self.last_refresh, 'last_duration': self.last_duration,
+                    'last_error': self.last_error, 'refreshing': self.refreshing,
+                    'refresh_interval': self.interval}
+
+
+class InventoryService:
+    """
+    Long-running inventory daemon. Keeps Ralph, NSO and AL2S clients (and their
+    connections and tokens) alive between refreshes, rebuilds each configured model
+    on its own schedule and serves the latest ones over a local HTTP endpoint:
+
+    GET /status - JSON status of all models
+    GET /models/<name> - latest GraphML model
+    GET /summaries/<name> - latest JSON summary (sites only)
+    POST /refresh/<name> - refresh a model now
+    """
+    DEFAULT_CONFIG_FILE = os.path.join(os.getenv('HOME', '/tmp'), '.inventory-service.conf')
+    DEFAULT_REFRESH_INTERVAL = 3600
+
+    def __init__(self, *, config_file: str = None):
+        self.config = self.get_config(config_file)
+        self.output_dir = self.config.get('output_dir', '.')
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.jobs = dict()
+        # one model is built at a time
+        self.build_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.server = None
+        self._add_site_jobs()
+        self._add_net_job()
+        self._add_al2s_job()
+        if not self.jobs:
+            raise InventoryServiceError('No sites, network or AL2S models are configured')
+
+    def _add_job(self, name: str, builder: Callable, section: Dict):
+        if name in self.jobs:
+            raise InventoryServiceError(f'Model {name} is configured more than once')
+        self.jobs[name] = InventoryJob(name=name, builder=builder,
+                                       interval=int(section.get('refresh_interval', self.DEFAULT_REFRESH_INTERVAL)),
+                                       output_dir=self.output_dir, build_lock=self.build_lock)
+
+    def _add_site_jobs(self):
+        ralph_config = self.config.get('ralph')
+        if not ralph_config:
+            return
+        # all site refreshes share one Ralph client, so the rate cap and concurrency limit apply across them
+        ralph = RalphURI(token=ralph_config['token'], base_uri=ralph_config['base_uri'],
+                         disable_ssl=ralph_config.get('no_ssl', False),
+                         settings=RequestSettings(max_rate=ralph_config.get('max_rate'),
+                                                  adaptive_concurrency=ralph_config.get('adaptive_concurrency', False),
+                                                  hedge=ralph_config.get('hedge', False)),
+                         sparse_fields=ralph_config.get('sparse_fields', False),
+                         http2=ralph_config.get('http2', False))
+        location_cache = LocationCache(cache_file=ralph_config.get('location_cache'),
+                                       offline=ralph_config.get('offline_geocode', False))
+        scan_config = None
+        if ralph_config.get('config'):
+            with open(ralph_config['config'], 'r') as f:
+                scan_config = json.load(f)
+        for site_config in ralph_config.get('sites', list()):
+            site_name = site_config['name'].upper()
+
+            def build(site_name=site_name, site_config=site_config):
+                # a fresh context per scan, the Ralph client and its connection pool are shared
+                context = ScanContext(ralph=ralph, config=scan_config,
+                                      lightweight_site=site_config.get('lightweight', False),
+                                      release_raw_json=ralph_config.get('low_memory', False))
+                site = Site(site_name=site_name, ralph=ralph, config=scan_config, context=context)
+                site.catalog()
+                topo = site_to_fim(site, site_config.get('address'), scan_config, location_cache=location_cache)
+                return topo, site.to_json()
+            self._add_job(site_name, build, {**ralph_config, **site_config})
+
+    def _add_net_job(self):
+        net_config = self.config.get('netam')
+        if not net_config:
+            return
+        arm = NetworkARM(config_file=net_config.get('config'),
+                         isis_link_validation=net_config.get('isis_link_validation', False),
+                         skip_device=net_config.get('skip_device'),
+                         pce_cache_ttl=net_config.get('pce_cache_ttl'))
+
+        def build():
+            arm.build_topology()
+            return arm.topology, None
+        self._add_job(net_config.get('name', 'network'), build, net_config)
+
+    def _add_al2s_job(self):
+        al2s_config = self.config.get('al2s')
+        if not al2s_config:
+            return
+        arm = Al2sARM(config_file=al2s_config.get('config'))
+
+        def build():
+            arm.build_topology()
+            return arm.topology, None
+        self._add_job(al2s_config.get('name', 'AL2S'), build, al2s_config)
+
+    def start(self):
+        """
+        Start refresh threads and the HTTP endpoint, then serve until stopped
+        """
+        for job in self.jobs.values():
+            threading.Thread(target=job.run, args=(self.stop_event,), name=f'refresh-{job.name}',
+                             daemon=True).start()
+        host = self.config.get('listen_host', '127.0.0.1')
+        port = int(self.config.get('listen_port', 8765))
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        logging.info(f'Serving inventory on http://{host}:{port}/')
+        self.server.serve_forever()
+
+    def stop(self):
+        self.stop_event.set()
+        for job in self.jobs.values():
+            job.wakeup.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def get_config(self, config_file):
+        if not config_file:
+            config_file = self.DEFAULT_CONFIG_FILE
+            if not os.path.isfile(config_file):
+                config_file = '/etc/inventory-service.conf'
+                if not os.path.isfile(config_file):
+                    raise InventoryServiceError(f'Config file not found: {config_file}')
+        with open(config_file, 'r') as fd:
+            return yload(fd.read(), Loader=FullLoader)
+
+
+def _make_handler(service: InventoryService):
+
+    class InventoryRequestHandler(BaseHTTPRequestHandler):
+
+        def _reply(self, status: HTTPStatus, body: bytes, content_type: str = 'application/json'):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status: HTTPStatus, msg: str):
+            self._reply(status, json.dumps({'error': msg}).encode('utf-8'))
+
+        def _job(self, name: str):
+            job = service.jobs.get(name) or service.jobs.get(name.upper())
+            if job is None:
+                self._error(HTTPStatus.NOT_FOUND, f'Unknown model {name}')
+            return job
+
+        def do_GET(self):
+            parts = self.path.strip('/').split('/')
+            if parts == ['status']:
+                self._reply(HTTPStatus.OK, json.dumps([job.status() for job in service.jobs.values()],
+                                                      indent=2).encode('utf-8'))
+            elif len(parts) == 2 and parts[0] in ('models', 'summaries'):
+                job = self._job(parts[1])
+                if job is None:
+                    return
+                with job.lock:
+                    body = job.model if parts[0] == 'models' else job.summary
+                if body is None:
+                    self._error(HTTPStatus.SERVICE_UNAVAILABLE, f'No {parts[0][:-1]} available for {job.name}')
+                elif parts[0] == 'models':
+                    self._reply(HTTPStatus.OK, body, content_type='application/xml')
+                else:
+                    self._reply(HTTPStatus.OK, body)
+            else:
+                self._error(HTTPStatus.NOT_FOUND, f'Unknown path {self.path}')
+
+        def do_POST(self):
+            parts = self.path.strip('/').split('/')
+            if len(parts) == 2 and parts[0] == 'refresh':
+                job = self._job(parts[1])
+                if job is None:
+                    return
+                job.wakeup.set()
+                self._reply(HTTPStatus.ACCEPTED, json.dumps(job.status()).encode('utf-8'))
+            else:
+                self._error(HTTPStatus.NOT_FOUND, f'Unknown path {self.path}')
+
+        def log_message(self, format, *args):
+            logging.debug('%s - %s' % (self.address_string(), format % args))
+
+    return InventoryRequestHandler
+
+
+class InventoryServiceError(Exception):
+    def __init__(self, msg: str):
+        super().__init__(f'InventoryServiceError: {msg}')
@@ -1,12 +1,14 @@
 import fim.user as f
-from fimutil.netam.nso import NsoClient
+from fimutil.netam.nso import NsoClient, NetAmNsoError
 from fimutil.netam.sr_pce import SrPceClient
+from fimutil.common.model_output import write_model
 import re
 import os
 from yaml import load as yload
 from yaml import FullLoader
 from ipaddress import IPv4Interface
 from ipaddress import IPv4Network
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
 
@@ -14,6 +16,11 @@ def _in_same_network(ip1: str, ip2: str, netmask: str) -> bool:
     return IPv4Interface(f'{ip1}/{netmask}').network == IPv4Interface(f'{ip2}/{netmask}').network
 
 
+def _normalize_port_name(port_name: str) -> str:
+    # sites config spells ports with a space (e.g. 'HundredGigE 0/0/0'), NSO and stitch ports without
+    return ''.join(port_name.split())
+
+
 def _normalize_netmask(prefix: str) -> str:
     # compatible to prefix string
     if re.fullmatch(r'(\d+\.\d+\.\d+\.\d+)', prefix):
@@ -54,12 +61,13 @@ class NetworkARM:
     Generate Network AM resources information model.
     """
 
-    def __init__(self, *, config_file=None, isis_link_validation=False, skip_device=None):
+    def __init__(self, *, config_file=None, isis_link_validation=False, skip_device=None,
+                 pce_cache_ttl=None, pce_background_refresh=False):
         self.topology = None
         self.config = self.get_config(config_file)
         self.nso = NsoClient(config=self.config)
         if isis_link_validation:
-            self.sr_pce = SrPceClient(config=self.config)
+            self.sr_pce = SrPceClient(config=self.config, config_file=config_file)
         else:
             self.sr_pce = None
         if skip_device is not None:
@@ -67,16 +75,78 @@ class NetworkARM:
         else:
             self.skipped_devices = []
         self.valid_ipv4_links = None
+        # reuse a persisted SR-PCE link snapshot younger than this many seconds
+        if pce_cache_ttl is None:
+            pce_cache_ttl = self.config.get('sr_pce_cache_ttl', 0)
+        self.pce_cache_ttl = int(pce_cache_ttl)
+        self.pce_cache_file = self.config.get('sr_pce_cache_file',
+                                              os.path.join(os.getenv('HOME', '/tmp'), '.netam-sr-pce-links.json'))
+        self.pce_background_refresh = pce_background_refresh
         self.sites_metadata = None
+        # per-site lookup tables keyed by normalized port name, compiled from sites_metadata
+        self.port_link_caps = {}
+        self.port_link_types = {}
+        self.facility_stitches = {}
+        self.al2s_stitches = {}
         if 'sites_config' in self.config:
             sites_config_file = self.config['sites_config']
             if not os.path.isfile(sites_config_file):
                 raise NetAmArmError('sites_config file does not exists at: ' + sites_config_file)
             with open(sites_config_file, 'r') as fd:
                 self.sites_metadata = yload(fd.read(), Loader=FullLoader)
+            self._index_sites_metadata()
+
+    def _index_sites_metadata(self) -> None:
+        """
+        Compile sites_metadata once into per-site dictionaries keyed by normalized
+        port name (p2p link capacities and types, facility and AL2S stitching entries)
+        so that each port in build_topology costs a constant number of lookups.
+        """
+        for site_name, site_info in self.sites_metadata.items():
+            if not isinstance(site_info, dict):
+                continue
+            caps = {}
+            ltypes = {}
+            for port_name, port_info in (site_info.get('p2p_links') or {}).items():
+                if not port_info:
+                    continue
+                port_key = _normalize_port_name(port_name)
+                cap = {k: port_info[k] for k in ('port-capacity', 'link-capacity', 'link-reserve-capacity')
+                       if k in port_info}
+                if cap:
+                    caps[port_key] = cap
+                if 'ltype' in port_info:
+                    ltypes[port_key] = port_info['ltype']
+            self.port_link_caps[site_name] = caps
+            self.port_link_types[site_name] = ltypes
+
+            facility_stitches = {}
+            for facility_name, stitch_info in (site_info.get('facility_ports') or {}).items():
+                if 'stitch_port' not in stitch_info:
+                    raise NetAmArmError('no peer / stitch_port defined for facility_port: ' + facility_name)
+                port_key = _normalize_port_name(stitch_info['stitch_port'])
+                facility_stitches.setdefault(port_key, []).append((facility_name, stitch_info))
+            self.facility_stitches[site_name] = facility_stitches
+
+            al2s_stitches = {}
+            for al2s_port_name, al2s_stitch_info in (site_info.get('al2s_ports') or {}).items():
+                if 'stitch_port' not in al2s_stitch_info:
+                    raise NetAmArmError('no peer / stitch_port defined for al2s_port: ' + al2s_port_name)
+                port_key = _normalize_port_name(al2s_stitch_info['stitch_port'])
+                al2s_stitches.setdefault(port_key, []).append((al2s_port_name, al2s_stitch_info))
+            self.al2s_stitches[site_name] = al2s_stitches
 
     def _get_device_interfaces(self) -> list:
         devs = self.nso.devices()
+        # optionally pull interfaces of all devices in one query instead of one query per device
+        batch_ifaces = None
+        if self.config.get('nso_batch_query'):
+            try:
+                logging.info("Fetching interfaces of all devices from NSO in one batched query")
+                batch_ifaces = self.nso.interfaces_batch([dev['name'] for dev in devs])
+            except NetAmNsoError as e:
+                logging.warning(f"Batched NSO interface query failed, falling back to per-device queries: {e}")
+        fetch_devs = list()
         for dev in devs:
             dev_name = dev['name']
             re_site = re.findall(r'(\w+)-.+', dev_name)
@@ -90,12 +160,28 @@ class NetworkARM:
             # skip the devices that explicitly asked to skip
             if dev_name in self.skipped_devices:
                 continue
-            logging.info(f"Fetching {site_name} interfaces from NSO")
-            ifaces = self.nso.interfaces(dev_name)
-            isis_ifaces = self.nso.isis_interfaces(dev_name)
+            fetch_devs.append(dev)
+
+        # per-device NSO queries are independent - run them concurrently, process results in device order
+        def fetch(dev):
+            dev_name = dev['name']
+            if batch_ifaces is not None and dev_name in batch_ifaces:
+                ifaces = batch_ifaces[dev_name]
+            else:
+                logging.info(f"Fetching {dev_name} interfaces from NSO")
+                ifaces = self.nso.interfaces(dev_name)
+            return ifaces, self.nso.isis_interfaces(dev_name)
+
+        max_workers = int(self.config.get('nso_max_workers', 8))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            fetched = list(executor.map(fetch, fetch_devs))
+
+        for dev, (ifaces, isis_ifaces) in zip(fetch_devs, fetched):
+            dev_name = dev['name']
             if ifaces:
                 if isis_ifaces is None:
                     raise NetAmArmError(f"Device '{dev_name}' has no active isis interface - fix that or consider '--skip-device device-name'")
+                isis_iface_names = {isis_iface['name'] for isis_iface in isis_ifaces}
                 for iface in list(ifaces):
                     # get loopback addresses
                     if iface['name'] == 'Loopback0':
@@ -105,10 +191,7 @@ class NetworkARM:
                             dev['loopback_ipv6'] = iface['ietf-ip:ipv6']['address'][0]['ip']
                         continue
                     # skip if not an isis l2 p2p interfaces
-                    is_isis_iface = False
-                    for isis_iface in isis_ifaces:
-                        if iface['name'] == isis_iface['name']:
-                            is_isis_iface = True
+                    is_isis_iface = iface['name'] in isis_iface_names
                     # only keep interfaces in up status and of "*GigE0/1/2*" pattern
                     if re.search('GigE\d/\d/\d|Bundle-Ether\d+', iface['name']):
                         iface.pop('statistics', None)  # remove 'statistics' attributes
@@ -137,44 +220,30 @@ class NetworkARM:
 
 
     def _get_port_link_cap(self, site_name, port_name) -> dict:
-        ret_cap_dict = {}
-        if self.sites_metadata and site_name in self.sites_metadata:
-            site_info = self.sites_metadata[site_name]
-            if 'p2p_links' in site_info:
-                if ' ' not in port_name:
-                    port_name = port_name.replace("GigE", "GigE ")
-                    port_name = port_name.replace("Bundle-Ether", "Bundle-Ether ")
-                if port_name in site_info['p2p_links']:
-                    port_info = site_info['p2p_links'][port_name]
-                    if 'port-capacity' in port_info:
-                        ret_cap_dict['port-capacity'] = port_info['port-capacity']
-                    if 'link-capacity' in port_info:
-                        ret_cap_dict['link-capacity'] = port_info['link-capacity']
-                    if 'link-reserve-capacity' in port_info:
-                        ret_cap_dict['link-reserve-capacity'] = port_info['link-reserve-capacity']
-        return ret_cap_dict
-
+        site_caps = self.port_link_caps.get(site_name)
+        if not site_caps:
+            return {}
+        return dict(site_caps.get(_normalize_port_name(port_name), {}))
 
     def _get_link_type(self, site_name, port_name) -> str:
-        if self.sites_metadata and site_name in self.sites_metadata:
-            site_info = self.sites_metadata[site_name]
-            if 'p2p_links' in site_info:
-                if ' ' not in port_name:
-                    port_name = port_name.replace("GigE", "GigE ")
-                    port_name = port_name.replace("Bundle-Ether", "Bundle-Ether ")
-                if port_name in site_info['p2p_links']:
-                    port_info = site_info['p2p_links'][port_name]
-                    if 'ltype' in port_info:
-                        return port_info['ltype']
+        site_ltypes = self.port_link_types.get(site_name)
+        if site_ltypes:
+            ltype = site_ltypes.get(_normalize_port_name(port_name))
+            if ltype:
+                return ltype
         # by default, return `l1path`
         return 'l1path'
 
-
     def build_topology(self) -> None:
         # firstly get SR-PCE active links
         if self.sr_pce is not None:
-            self.sr_pce.get_topology_json()
-            self.valid_ipv4_links = self.sr_pce.get_ipv4_links()
+            if self.pce_cache_ttl > 0:
+                self.valid_ipv4_links = self.sr_pce.get_ipv4_links_cached(
+                    cache_file=self.pce_cache_file, ttl=self.pce_cache_ttl,
+                    background_refresh=self.pce_background_refresh, detached=True)
+            else:
+                self.sr_pce.get_topology_json()
+                self.valid_ipv4_links = self.sr_pce.get_ipv4_links()
         # start topology model
         self.topology = f.SubstrateTopology()
         nodes = self._get_device_interfaces()
@@ -187,229 +256,238 @@ class NetworkARM:
                                            capacities=f.Capacities(unit=1))
         al2s_l2_ns = al2s_node.add_network_service(name=al2s_node.name + '-ns', layer=f.Layer.L2,  stitch_node=True,
                                                    node_id=al2s_node.node_id + '-ns', nstype=f.ServiceType.MPLS)
-        regexVlanPort = re.compile(r'\/\d+/\d+\/\d+\.\d+$') # ignore BE (like Bundle-Ether101.3000) for site ports
         # add site nodes
         for node in nodes:
-            if 'interfaces' not in node:
-                continue
-            # add switch node
-            node_name = node['name']
-            logging.info(f"Building model for node {node_name}")
-            # TODO: get model name from NSO
-            model_name = 'NCS 55A1-36H'
-            # TODO: get official site name from Ralph (or in switch description string) ?
-            re_site = re.findall(r'(\w+)-.+', node_name)
-            if re_site is None or len(re_site) == 0:
-                continue
-            site_name = str.upper(re_site[0])
-            node_nid = "node+" + node_name + ":ip+" + node['address']
-            switch = self.topology.add_node(name=node_name, model=model_name, site=site_name,
-                                            node_id=node_nid, ntype=f.NodeType.Switch,
-                                            capacities=f.Capacities(unit=1),
-                                            labels=f.Labels(local_name=node_name, ipv4=node['address']))
-            l2_ns_labs = f.Labels()
-            site_info = None
-            # add FABIpv4 and FABIpv6 NetworkService
-            if self.sites_metadata and site_name in self.sites_metadata:
-                site_info = self.sites_metadata[site_name]
-                if 'l2_vlan_range' in site_info:
-                    l2_ns_labs = f.Labels.update(l2_ns_labs, vlan_range=site_info['l2_vlan_range'].split(','))
-                ipv4_ns_labs = f.Labels()
-                if 'ipv4_net' in site_info:
-                    ipv4_ns_labs = f.Labels.update(ipv4_ns_labs, ipv4_subnet=site_info['ipv4_net'])
-                if 'ipv4_vlan_range' in site_info:
-                    ipv4_ns_labs = f.Labels.update(ipv4_ns_labs, vlan_range=site_info['ipv4_vlan_range'].split(','))
-                if 'loopback_ipv4' in node:
-                    ipv4_ns_labs = f.Labels.update(ipv4_ns_labs, ipv4=node['loopback_ipv4'])
-                ipv4_ns = switch.add_network_service(name=switch.name + '-ipv4-ns', layer=f.Layer.L3,
-                                                     labels=ipv4_ns_labs,
-                                                     node_id=switch.node_id + '-ipv4-ns', nstype=f.ServiceType.FABNetv4)
-                ipv4ext_ns_labs = f.Labels()
-                if 'ipv4_public_net' in site_info:
-                    ipv4ext_ns_labs = f.Labels.update(ipv4ext_ns_labs, ipv4_subnet=site_info['ipv4_public_net'])
-                if 'ipv4_vlan_range' in site_info:
-                    ipv4ext_ns_labs = f.Labels.update(ipv4ext_ns_labs, vlan_range=site_info['ipv4_vlan_range'].split(','))
-                ipv4ext_ns = switch.add_network_service(name=switch.name + '-ipv4ext-ns', layer=f.Layer.L3,
-                                                     labels=ipv4ext_ns_labs,
-                                                     node_id=switch.node_id + '-ipv4ext-ns', nstype=f.ServiceType.FABNetv4Ext)
-
-                ipv6_ns_labs = f.Labels()
-                if 'ipv6_net' in site_info:
-                    ipv6_ns_labs = f.Labels.update(ipv6_ns_labs, ipv6_subnet=site_info['ipv6_net'])
-                if 'ipv6_vlan_range' in site_info:
-                    ipv6_ns_labs = f.Labels.update(ipv6_ns_labs, vlan_range=site_info['ipv6_vlan_range'].split(','))
-                if 'loopback_ipv6' in node:
-                    ipv6_ns_labs = f.Labels.update(ipv6_ns_labs, ipv6=node['loopback_ipv6'])
-                ipv6_ns = switch.add_network_service(name=switch.name + '-ipv6-ns', layer=f.Layer.L3,
-                                                     labels=ipv6_ns_labs,
-                                                     node_id=switch.node_id + '-ipv6-ns', nstype=f.ServiceType.FABNetv6)
-                ipv6ext_ns_labs = f.Labels()
-                if 'ipv6_net' in site_info:
-                    ipv6ext_ns_labs = f.Labels.update(ipv6ext_ns_labs, ipv6_subnet=site_info['ipv6_net'])
-                if 'ipv6_vlan_range' in site_info:
-                    ipv6ext_ns_labs = f.Labels.update(ipv6ext_ns_labs, vlan_range=site_info['ipv6_vlan_range'].split(','))
-                ipv6ext_ns = switch.add_network_service(name=switch.name + '-ipv6ext-ns', layer=f.Layer.L3,
-                                                     labels=ipv6ext_ns_labs,
-                                                     node_id=switch.node_id + '-ipv6ext-ns', nstype=f.ServiceType.FABNetv6Ext)
-
-                l3vpn_ns_labs = f.Labels()
-                l3vpn_ns_labs = f.Labels.update(l3vpn_ns_labs, asn='398900')
-                # TODO: add more labels (per-site vlan_range and ipv4_range for bgp peering)
-                l3vpn_ns = switch.add_network_service(name=switch.name + '-l3vpn-ns', layer=f.Layer.L3,
-                                                     labels=l3vpn_ns_labs,
-                                                     node_id=switch.node_id + '-l3vpn-ns', nstype=f.ServiceType.L3VPN)
-
-            # add L2 NetworkService
-            l2_ns = switch.add_network_service(name=switch.name + '-ns', layer=f.Layer.L2, labels=l2_ns_labs,
-                                               node_id=switch.node_id + '-ns', nstype=f.ServiceType.MPLS)
-            # add ports
-            if 'interfaces' in node:
-                for port in node['interfaces']:
-                    port_name = port['name']
-                    if 'admin-status' in port and port ['admin-status'] == 'up':
-                        port_active = True
-                    else:
-                        port_active = False
-                    if 'phys-address' not in port:
-                        continue
-                    port_mac = port['phys-address']
-                    port_nid = f"port+{node_name}:{port_name}"
-                    # get port/links capacities from site_config SoT file
-                    port_link_cap = self._get_port_link_cap(site_name, port_name)
-                    if port_link_cap:
-                        port_link_cap_map[port_nid] = port_link_cap
-                    if 'port-capacity' in port_link_cap: # we defined
-                        speed_gbps = port_link_cap['port-capacity']
-                    else: # use system default
-                        speed_gbps = int(int(port['speed']) / 1000000000)
-                    # add capabilities
-                    port_caps = f.Capacities(bw=speed_gbps)
-                    # add labels (vlan ??)
-                    port_labs = f.Labels(local_name=port_name, mac=port_mac)
-                    if 'ietf-ip:ipv6' in port and 'address' in port['ietf-ip:ipv6']:
-                        for ipv6_addr in port['ietf-ip:ipv6']['address']:
-                            ipv6_addr_ip = ipv6_addr['ip']
-                            ipv6_addr_prefix_len = ipv6_addr['prefix-length']
-                            port_labs = f.Labels().update(port_labs, local_name=port_name, ipv6=ipv6_addr_ip)
-                            # only take the first
-                            break
-                    elif regexVlanPort.search(port_name):  # skip if no ipv6 address (it's a slice vlan port)
-                        continue
-                    if 'ietf-ip:ipv4' in port and 'address' in port['ietf-ip:ipv4']:
-                        for ipv4_addr in port['ietf-ip:ipv4']['address']:
-                            ipv4_addr_ip = ipv4_addr['ip']
-                            ipv4_addr_mask = ipv4_addr['netmask']
-                            port_labs = f.Labels().update(port_labs, local_name=port_name, ipv4=ipv4_addr_ip)
-                            if port_active:
-                                port_ipv4net_map[port_nid] = {"site": site_name, "port": port_name,
-                                    "ip": ipv4_addr_ip, "netmask": ipv4_addr_mask}
-                            # only take the first
-                            break
-                    elif regexVlanPort.search(port_name):  # skip if no ipv4 address (it's a slice vlan port)
-                        continue
-                    sp = None
-                    if port_active:
-                        sp = l2_ns.add_interface(name=port_name, itype=f.InterfaceType.TrunkPort,
-                                                 node_id=port_nid, labels=port_labs,
-                                                 capacities=port_caps)
-                        if port_nid in port_ipv4net_map:
-                            port_ipv4net_map[port_nid]["interface"] = sp
-                    # add external facility stitching links
-                    # refer to port_name as stitch_port
-
-                    # add facility_ports based on stitching metadata
-                    if site_info and 'facility_ports' in site_info:
-                        for facility_name, stitch_info in site_info['facility_ports'].items():
-                            if 'stitch_port' not in stitch_info:
-                                raise NetAmArmError('no peer / stitch_port defined for facility_port: ' + facility_name)
-                            stitch_port_name = stitch_info['stitch_port'].replace(' ', '')
-                            if stitch_port_name != port_name:
-                                continue
-                            # build facility_port out of stitch_info
-                            facility_port_labs = f.Labels()
-                            if 'vlan_range' in stitch_info:
-                                if '-' in stitch_info['vlan_range']:
-                                    facility_port_labs = f.Labels.update(facility_port_labs,
-                                                                         vlan_range=stitch_info['vlan_range'].split(','))
-                                else:
-                                    facility_port_labs = f.Labels.update(facility_port_labs,
-                                                                         vlan=stitch_info['vlan_range'])
-                            if 'ipv4_net' in stitch_info:
-                                facility_port_labs = f.Labels.update(facility_port_labs,
-                                                                     ipv4_subnet=stitch_info['ipv4_net'])
-                            if 'ipv6_net' in stitch_info:
-                                facility_port_labs = f.Labels.update(facility_port_labs,
-                                                                     ipv6_subnet=stitch_info['ipv6_net'])
-                            if 'local_device' in stitch_info:
+            site_ipv4net_map, site_link_cap_map = self._build_site(node, al2s_l2_ns)
+            port_ipv4net_map.update(site_ipv4net_map)
+            port_link_cap_map.update(site_link_cap_map)
+
+        self._add_internal_links(port_ipv4net_map, port_link_cap_map)
+
+    def _build_site(self, node: dict, al2s_l2_ns) -> tuple:
+        """
+        Add the switch of one site with its network services, ports, facilities and AL2S stitches
+        to the topology. Returns this site's fragment of the port IPv4 and port/link capacity maps
+        that the final link-pairing step uses to connect sites.
+        """
+        site_ipv4net_map = {}
+        site_link_cap_map = {}
+        regexVlanPort = re.compile(r'\/\d+/\d+\/\d+\.\d+$') # ignore BE (like Bundle-Ether101.3000) for site ports
+        if 'interfaces' not in node:
+            return site_ipv4net_map, site_link_cap_map
+        # add switch node
+        node_name = node['name']
+        logging.info(f"Building model for node {node_name}")
+        # TODO: get model name from NSO
+        model_name = 'NCS 55A1-36H'
+        # TODO: get official site name from Ralph (or in switch description string) ?
+        re_site = re.findall(r'(\w+)-.+', node_name)
+        if re_site is None or len(re_site) == 0:
+            return site_ipv4net_map, site_link_cap_map
+        site_name = str.upper(re_site[0])
+        node_nid = "node+" + node_name + ":ip+" + node['address']
+        switch = self.topology.add_node(name=node_name, model=model_name, site=site_name,
+                                        node_id=node_nid, ntype=f.NodeType.Switch,
+                                        capacities=f.Capacities(unit=1),
+                                        labels=f.Labels(local_name=node_name, ipv4=node['address']))
+        l2_ns_labs = f.Labels()
+        site_info = None
+        # add FABIpv4 and FABIpv6 NetworkService
+        if self.sites_metadata and site_name in self.sites_metadata:
+            site_info = self.sites_metadata[site_name]
+            if 'l2_vlan_range' in site_info:
+                l2_ns_labs = f.Labels.update(l2_ns_labs, vlan_range=site_info['l2_vlan_range'].split(','))
+            ipv4_ns_labs = f.Labels()
+            if 'ipv4_net' in site_info:
+                ipv4_ns_labs = f.Labels.update(ipv4_ns_labs, ipv4_subnet=site_info['ipv4_net'])
+            if 'ipv4_vlan_range' in site_info:
+                ipv4_ns_labs = f.Labels.update(ipv4_ns_labs, vlan_range=site_info['ipv4_vlan_range'].split(','))
+            if 'loopback_ipv4' in node:
+                ipv4_ns_labs = f.Labels.update(ipv4_ns_labs, ipv4=node['loopback_ipv4'])
+            ipv4_ns = switch.add_network_service(name=switch.name + '-ipv4-ns', layer=f.Layer.L3,
+                                                 labels=ipv4_ns_labs,
+                                                 node_id=switch.node_id + '-ipv4-ns', nstype=f.ServiceType.FABNetv4)
+            ipv4ext_ns_labs = f.Labels()
+            if 'ipv4_public_net' in site_info:
+                ipv4ext_ns_labs = f.Labels.update(ipv4ext_ns_labs, ipv4_subnet=site_info['ipv4_public_net'])
+            if 'ipv4_vlan_range' in site_info:
+                ipv4ext_ns_labs = f.Labels.update(ipv4ext_ns_labs, vlan_range=site_info['ipv4_vlan_range'].split(','))
+            ipv4ext_ns = switch.add_network_service(name=switch.name + '-ipv4ext-ns', layer=f.Layer.L3,
+                                                 labels=ipv4ext_ns_labs,
+                                                 node_id=switch.node_id + '-ipv4ext-ns', nstype=f.ServiceType.FABNetv4Ext)
+
+            ipv6_ns_labs = f.Labels()
+            if 'ipv6_net' in site_info:
+                ipv6_ns_labs = f.Labels.update(ipv6_ns_labs, ipv6_subnet=site_info['ipv6_net'])
+            if 'ipv6_vlan_range' in site_info:
+                ipv6_ns_labs = f.Labels.update(ipv6_ns_labs, vlan_range=site_info['ipv6_vlan_range'].split(','))
+            if 'loopback_ipv6' in node:
+                ipv6_ns_labs = f.Labels.update(ipv6_ns_labs, ipv6=node['loopback_ipv6'])
+            ipv6_ns = switch.add_network_service(name=switch.name + '-ipv6-ns', layer=f.Layer.L3,
+                                                 labels=ipv6_ns_labs,
+                                                 node_id=switch.node_id + '-ipv6-ns', nstype=f.ServiceType.FABNetv6)
+            ipv6ext_ns_labs = f.Labels()
+            if 'ipv6_net' in site_info:
+                ipv6ext_ns_labs = f.Labels.update(ipv6ext_ns_labs, ipv6_subnet=site_info['ipv6_net'])
+            if 'ipv6_vlan_range' in site_info:
+                ipv6ext_ns_labs = f.Labels.update(ipv6ext_ns_labs, vlan_range=site_info['ipv6_vlan_range'].split(','))
+            ipv6ext_ns = switch.add_network_service(name=switch.name + '-ipv6ext-ns', layer=f.Layer.L3,
+                                                 labels=ipv6ext_ns_labs,
+                                                 node_id=switch.node_id + '-ipv6ext-ns', nstype=f.ServiceType.FABNetv6Ext)
+
+            l3vpn_ns_labs = f.Labels()
+            l3vpn_ns_labs = f.Labels.update(l3vpn_ns_labs, asn='398900')
+            # TODO: add more labels (per-site vlan_range and ipv4_range for bgp peering)
+            l3vpn_ns = switch.add_network_service(name=switch.name + '-l3vpn-ns', layer=f.Layer.L3,
+                                                 labels=l3vpn_ns_labs,
+                                                 node_id=switch.node_id + '-l3vpn-ns', nstype=f.ServiceType.L3VPN)
+
+        # add L2 NetworkService
+        l2_ns = switch.add_network_service(name=switch.name + '-ns', layer=f.Layer.L2, labels=l2_ns_labs,
+                                           node_id=switch.node_id + '-ns', nstype=f.ServiceType.MPLS)
+        # add ports
+        if 'interfaces' in node:
+            for port in node['interfaces']:
+                port_name = port['name']
+                if 'admin-status' in port and port ['admin-status'] == 'up':
+                    port_active = True
+                else:
+                    port_active = False
+                if 'phys-address' not in port:
+                    continue
+                port_mac = port['phys-address']
+                port_nid = f"port+{node_name}:{port_name}"
+                # get port/links capacities from site_config SoT file
+                port_link_cap = self._get_port_link_cap(site_name, port_name)
+                if port_link_cap:
+                    site_link_cap_map[port_nid] = port_link_cap
+                if 'port-capacity' in port_link_cap: # we defined
+                    speed_gbps = port_link_cap['port-capacity']
+                else: # use system default
+                    speed_gbps = int(int(port['speed']) / 1000000000)
+                # add capabilities
+                port_caps = f.Capacities(bw=speed_gbps)
+                # add labels (vlan ??)
+                port_labs = f.Labels(local_name=port_name, mac=port_mac)
+                if 'ietf-ip:ipv6' in port and 'address' in port['ietf-ip:ipv6']:
+                    for ipv6_addr in port['ietf-ip:ipv6']['address']:
+                        ipv6_addr_ip = ipv6_addr['ip']
+                        ipv6_addr_prefix_len = ipv6_addr['prefix-length']
+                        port_labs = f.Labels().update(port_labs, local_name=port_name, ipv6=ipv6_addr_ip)
+                        # only take the first
+                        break
+                elif regexVlanPort.search(port_name):  # skip if no ipv6 address (it's a slice vlan port)
+                    continue
+                if 'ietf-ip:ipv4' in port and 'address' in port['ietf-ip:ipv4']:
+                    for ipv4_addr in port['ietf-ip:ipv4']['address']:
+                        ipv4_addr_ip = ipv4_addr['ip']
+                        ipv4_addr_mask = ipv4_addr['netmask']
+                        port_labs = f.Labels().update(port_labs, local_name=port_name, ipv4=ipv4_addr_ip)
+                        if port_active:
+                            site_ipv4net_map[port_nid] = {"site": site_name, "port": port_name,
+                                "ip": ipv4_addr_ip, "netmask": ipv4_addr_mask}
+                        # only take the first
+                        break
+                elif regexVlanPort.search(port_name):  # skip if no ipv4 address (it's a slice vlan port)
+                    continue
+                sp = None
+                if port_active:
+                    sp = l2_ns.add_interface(name=port_name, itype=f.InterfaceType.TrunkPort,
+                                             node_id=port_nid, labels=port_labs,
+                                             capacities=port_caps)
+                    if port_nid in site_ipv4net_map:
+                        site_ipv4net_map[port_nid]["interface"] = sp
+                # add external facility stitching links
+                # refer to port_name as stitch_port
+
+                port_key = _normalize_port_name(port_name)
+                # add facility_ports based on stitching metadata
+                if site_info:
+                    for facility_name, stitch_info in self.facility_stitches.get(site_name, {}).get(port_key, []):
+                        # build facility_port out of stitch_info
+                        facility_port_labs = f.Labels()
+                        if 'vlan_range' in stitch_info:
+                            if '-' in stitch_info['vlan_range']:
                                 facility_port_labs = f.Labels.update(facility_port_labs,
-                                                                     device_name=stitch_info['local_device'])
-                            if 'local_port' in stitch_info:
+                                                                     vlan_range=stitch_info['vlan_range'].split(','))
+                            else:
                                 facility_port_labs = f.Labels.update(facility_port_labs,
-                                                                     local_name=stitch_info['local_port'])
-                            facility_port_caps = f.Capacities()
-                            if 'mtu' in stitch_info:
-                                facility_port_caps = f.Labels.update(facility_port_caps, mtu=stitch_info['mtu'])
-                            if 'bandwidth' in stitch_info:
-                                facility_port_caps = f.Labels.update(facility_port_caps, bw=stitch_info['bandwidth'])
-                            # create a facility with a VLAN network service and a single FacilityPort interface
-                            fac = self.topology.add_facility(name=facility_name,
-                                                             node_id=f'{port_nid}:facility+{facility_name}',
-                                                             site=site_name,
-                                                             labels=facility_port_labs, capacities=facility_port_caps)
-                            if 'description' in stitch_info:
-                                fac.interface_list[0].details = stitch_info['description']
-                            # connect it to the switch port via link
-                            if not sp:
-                                sp = l2_ns.add_interface(name=port_name, itype=f.InterfaceType.TrunkPort,
-                                                         node_id=port_nid, labels=port_labs,
-                                                         capacities=port_caps)
-                            link_caps = None
-                            link_cap_allocs = None
-                            if 'link-capacity' in port_link_cap:
-                                link_caps = f.Capacities(bw=port_link_cap['link-capacity'])
-                                if 'link-reserve-capacity' in port_link_cap:
-                                    link_cap_allocs = f.Capacities(bw=port_link_cap['link-reserve-capacity'])
-                            self.topology.add_link(name=facility_name + '-link',
-                                                   node_id=f'{port_nid}:facility+{facility_name}+link',
-                                                   ltype=f.LinkType.L2Path,  # could be Patch too
-                                                   capacities=link_caps,
-                                                   capacity_allocations=link_cap_allocs,
-                                                   interfaces=[sp, fac.interface_list[
-                                                       0]])  # there is only one interface on the facility
-
-                    # add al2s_ports based on stitching metadata
-                    if site_info and 'al2s_ports' in site_info:
-                        for al2s_port_name, al2s_stitch_info in site_info['al2s_ports'].items():
-                            if 'stitch_port' not in al2s_stitch_info:
-                                raise NetAmArmError('no peer / stitch_port defined for al2s_port: ' + al2s_port_name)
-                            stitch_port_name = al2s_stitch_info['stitch_port'].replace(' ', '')
-                            if stitch_port_name != port_name:
-                                continue
-                            al2s_port_labs = f.Labels()
-                            if 'vlan_range' in al2s_stitch_info:
-                                al2s_port_labs = f.Labels().update(al2s_port_labs, vlan_range=al2s_stitch_info['vlan_range'].split(','))
-                            al2s_sp = al2s_l2_ns.add_interface(name=al2s_port_name, itype=f.InterfaceType.TrunkPort,
-                                                    labels=al2s_port_labs, node_id='port+al2s:'+al2s_port_name,
-                                                    stitch_node=True)
-                            # connect it to the FABRIC port via link
-                            if not sp:
-                                sp = l2_ns.add_interface(name=port_name, itype=f.InterfaceType.TrunkPort,
-                                                         node_id=port_nid, labels=port_labs,
-                                                         capacities=port_caps)
-                            link_caps = None
-                            link_cap_allocs = None
-                            if 'link-capacity' in port_link_cap:
-                                link_caps = f.Capacities(bw=port_link_cap['link-capacity'])
-                                if 'link-reserve-capacity' in port_link_cap:
-                                    link_cap_allocs = f.Capacities(bw=port_link_cap['link-reserve-capacity'])
-                            self.topology.add_link(name=al2s_port_name + '-link',
-                                                   node_id=f'{port_nid}:{al2s_port_name}+link',
-                                                   ltype=f.LinkType.L2Path,  # could be Patch too
-                                                   capacities=link_caps,
-                                                   capacity_allocations=link_cap_allocs,
-                                                   interfaces=[sp, al2s_sp])
-
-        # add FABRIC Testbed internal links
+                                                                     vlan=stitch_info['vlan_range'])
+                        if 'ipv4_net' in stitch_info:
+                            facility_port_labs = f.Labels.update(facility_port_labs,
+                                                                 ipv4_subnet=stitch_info['ipv4_net'])
+                        if 'ipv6_net' in stitch_info:
+                            facility_port_labs = f.Labels.update(facility_port_labs,
+                                                                 ipv6_subnet=stitch_info['ipv6_net'])
+                        if 'local_device' in stitch_info:
+                            facility_port_labs = f.Labels.update(facility_port_labs,
+                                                                 device_name=stitch_info['local_device'])
+                        if 'local_port' in stitch_info:
+                            facility_port_labs = f.Labels.update(facility_port_labs,
+                                                                 local_name=stitch_info['local_port'])
+                        facility_port_caps = f.Capacities()
+                        if 'mtu' in stitch_info:
+                            facility_port_caps = f.Labels.update(facility_port_caps, mtu=stitch_info['mtu'])
+                        if 'bandwidth' in stitch_info:
+                            facility_port_caps = f.Labels.update(facility_port_caps, bw=stitch_info['bandwidth'])
+                        # create a facility with a VLAN network service and a single FacilityPort interface
+                        fac = self.topology.add_facility(name=facility_name,
+                                                         node_id=f'{port_nid}:facility+{facility_name}',
+                                                         site=site_name,
+                                                         labels=facility_port_labs, capacities=facility_port_caps)
+                        if 'description' in stitch_info:
+                            fac.interface_list[0].details = stitch_info['description']
+                        # connect it to the switch port via link
+                        if not sp:
+                            sp = l2_ns.add_interface(name=port_name, itype=f.InterfaceType.TrunkPort,
+                                                     node_id=port_nid, labels=port_labs,
+                                                     capacities=port_caps)
+                        link_caps = None
+                        link_cap_allocs = None
+                        if 'link-capacity' in port_link_cap:
+                            link_caps = f.Capacities(bw=port_link_cap['link-capacity'])
+                            if 'link-reserve-capacity' in port_link_cap:
+                                link_cap_allocs = f.Capacities(bw=port_link_cap['link-reserve-capacity'])
+                        self.topology.add_link(name=facility_name + '-link',
+                                               node_id=f'{port_nid}:facility+{facility_name}+link',
+                                               ltype=f.LinkType.L2Path,  # could be Patch too
+                                               capacities=link_caps,
+                                               capacity_allocations=link_cap_allocs,
+                                               interfaces=[sp, fac.interface_list[
+                                                   0]])  # there is only one interface on the facility
+
+                # add al2s_ports based on stitching metadata
+                if site_info:
+                    for al2s_port_name, al2s_stitch_info in self.al2s_stitches.get(site_name, {}).get(port_key, []):
+                        al2s_port_labs = f.Labels()
+                        if 'vlan_range' in al2s_stitch_info:
+                            al2s_port_labs = f.Labels().update(al2s_port_labs, vlan_range=al2s_stitch_info['vlan_range'].split(','))
+                        al2s_sp = al2s_l2_ns.add_interface(name=al2s_port_name, itype=f.InterfaceType.TrunkPort,
+                                                labels=al2s_port_labs, node_id='port+al2s:'+al2s_port_name,
+                                                stitch_node=True)
+                        # connect it to the FABRIC port via link
+                        if not sp:
+                            sp = l2_ns.add_interface(name=port_name, itype=f.InterfaceType.TrunkPort,
+                                                     node_id=port_nid, labels=port_labs,
+                                                     capacities=port_caps)
+                        link_caps = None
+                        link_cap_allocs = None
+                        if 'link-capacity' in port_link_cap:
+                            link_caps = f.Capacities(bw=port_link_cap['link-capacity'])
+                            if 'link-reserve-capacity' in port_link_cap:
+                                link_cap_allocs = f.Capacities(bw=port_link_cap['link-reserve-capacity'])
+                        self.topology.add_link(name=al2s_port_name + '-link',
+                                               node_id=f'{port_nid}:{al2s_port_name}+link',
+                                               ltype=f.LinkType.L2Path,  # could be Patch too
+                                               capacities=link_caps,
+                                               capacity_allocations=link_cap_allocs,
+                                               interfaces=[sp, al2s_sp])
+        return site_ipv4net_map, site_link_cap_map
+
+    def _add_internal_links(self, port_ipv4net_map: dict, port_link_cap_map: dict) -> None:
+        """
+        Pair up IPv4 ports of all sites and add FABRIC Testbed internal links between them
+        """
         for k in list(port_ipv4net_map):
             if k not in port_ipv4net_map:
                 continue
@@ -466,10 +544,14 @@ class NetworkARM:
                                         label_pools=f.Pools(atype=f.DelegationType.LABEL),
                                         capacity_pools=f.Pools(atype=f.DelegationType.CAPACITY))
 
-    def write_topology(self, file_name: str) -> None:
+    def write_topology(self, file_name: str, skip_unchanged: bool = False) -> bool:
+        """
+        Save the model, returns False if skip_unchanged found it unchanged since the last save
+        """
         if not self.topology:
             raise NetAmArmError("Topology is None")
-        self.topology.serialize(file_name=file_name)
+        # compressed if file_name ends with .gz or .zst
+        return write_model(self.topology, file_name, skip_unchanged=skip_unchanged)
 
     def get_config(self, config_file):
         if not config_file:
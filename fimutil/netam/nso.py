@@ -1,14 +1,20 @@
-import requests
+import logging
 import urllib3
 from yaml import load as yload
 from yaml import FullLoader
 import os
+
+from fimutil.common.http_client import HttpClient
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 class NsoClient:
     """
     Retrieve Network AM resources information from Cisco NSO.
     """
+    # only the interface leaves NetworkARM uses - skips e.g. per-interface 'statistics'
+    INTERFACE_FIELDS = "name;admin-status;phys-address;speed;ietf-ip:ipv4;ietf-ip:ipv6"
+    INTERFACES_PATH = "live-status/ietf-interfaces:interfaces-state/interface"
 
     def __init__(self, *, config=None, config_file=None):
         if not config:
@@ -21,17 +27,31 @@ class NsoClient:
         self.nso_user = self.config['nso_user']
         self.nso_pass = self.config['nso_pass']
         self.json_topology = None
+        # cleared once NSO fails an interface query with the fields selector
+        self.interface_fields_supported = True
+        # keep connections to NSO open between queries (and between topology builds of a long-lived client)
+        self.http = HttpClient(name='NSO', auth=(self.nso_user, self.nso_pass), verify=False,
+                               max_connections=int(self.config.get('nso_max_workers', 8)))
 
     def _get(self, ep) -> dict:
+        return self._get_response(ep)[1]
+
+    def _get_response(self, ep) -> tuple:
+        """
+        GET a RESTCONF resource, return the HTTP status code with the decoded JSON body.
+        NetAmNsoError carries the status code when NSO answered at all.
+        """
         hdr = {"Accept": "application/yang-data+json"}
         url = f"{self.nso_url}/{ep}"
+        status_code = None
         try:
-            ret = requests.get(url, auth=(self.nso_user, self.nso_pass), headers=hdr, verify=False)
+            ret = self.http.get(url, headers=hdr)
+            status_code = ret.status_code
             if not ret.text:
                 raise NetAmNsoError(f'GET {url}: Empty response')
-            return ret.json()
+            return ret.status_code, ret.json()
         except Exception as e:
-            raise NetAmNsoError(f"GET: {url}: {e}")
+            raise NetAmNsoError(f"GET: {url}: {e}", status_code=status_code)
 
     def devices(self) -> list:
         base = "tailf-ncs:devices/device"
@@ -43,10 +63,29 @@ class NsoClient:
         return ret_json['tailf-ncs:device']
 
     def interfaces(self, device_name) -> list:
-        # base = f"tailf-ncs:devices/device={device_name}/live-status/ietf-interfaces:interfaces-state/interface"
-        # params = "fields=name;admin-status;phys-address;speed;ietf-ip:ipv4;ietf-ip:ipv6"
-        # ep = f"{base}?{params}"
-        ep = f"tailf-ncs:devices/device={device_name}/live-status/ietf-interfaces:interfaces-state/interface"
+        """
+        Interfaces of a device, only their INTERFACE_FIELDS. If NSO rejects the fields selector
+        (400 Bad Request) it is not used for any device from then on, if a selected query fails
+        otherwise the device is queried again without it
+        """
+        base = f"tailf-ncs:devices/device={device_name}/{self.INTERFACES_PATH}"
+        if self.interface_fields_supported:
+            ep = f"{base}?fields={self.INTERFACE_FIELDS}"
+            try:
+                status_code, ret_json = self._get_response(ep)
+                if 'ietf-interfaces:interface' in ret_json:
+                    return ret_json['ietf-interfaces:interface']
+                reason = f"status {status_code}, 'ietf-interfaces:interface' unfound in response"
+            except NetAmNsoError as e:
+                status_code, reason = e.status_code, str(e)
+            if status_code == 400:
+                # RESTCONF answers a query it can't handle with 400 Bad Request
+                logging.warning(f'Interface fields selector rejected ({reason}), querying devices without it')
+                self.interface_fields_supported = False
+            else:
+                # a transient failure or a device that is not ready - query it again as usual
+                logging.warning(f'GET: {self.nso_url}/{ep}: {reason}, querying {device_name} without fields selector')
+        ep = base
         try:
             ret_json = self._get(ep)
         except NetAmNsoError as e:
@@ -58,6 +97,29 @@ class NsoClient:
             # raise NetAmNsoError(f"GET: {self.nso_url}/{ep}: 'ietf-interfaces:interface' unfound in response")
         return ret_json['ietf-interfaces:interface']
 
+    def interfaces_batch(self, device_names=None) -> dict:
+        """
+        Fetch the interfaces of many devices with a single RESTCONF query over the
+        device list, selecting only the INTERFACE_FIELDS of each interface.
+        Returns a dict of device name to list of interfaces (None for devices
+        that returned no interfaces). If device_names is given, other devices are dropped.
+        """
+        base = "tailf-ncs:devices/device"
+        params = f"fields=name;{self.INTERFACES_PATH}({self.INTERFACE_FIELDS})"
+        ep = f"{base}?{params}"
+        ret_json = self._get(ep)
+        if 'tailf-ncs:device' not in ret_json:
+            raise NetAmNsoError(f"GET: {self.nso_url}/{ep}: 'tailf-ncs:device' unfound in response")
+        ret = dict()
+        for dev in ret_json['tailf-ncs:device']:
+            dev_name = dev.get('name')
+            if device_names is not None and dev_name not in device_names:
+                continue
+            live_status = dev.get('live-status', dev.get('tailf-ncs:live-status', {}))
+            ifaces_state = live_status.get('ietf-interfaces:interfaces-state', {})
+            ret[dev_name] = ifaces_state.get('interface', ifaces_state.get('ietf-interfaces:interface')) or None
+        return ret
+
     def isis_interfaces(self, device_name) -> list:
         # base = f"tailf-ncs:devices/device={device_name}/live-status/ietf-interfaces:interfaces-state/interface"
         # params = "fields=name;admin-status;phys-address;speed;ietf-ip:ipv4;ietf-ip:ipv6"
@@ -93,5 +155,6 @@ class NsoClient:
 
 
 class NetAmNsoError(Exception):
-    def __init__(self, msg: str):
+    def __init__(self, msg: str, status_code: int = None):
         super().__init__(f'NetAmNsoError: {msg}')
+        self.status_code = status_code
@@ -1,11 +1,18 @@
-import requests
 from requests.auth import HTTPDigestAuth
 import json
 import os
+import time
+import hashlib
+import logging
+import subprocess
+import sys
+import threading
 from yaml import load as yload
 from yaml import FullLoader
 from jsonpath_ng.ext import parse
 
+from fimutil.common.http_client import HttpClient, HttpClientError
+
 
 class SrPceClient:
     """
@@ -22,12 +29,20 @@ class SrPceClient:
         self.sr_pce_url = self.config['sr_pce_url']
         self.sr_pce_user = self.config['sr_pce_user']
         self.sr_pce_pass = self.config['sr_pce_pass']
+        # passed on to a detached snapshot refresh, None means the default config file
+        self.config_file = config_file
         self.json_topology = None
+        self.topology_digest = None
+        self.refresh_thread = None
+        self.refresh_process = None
+        self.http = HttpClient(name='SR-PCE', auth=HTTPDigestAuth(self.sr_pce_user, self.sr_pce_pass))
 
     def get_topology_json(self) -> object:
-        s = requests.Session()
         # headers = {'X-Subscribe': 'stream'}
-        r = s.get(self.sr_pce_url, auth=HTTPDigestAuth(self.sr_pce_user, self.sr_pce_pass), stream=True)
+        try:
+            r = self.http.get(self.sr_pce_url, stream=True)
+        except HttpClientError as e:
+            raise NetAmSrPceError(f'Failed to retrieve SR-PCE topology from URL:{self.sr_pce_url} -- {e}')
         if r.status_code != 200:
             raise NetAmSrPceError(f'Failed to retrieve SR-PCE topology from URL:{self.sr_pce_url} -- error code:{r.status_code}')
         json_text = ''
@@ -36,10 +51,10 @@ class SrPceClient:
                 str_line = line.decode("utf-8")
                 json_text += str_line
         r.close()
-        s.close()
         if not json_text.startswith('{') or json_text.find('Cisco-IOS-XR-infra-xtc-oper:pce/topology-nodes/topology-node') == -1:
             raise NetAmSrPceError(f'Invalid JSON topology retrieved from SR-PCE from URL:{self.sr_pce_url}')
         self.json_topology = json.loads(json_text)
+        self.topology_digest = hashlib.sha256(json_text.encode('utf-8')).hexdigest()
         # print(json.dumps(self.json_topology['data_gpbkv'][1]))
         return self.json_topology
 
@@ -65,6 +80,71 @@ class SrPceClient:
                     ipv4_links[link_name] = (ipv4_local, ipv4_remote)
         return ipv4_links
 
+    def get_ipv4_links_cached(self, *, cache_file: str, ttl: int, background_refresh: bool = False,
+                              detached: bool = False) -> dict:
+        """
+        Return IPv4 links from a snapshot persisted in cache_file if it is younger than ttl seconds,
+        otherwise re-stream the topology from SR-PCE and update the snapshot.
+        With background_refresh an expired snapshot is still returned immediately and
+        refreshed in a separate thread (see refresh_thread), or with detached in a separate
+        process that outlives this one (see refresh_process), so a command line run
+        needn't wait for it.
+        """
+        snapshot = self._load_links_snapshot(cache_file)
+        if snapshot is not None:
+            age = time.time() - snapshot['timestamp']
+            if age < ttl:
+                logging.info(f'Using SR-PCE link snapshot from {cache_file} ({int(age)}s old, '
+                             f'digest {snapshot["digest"]})')
+                return snapshot['ipv4_links']
+            if background_refresh:
+                logging.info(f'SR-PCE link snapshot in {cache_file} expired ({int(age)}s old), '
+                             f'using it while refreshing in background')
+                if detached:
+                    self._start_detached_refresh(cache_file)
+                else:
+                    self.refresh_thread = threading.Thread(target=self._refresh_links_snapshot, args=(cache_file,),
+                                                           name='sr-pce-refresh')
+                    self.refresh_thread.start()
+                return snapshot['ipv4_links']
+        return self._refresh_links_snapshot(cache_file)
+
+    def _start_detached_refresh(self, cache_file: str):
+        cmd = [sys.executable, '-m', 'fimutil.netam.sr_pce', '--refresh-links-snapshot', cache_file]
+        if self.config_file:
+            cmd.extend(['-c', os.path.abspath(self.config_file)])
+        # own session, no inherited stdio - unaffected by this process exiting
+        self.refresh_process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                                stderr=subprocess.DEVNULL, start_new_session=True)
+        logging.info(f'Refreshing SR-PCE link snapshot in process {self.refresh_process.pid}')
+
+    def _refresh_links_snapshot(self, cache_file: str) -> dict:
+        self.get_topology_json()
+        ipv4_links = self.get_ipv4_links()
+        snapshot = {'timestamp': time.time(), 'digest': self.topology_digest, 'ipv4_links': ipv4_links}
+        # unique, a detached refresh may still be running
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as fd:
+            json.dump(snapshot, fd)
+        os.replace(tmp_file, cache_file)
+        logging.info(f'Saved SR-PCE link snapshot with {len(ipv4_links)} links to {cache_file}')
+        return ipv4_links
+
+    @staticmethod
+    def _load_links_snapshot(cache_file: str) -> dict or None:
+        try:
+            with open(cache_file, 'r') as fd:
+                snapshot = json.load(fd)
+            # JSON turns (local, remote) tuples into lists
+            snapshot['ipv4_links'] = {k: tuple(v) for k, v in snapshot['ipv4_links'].items()}
+            snapshot['timestamp'] = float(snapshot['timestamp'])
+            return snapshot
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.warning(f'Ignoring unreadable SR-PCE link snapshot {cache_file}: {e}')
+            return None
+
     def get_config(self, config_file):
         if not config_file:
             config_file = os.getenv('HOME') + '/.netam.conf'
@@ -78,3 +158,21 @@ class SrPceClient:
 class NetAmSrPceError(Exception):
     def __init__(self, msg: str):
         super().__init__(f'NetAmSrPceError: {msg}')
+
+
+def main():
+    """
+    Refresh an SR-PCE link snapshot, started detached by get_ipv4_links_cached()
+    """
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--refresh-links-snapshot", action="store", required=True,
+                        help="SR-PCE link snapshot file to refresh")
+    parser.add_argument("-c", "--config", action="store",
+                        help="config file")
+    args = parser.parse_args()
+    SrPceClient(config_file=args.config)._refresh_links_snapshot(args.refresh_links_snapshot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import logging
+import re
+import threading
+from typing import Dict, List, Tuple
+
+from fimutil.ralph.gpu import GPU, GPU_MODELS
+from fimutil.ralph.fpga import FPGA, FPGA_MODELS, PORT_REGEX, MAX_PORTS
+
+
+class AcceleratorDetector:
+    """
+    Finds GPUs and FPGAs among the custom fields of a worker node in a single pass -
+    one precompiled pattern of every model name of the GPU and FPGA tables picks the
+    fields that mention any model, which is rebuilt when the tables change (add_model()),
+    so new models do not add passes. Only those few fields are then checked for each model
+    name, so nested or overlapping names are all found, as with checking every field for
+    every model. FPGA port fields are collected in the same pass.
+    """
+    # fpga<index>_port_<port> custom fields
+    FPGA_PORT_FIELD_REGEX = re.compile(r'^fpga(\d+)_port_(\d+)$')
+    PORT_REGEX = re.compile(PORT_REGEX)
+
+    def __init__(self, *, gpu_models: List[str] = GPU_MODELS, fpga_models: List[str] = FPGA_MODELS):
+        # copies, so models added to one detector don't leak into the module tables or other detectors
+        self.tables = {GPU: list(gpu_models), FPGA: list(fpga_models)}
+        self.lock = threading.Lock()
+        self._tables_key = None
+        self._pattern = None
+
+    def add_model(self, kind: type, model: str):
+        """
+        Add a model name to the table of kind (GPU or FPGA)
+        """
+        with self.lock:
+            if model not in self.tables[kind]:
+                self.tables[kind].append(model)
+
+    def _matcher(self):
+        with self.lock:
+            key = tuple(tuple(table) for table in self.tables.values())
+            if key != self._tables_key:
+                models = {m for table in key for m in table}
+                # longest first so a name containing another one is matched whole
+                alternatives = [re.escape(m) for m in sorted(models, key=len, reverse=True)]
+                self._pattern = re.compile('|'.join(alternatives) if alternatives else '(?!)')
+                self._tables_key = key
+            return self._pattern, key
+
+    def detect(self, custom_fields: Dict[str, str]) -> Tuple[List[GPU], List[FPGA]]:
+        """
+        Return GPUs and FPGAs described by the custom fields, in field order
+        """
+        pattern, (gpu_models, fpga_models) = self._matcher()
+        matched = list()
+        ports = dict()
+        for field, value in custom_fields.items():
+            if not isinstance(value, str):
+                continue
+            port_field = self.FPGA_PORT_FIELD_REGEX.match(field)
+            if port_field:
+                ports.setdefault(int(port_field.group(1)), dict())[int(port_field.group(2))] = value
+            if pattern.search(value):
+                matched.append((field, value))
+
+        gpus = list()
+        fpgas = list()
+        for field, value in matched:
+            for model in gpu_models:
+                if model in value:
+                    logging.debug(f'Detected GPU {model}')
+                    gpus.append(self._gpu(custom_fields, field, value, model))
+        for field, value in matched:
+            for model in fpga_models:
+                if model in value:
+                    logging.debug(f'Detected FPGA {model}')
+                    fpga_index = len(fpgas) + 1
+                    fpga = self._fpga(custom_fields, field, value, model, fpga_index, ports.get(fpga_index, {}))
+                    if fpga is not None:
+                        fpgas.append(fpga)
+        return gpus, fpgas
+
+    @staticmethod
+    def _gpu(custom_fields: Dict[str, str], field: str, description: str, model: str) -> GPU:
+        # May contain multiple PCI devices depending on GPU type
+        # GPUs at CIEN rack have both an audio and video PCI device associated
+        # [root@cien-w1 ~]# lspci  | grep 25:00.
+        # 25:00.0 VGA compatible controller: NVIDIA Corporation AD102GL [RTX 6000 Ada Generation] (rev a1)
+        # 25:00.1 Audio device: NVIDIA Corporation AD102 High Definition Audio Controller (rev a1)
+        # bdf field woul show as 25:00.0 25:00.1
+        bdf = [bdf.strip() for bdf in custom_fields.get(f'{field}_pci_id', '').split()]
+        # -1 means unknown
+        numa_val = custom_fields.get(f'{field}_numa_node', '-1')
+        numa = [numa_val] * len(bdf) if bdf else [numa_val]
+        return GPU(model, description, bdf, numa)
+
+    def _fpga(self, custom_fields: Dict[str, str], field: str, description: str, model: str,
+              fpga_index: int, port_fields: Dict[int, str]) -> FPGA or None:
+        try:
+            bdf = custom_fields[field + '_pci_id']
+            sn = custom_fields[f'fpga{fpga_index}_sn']
+        except KeyError:
+            logging.error('Unable to find one of the expected FPGA fields: fpgaX_[usb_device_id, port_1, port_2]')
+            logging.error(f'Available custom fields are: {custom_fields=}')
+            return None
+        # -1 means unknown
+        numa = custom_fields.get(field + '_numa_node', '-1')
+        usb_id = custom_fields.get(f'fpga{fpga_index}_usb_device_id')
+        ports = list()
+        for port in sorted(p for p in port_fields if 1 <= p < MAX_PORTS):
+            matches = self.PORT_REGEX.match(port_fields[port])
+            if matches is not None:
+                ports.append(matches.group(1))
+        if len(ports) == 0:
+            logging.error(f'Unable to find any ports for FPGA {model}, expecting fpgaX_port_1 etc')
+        return FPGA(model, description, bdf, usb_id, sn, ports, numa)
+
+
+# shared by all worker nodes
+ACCELERATORS = AcceleratorDetector()
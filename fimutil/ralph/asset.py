@@ -1,5 +1,6 @@
+import dataclasses
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import re
 import logging
 
@@ -8,6 +9,9 @@ import pyjq
 from enum import Enum, auto
 
 from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.scan_context import ScanContext
+from fimutil.ralph.gpu import GPU
+from fimutil.ralph.fpga import FPGA
 
 
 class RalphAssetType(Enum):
@@ -39,22 +43,47 @@ class RalphAsset(ABC):
     # These are fields that require regex matching from the fields extracted in FIELD_MAP
     # unmatched regexes simply leave the field unfilled without generating errors
     REGEX_FIELDS = {}
-    PRINT_SUMMARY = False
-    LIGHTWEIGHT_SITE = False
-
-    def __init__(self, *, uri: str, ralph: RalphURI):
+    # top-level response keys parse() reads besides those in FIELD_MAP (for sparse field selection)
+    PARSE_FIELDS = ()
+    # top-level keys of a jq path, e.g. 'custom_fields' of .custom_fields.sas_disk
+    FIELD_KEY_REGEX = re.compile(r'(?<![\w\])])\.([A-Za-z_]\w*)')
+    # sites have thousands of ports - keep instances compact, subclasses must declare __slots__ too
+    __slots__ = ('uri', 'fields', 'type', 'ralph', 'raw_json_obj', '_components', 'context')
+    # slots that tie an asset to a scan rather than hold parsed data - not saved into checkpoints
+    CHECKPOINT_EXCLUDED = ('ralph', 'raw_json_obj', '_components', 'context')
+
+    def __init__(self, *, uri: str, ralph: RalphURI, context: ScanContext = None):
         self.uri = uri
-        self.fieldmap = self.FIELD_MAP
-        self.regex_fields = self.REGEX_FIELDS
         self.fields = dict()
         self.type = RalphAssetType.Abstract
         self.ralph = ralph
         self.raw_json_obj = None
-        self.components = dict()
+        self._components = None
+        # mode flags and per-scan state (standalone assets get a default context)
+        self.context = context if context is not None else ScanContext(ralph=ralph)
+
+    @classmethod
+    def sparse_fields(cls) -> Tuple[str, ...]:
+        """
+        Top-level keys of the Ralph response this asset needs - those named in
+        FIELD_MAP, PARSE_FIELDS and the asset url
+        """
+        fields = set(cls.FIELD_KEY_REGEX.findall(cls.FIELD_MAP))
+        fields.update(cls.PARSE_FIELDS)
+        fields.add('url')
+        return tuple(sorted(fields))
+
+    @property
+    def components(self) -> Dict[str, Any]:
+        # created on first use - most assets (ports, drives, models) never have components
+        if self._components is None:
+            self._components = dict()
+        return self._components
 
     def self_populate(self):
-        # save JSON object
-        self.raw_json_obj = self.ralph.get_json_object(self.uri)
+        # save JSON object (unless it was already preloaded e.g. from a bulk query)
+        if self.raw_json_obj is None:
+            self.raw_json_obj = self.ralph.get_json_object(self.uri, fields=self.sparse_fields())
         # massage results - sometimes they are part of the larger query,
         # sometimes node by itself
         try:
@@ -65,7 +94,7 @@ class RalphAsset(ABC):
 
         self.populate_fields_from_obj(json_obj=self.raw_json_obj)
         # populate regex fields
-        for k, v in self.regex_fields.items():
+        for k, v in self.REGEX_FIELDS.items():
             if isinstance(v[0], list):
                 for x in v:
                     if self.fields[x[0]] is None:
@@ -84,7 +113,7 @@ class RalphAsset(ABC):
 
     def populate_fields_from_obj(self, *, json_obj):
 
-        self.fields = pyjq.first(self.fieldmap, json_obj)
+        self.fields = pyjq.first(self.FIELD_MAP, json_obj)
 
     def get_fields(self) -> Dict[str, str]:
         return self.fields.copy()
@@ -95,27 +124,106 @@ class RalphAsset(ABC):
         """
         self.self_populate()
 
+    def release_raw_json(self):
+        """
+        Drop the raw JSON of this asset, its model and its components once parsing
+        has extracted the fields
+        """
+        self.raw_json_obj = None
+        model = getattr(self, 'model', None)
+        if isinstance(model, RalphAsset):
+            model.release_raw_json()
+        if self._components:
+            for comp in self._components.values():
+                if isinstance(comp, RalphAsset):
+                    comp.release_raw_json()
+
+    def to_checkpoint(self) -> Dict:
+        """
+        JSON-ready snapshot of the parsed asset with its model and components
+        (see from_checkpoint())
+        """
+        slots = dict()
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if slot not in self.CHECKPOINT_EXCLUDED and hasattr(self, slot):
+                    slots[slot] = _to_checkpoint(getattr(self, slot))
+        return {'Class': type(self).__name__, 'Slots': slots,
+                'Components': [[name, _to_checkpoint(comp)] for name, comp in (self._components or {}).items()]}
+
+    @classmethod
+    def from_checkpoint(cls, record: Dict, *, ralph: RalphURI, context: ScanContext, **links) -> 'RalphAsset':
+        """
+        Recreate a parsed asset from a to_checkpoint() snapshot without querying Ralph. Links
+        set attributes that are not saved (e.g. the dataplane switch of a worker)
+        """
+        asset_cls = _asset_class(cls, record['Class'])
+        asset = asset_cls.__new__(asset_cls)
+        asset.ralph = ralph
+        asset.context = context
+        asset.raw_json_obj = None
+        asset._components = None
+        for slot, value in record['Slots'].items():
+            setattr(asset, slot, _from_checkpoint(value, ralph=ralph, context=context))
+        for name, comp in record['Components']:
+            asset.components[name] = _from_checkpoint(comp, ralph=ralph, context=context)
+        for k, v in links.items():
+            setattr(asset, k, v)
+        asset.restored()
+        return asset
+
+    def restored(self):
+        """
+        Called once an asset is recreated by from_checkpoint() to rebuild derived state
+        """
+        pass
+
     def __str__(self):
         ret = list()
-        if RalphAsset.PRINT_SUMMARY:
+        if self.context.print_summary:
             ret.append(str(self.type) + ": " + (self.fields["Description"] if self.fields.get('Description')
                                                 else self.fields.get("Name", "")))
         else:
             ret.append(str(self.type) + "[" + self.uri + "]: " + json.dumps(self.fields))
-        for n, comp in self.components.items():
+        for n, comp in (self._components or {}).items():
             ret.append('\t' + n + " " + str(comp))
         return "\n".join(ret)
 
     def __repr__(self):
         return self.__str__()
 
-    @classmethod
-    def print_brief_summary(cls):
-        cls.PRINT_SUMMARY = True
 
-    @classmethod
-    def lightweight_site(cls):
-        cls.LIGHTWEIGHT_SITE = True
+def _asset_class(base: type, name: str) -> type:
+    # asset classes are found among subclasses, so this module needn't import them
+    if base.__name__ == name:
+        return base
+    for sub in base.__subclasses__():
+        found = _asset_class(sub, name)
+        if found is not None:
+            return found
+    if base is RalphAsset:
+        raise RalphJSONError(f'Unknown asset class {name} in checkpoint')
+    return None
+
+
+def _to_checkpoint(value) -> Dict:
+    if isinstance(value, RalphAsset):
+        return {'Asset': value.to_checkpoint()}
+    if isinstance(value, (GPU, FPGA)):
+        return {'Accelerator': type(value).__name__, 'Fields': dataclasses.asdict(value)}
+    if isinstance(value, RalphAssetType):
+        return {'AssetType': value.name}
+    return {'Value': value}
+
+
+def _from_checkpoint(value: Dict, *, ralph: RalphURI, context: ScanContext):
+    if 'Asset' in value:
+        return RalphAsset.from_checkpoint(value['Asset'], ralph=ralph, context=context)
+    if 'Accelerator' in value:
+        return {'GPU': GPU, 'FPGA': FPGA}[value['Accelerator']](**value['Fields'])
+    if 'AssetType' in value:
+        return RalphAssetType[value['AssetType']]
+    return value['Value']
 
 
 class RalphJSONError(Exception):
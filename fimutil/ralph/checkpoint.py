@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict
+
+
+class ScanCheckpoint:
+    """
+    Append-only JSON Lines journal of a site scan. Every Ralph response is saved
+    as it arrives ('Record': 'response') and every site asset as it is parsed
+    ('Record': 'asset' with a snapshot of the asset and its components). When resuming,
+    assets already in the journal are restored without parsing them again and responses
+    are served from it, so only what is missing is fetched again.
+    A line cut short by an interruption is ignored.
+    """
+    def __init__(self, *, checkpoint_file: str, resume: bool = False):
+        self.checkpoint_file = checkpoint_file
+        self.responses = dict()
+        self.assets = dict()
+        self.lock = threading.Lock()
+        if resume:
+            self._load()
+        else:
+            # start a new journal
+            open(self.checkpoint_file, 'w').close()
+        self.f = open(self.checkpoint_file, 'a')
+
+    def _load(self):
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.decoder.JSONDecodeError:
+                        continue
+                    if record.get('Record') == 'response':
+                        self.responses[record['URI']] = record['JSON']
+                    elif record.get('Record') == 'asset':
+                        self.assets[record['URI']] = record['Asset']
+        except FileNotFoundError:
+            logging.warning(f'No checkpoint {self.checkpoint_file} to resume from, starting from scratch')
+            return
+        logging.info(f'Resuming from {self.checkpoint_file}: {len(self.assets)} assets and '
+                      f'{len(self.responses)} Ralph responses already retrieved')
+
+    def _append(self, record: Dict):
+        line = json.dumps(record) + '\n'
+        with self.lock:
+            self.f.write(line)
+            self.f.flush()
+
+    def get_response(self, uri: str):
+        return self.responses.get(uri)
+
+    def save_response(self, uri: str, json_obj):
+        self._append({'Record': 'response', 'URI': uri, 'JSON': json_obj})
+
+    def get_asset(self, uri: str) -> Dict or None:
+        """
+        Snapshot of an asset parsed before the scan was interrupted (see RalphAsset.from_checkpoint())
+        """
+        return self.assets.get(uri)
+
+    def save_asset(self, asset):
+        self._append({'Record': 'asset', 'URI': asset.uri, 'Type': str(asset.type), 'Asset': asset.to_checkpoint()})
+
+    def remove(self):
+        """
+        Scan completed - the journal is no longer needed
+        """
+        with self.lock:
+            self.f.close()
+        os.remove(self.checkpoint_file)
@@ -3,6 +3,7 @@ import logging
 from typing import List
 
 from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.scan_context import ScanContext
 from fimutil.ralph.asset import RalphAsset, RalphAssetType, RalphAssetMimatch
 from fimutil.ralph.model import SimpleModel
 from fimutil.ralph.ethernetport import EthernetPort
@@ -12,13 +13,15 @@ class DPSwitch(RalphAsset):
     """
     Dataplane switch
     """
+    __slots__ = ('model', 'vlan_ranges')
     FIELD_MAP = '{Name: .hostname, SN: .sn, IP: .ipaddresses[0], ' \
                 'AL2S_SWITCH: .custom_fields.al2s_remote_switch_name,' \
                 'AL2S_vlans: .custom_fields.al2s_vlan_ranges, ' \
                 'Local_vlans: .custom_fields.dataplane_vlan_ranges}'
+    PARSE_FIELDS = ('model', 'ethernet')
 
-    def __init__(self, *, uri: str, ralph: RalphURI):
-        super().__init__(uri=uri, ralph=ralph)
+    def __init__(self, *, uri: str, ralph: RalphURI, context: ScanContext = None):
+        super().__init__(uri=uri, ralph=ralph, context=context)
         self.type = RalphAssetType.DPSwitch
         self.model = None
         self.vlan_ranges = None
@@ -46,7 +49,7 @@ class DPSwitch(RalphAsset):
 
         # find model
         model_url = pyjq.one('.model.url', self.raw_json_obj)
-        self.model = SimpleModel(uri=model_url, ralph=self.ralph)
+        self.model = SimpleModel(uri=model_url, ralph=self.ralph, context=self.context)
         try:
             self.model.parse()
         except RalphAssetMimatch:
@@ -60,7 +63,7 @@ class DPSwitch(RalphAsset):
 
         port_index = 1
         for port in port_urls:
-            port = EthernetPort(uri=port, ralph=self.ralph)
+            port = EthernetPort(uri=port, ralph=self.ralph, context=self.context)
             try:
                 port.parse()
             except RalphAssetMimatch:
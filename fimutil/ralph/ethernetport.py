@@ -1,17 +1,19 @@
 from fimutil.ralph.asset import RalphAsset, RalphAssetType, RalphAssetMimatch
 
 from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.scan_context import ScanContext
 
 
 class EthernetPort(RalphAsset):
     """
     This is a ethernet port on a switch (or other generic port)
     """
+    __slots__ = ()
     FIELD_MAP = '{MAC: .mac, Description: .model_name, Speed: .speed, Connection: .label}'
     REGEX_FIELDS = {'Peer_port': ['Connection', ".+port ([\\w]+[0-9/]+) .+"]}
 
-    def __init__(self, *, uri: str, ralph: RalphURI):
-        super().__init__(uri=uri, ralph=ralph)
+    def __init__(self, *, uri: str, ralph: RalphURI, context: ScanContext = None):
+        super().__init__(uri=uri, ralph=ralph, context=context)
         self.type = RalphAssetType.Ethernet
 
     def parse(self):
@@ -26,6 +28,7 @@ class EthernetCardPort(EthernetPort):
     """
     This is a port on a allocatable card in worker
     """
+    __slots__ = ()
     FIELD_MAP = '{MAC: .mac, Description: .model_name, Speed: .speed, Connection: .label}'
     # "Description": "Mellanox Technologies MT27800 Family [ConnectX-5] in PCIe Slot 3 (0000:41:00.0)"
     # "Connection": "Connected to port TwentyFiveGigE0/0/0/23/2 on lbnl-data-sw"
@@ -48,8 +51,8 @@ class EthernetCardPort(EthernetPort):
                     'Slot': ['Description', ".+Slot ([\\d]+) .*"],
                     'NUMA': ['Description', '.+ NUMA Node ([\\+\\-\\d]+).*']}
 
-    def __init__(self, *, uri: str, ralph: RalphURI):
-        super().__init__(uri=uri, ralph=ralph)
+    def __init__(self, *, uri: str, ralph: RalphURI, context: ScanContext = None):
+        super().__init__(uri=uri, ralph=ralph, context=context)
         self.type = RalphAssetType.EthernetCardPF
 
     def parse(self):
@@ -1,5 +1,5 @@
 import json
-from typing import Tuple, List, Dict, Any, Set
+from typing import Tuple, List, Dict, Any, Set, Iterable
 import logging
 import re
 from collections import defaultdict
@@ -15,11 +15,14 @@ from fim.slivers.capacities_labels import Capacities, Labels, Location, Flags
 
 from fimutil.ralph.ralph_uri import RalphURI
 from fimutil.ralph.site import Site
+from fimutil.ralph.worker_node import WorkerNode
 from fimutil.ralph.gpu import GPU
 from fimutil.ralph.fpga import FPGA
 from fimutil.ralph.ethernetport import EthernetCardPort, EthernetPort
 from fimutil.ralph.nvme import NVMeDrive
-from fimutil.ralph.asset import RalphAssetType, RalphAsset
+from fimutil.ralph.asset import RalphAssetType
+from fimutil.ralph.location_cache import LocationCache
+from fimutil.common.label_ranges import compress, iter_expand
 
 SIZE_REGEX = "([\\d.]+)[ ]?([MGTP])B?"
 SPEED_REGEX = "([\\d.]+)[ ]?([MGT])(bps)?"
@@ -323,137 +326,158 @@ def __convert_pf_list_to_interface_data(pfs: List[EthernetCardPort]) -> Tuple[Li
     return macs, bdfs, peers, numas
 
 
-def site_to_fim(site: Site, address: str, config: Dict = None) -> SubstrateTopology:
+def __add_worker(topo: SubstrateTopology, site_name: str, worker: WorkerNode, loc: Location or None,
+                 port_map: Dict[str, Interface]) -> None:
+    """
+    Add a worker node with its components to the topology, recording interfaces
+    that connect to the dataplane switch in port_map
+    """
+    # {"Name": "lbnl-w1.fabric-testbed.net", "SN": "5B3BR53"} {"Model": "R7525", "RAM": "512G", "CPU": "2", "Core": 64, "Disk": "0.0 TB"}
+    disk_size, disk_unit = __parse_size_spec(worker.model.fields['Disk'])
+    disk_size = __normalize_units(disk_size, disk_unit, 'G')
+    disk_size_int = int(disk_size)
+    ram_size, ram_unit = __parse_size_spec(worker.model.fields['RAM'])
+    ram_size = __normalize_units(ram_size, ram_unit, 'G')
+    ram_size_int = int(ram_size)
+    cap = Capacities(unit=1,
+                     cpu=int(worker.model.fields['CPU']),
+                     core=int(worker.model.fields['Core']),
+                     ram=ram_size_int,
+                     disk=disk_size_int)
+    w = topo.add_node(name=worker.fields['Name'], model=worker.model.fields['Model'],
+                      node_id=worker.fields['SN'], ntype=NodeType.Server,
+                      capacities=cap, site=site_name, location=loc, flags=Flags(ptp=worker.ptp))
+    #
+    # handle various component types
+    #
+    org = CardOrganizer()
+
+    # store runs of VF MACs, BDFs and VLANs as ranges
+    compact = worker.context.compact_labels
+
+    # NVMEs and GPUs; Network Cards (need to merge ports to cards), FPGAs (later)
+    for comp_name, comp in worker.components.items():
+        if isinstance(comp, NVMeDrive):
+            __add_nvme(w, comp_name, comp)
+        elif isinstance(comp, EthernetCardPort):
+            __process_card_port(comp, org)
+        elif isinstance(comp, GPU):
+            __add_gpu(w, comp_name, comp)
+        elif isinstance(comp, FPGA):
+            __add_fpga(w, comp_name, comp, port_map)
+
+    org.organize()
+
+    logging.debug('Adding shared SR-IOV cards')
+    # create VF components
+    for k, v_temp in org.get_shared_cards().items():
+        logging.debug(f'Processing {k} with {v_temp}')
+        # some shared NICs have one port connected, but some have two - need to be treated
+        # separately - each as a individual single port shared NIC
+        name_idx = 0
+        for v in v_temp:
+            v = [v]  # list is expected
+            parent_macs, parent_bdfs, parent_peers, parent_numas = __convert_pf_list_to_interface_data(v)
+            units = 0
+            labs = list()
+            child_bdfs = list()
+            child_numas = list()
+            for pf_parent in v:
+                child_vfs = org.get_vfs_of_parent(pf_parent.fields['BDF'])
+                macs, bdfs, vlans, numas = __convert_vf_list_to_interface_labels(child_vfs)
+                child_bdfs.extend(bdfs)
+                child_numas.extend(numas)
+                units += len(child_vfs)
+                if compact:
+                    macs, bdfs, vlans = compress(macs, 'mac'), compress(bdfs, 'bdf'), compress(vlans, 'int')
+                labs.append(Labels(mac=macs, vlan=vlans, bdf=bdfs))
+            if compact:
+                child_bdfs, child_numas = compress(child_bdfs, 'bdf'), compress(child_numas, 'int')
+            slot = v[0].fields['Slot']
+            model = v[0].fields['Model']
+            descr = v[0].fields['Description']
+            interface_node_ids = list(map(mac_to_node_id, parent_macs))
+            # to maintain backwards compatibility with models created before, we do the
+            # ('' if name_idx == 0 else 'f' + str(name_idx)) - now that we added name_idx
+            # so that without it, the names look as before
+            shnic = w.add_component(name=w.name + '-slot' + slot + ('' if name_idx == 0 else '-f' + str(name_idx)),
+                                    node_id=w.node_id + '-slot' + slot + ('' if name_idx == 0 else '-f' + str(name_idx)),
+                                    model=model,
+                                    network_service_node_id=w.node_id + '-slot' + slot + '-ns' +
+                                                            ('' if name_idx == 0 else '-f' + str(name_idx)),
+                                    # these are lists with element for every PF
+                                    interface_node_ids=interface_node_ids,
+                                    interface_labels=labs,
+                                    capacities=Capacities(unit=units),
+                                    labels=Labels(bdf=child_bdfs, numa=child_numas),
+                                    ctype=ComponentType.SharedNIC,
+                                    details=descr
+                                    )
+            # need to match interfaces of the component
+            for intf in shnic.interface_list:
+                # becase ports/interfaces on shared cards don't carry parent MAC
+                # we have to trace it back from (any) child MAC to parent MAC
+                intf_lab = intf.get_property('labels')
+                intf_bdfs = intf_lab.bdf
+                parent = org.get_parent_of_vf(next(iter_expand(intf_bdfs, 'bdf')))
+                parent_mac = parent.fields['MAC']
+                port_map[parent_peers[parent_macs.index(parent_mac)]] = intf
+            name_idx += 1
+
+    # create PF components
+    logging.debug('Adding physical cards')
+    for k, v in org.get_dedicated_cards().items():
+        logging.debug(f'Processing {v}')
+        macs, bdfs, peers, numas = __convert_pf_list_to_interface_data(v)
+        interface_node_ids = list(map(mac_to_node_id, macs))
+        labels = list()
+        for m in macs:
+            labels.append(Labels(mac=m, vlan_range='1-4096'))
+
+        # k is PCI id, v is list of EthernetCardPorts
+        smnic = w.add_component(name=w.name + '-slot' + v[0].fields['Slot'],
+                                node_id=w.node_id + '-slot' + v[0].fields['Slot'],
+                                model=v[0].fields['Model'],
+                                network_service_node_id=w.node_id + '-slot' + v[0].fields['Slot'] + '-ns',
+                                interface_node_ids=interface_node_ids,
+                                interface_labels=labels,
+                                ctype=ComponentType.SmartNIC,
+                                capacities=Capacities(unit=1),
+                                labels=Labels(bdf=bdfs, numa=numas),
+                                details=v[0].fields['Description']
+                                )
+        for intf in smnic.interface_list:
+            intf_lab = intf.get_property('labels')
+            intf_mac = intf_lab.mac
+            port_map[peers[macs.index(intf_mac)]] = intf
+
+
+def site_to_fim(site: Site, address: str, config: Dict = None,
+                location_cache: LocationCache = None, workers: Iterable[WorkerNode] = None) -> SubstrateTopology:
     """
     Produce a site substrate topology advertisements from Ralph site information.
-    Optionally supply externally obtained postal address.
+    Optionally supply externally obtained postal address and a location cache
+    to resolve it without calling the geocoder again. Workers are taken from
+    the site unless a separate iterable of workers is given (see catalog_site_to_fim).
     """
     logging.info(f'Producing SubstrateTopology model for site {site.name}')
 
     loc = None
-    if address is not None:
-        loc = Location(postal=address)
-        loc.to_latlon()
-
     if config and config.get(site.name) and config.get(site.name).get('location'):
         loc = Location.from_json(json_string=json.dumps(config.get(site.name).get('location')))
+    elif address is not None:
+        if location_cache is not None:
+            loc = location_cache.location(address)
+        else:
+            loc = Location(postal=address)
+            loc.to_latlon()
 
     topo = SubstrateTopology()
 
     port_map = dict()
     # create workers with components
-    for worker in site.workers:
-        # {"Name": "lbnl-w1.fabric-testbed.net", "SN": "5B3BR53"} {"Model": "R7525", "RAM": "512G", "CPU": "2", "Core": 64, "Disk": "0.0 TB"}
-        disk_size, disk_unit = __parse_size_spec(worker.model.fields['Disk'])
-        disk_size = __normalize_units(disk_size, disk_unit, 'G')
-        disk_size_int = int(disk_size)
-        ram_size, ram_unit = __parse_size_spec(worker.model.fields['RAM'])
-        ram_size = __normalize_units(ram_size, ram_unit, 'G')
-        ram_size_int = int(ram_size)
-        cap = Capacities(unit=1,
-                         cpu=int(worker.model.fields['CPU']),
-                         core=int(worker.model.fields['Core']),
-                         ram=ram_size_int,
-                         disk=disk_size_int)
-        w = topo.add_node(name=worker.fields['Name'], model=worker.model.fields['Model'],
-                          node_id=worker.fields['SN'], ntype=NodeType.Server,
-                          capacities=cap, site=site.name, location=loc, flags=Flags(ptp=worker.ptp))
-        #
-        # handle various component types
-        #
-        org = CardOrganizer()
-
-        # NVMEs and GPUs; Network Cards (need to merge ports to cards), FPGAs (later)
-        for comp_name, comp in worker.components.items():
-            if isinstance(comp, NVMeDrive):
-                __add_nvme(w, comp_name, comp)
-            elif isinstance(comp, EthernetCardPort):
-                __process_card_port(comp, org)
-            elif isinstance(comp, GPU):
-                __add_gpu(w, comp_name, comp)
-            elif isinstance(comp, FPGA):
-                __add_fpga(w, comp_name, comp, port_map)
-
-        org.organize()
-
-        logging.debug('Adding shared SR-IOV cards')
-        # create VF components
-        for k, v_temp in org.get_shared_cards().items():
-            logging.debug(f'Processing {k} with {v_temp}')
-            # some shared NICs have one port connected, but some have two - need to be treated
-            # separately - each as a individual single port shared NIC
-            name_idx = 0
-            for v in v_temp:
-                v = [v]  # list is expected
-                parent_macs, parent_bdfs, parent_peers, parent_numas = __convert_pf_list_to_interface_data(v)
-                units = 0
-                labs = list()
-                child_bdfs = list()
-                child_numas = list()
-                for pf_parent in v:
-                    child_vfs = org.get_vfs_of_parent(pf_parent.fields['BDF'])
-                    macs, bdfs, vlans, numas = __convert_vf_list_to_interface_labels(child_vfs)
-                    labs.append(Labels(mac=macs, vlan=vlans, bdf=bdfs))
-                    child_bdfs.extend(bdfs)
-                    child_numas.extend(numas)
-                    units += len(child_vfs)
-                slot = v[0].fields['Slot']
-                model = v[0].fields['Model']
-                descr = v[0].fields['Description']
-                interface_node_ids = list(map(mac_to_node_id, parent_macs))
-                # to maintain backwards compatibility with models created before, we do the
-                # ('' if name_idx == 0 else 'f' + str(name_idx)) - now that we added name_idx
-                # so that without it, the names look as before
-                shnic = w.add_component(name=w.name + '-slot' + slot + ('' if name_idx == 0 else '-f' + str(name_idx)),
-                                        node_id=w.node_id + '-slot' + slot + ('' if name_idx == 0 else '-f' + str(name_idx)),
-                                        model=model,
-                                        network_service_node_id=w.node_id + '-slot' + slot + '-ns' +
-                                                                ('' if name_idx == 0 else '-f' + str(name_idx)),
-                                        # these are lists with element for every PF
-                                        interface_node_ids=interface_node_ids,
-                                        interface_labels=labs,
-                                        capacities=Capacities(unit=units),
-                                        labels=Labels(bdf=child_bdfs, numa=child_numas),
-                                        ctype=ComponentType.SharedNIC,
-                                        details=descr
-                                        )
-                # need to match interfaces of the component
-                for intf in shnic.interface_list:
-                    # becase ports/interfaces on shared cards don't carry parent MAC
-                    # we have to trace it back from (any) child MAC to parent MAC
-                    intf_lab = intf.get_property('labels')
-                    intf_bdfs = intf_lab.bdf
-                    parent = org.get_parent_of_vf(intf_bdfs[0])
-                    parent_mac = parent.fields['MAC']
-                    port_map[parent_peers[parent_macs.index(parent_mac)]] = intf
-                name_idx += 1
-
-        # create PF components
-        logging.debug('Adding physical cards')
-        for k, v in org.get_dedicated_cards().items():
-            logging.debug(f'Processing {v}')
-            macs, bdfs, peers, numas = __convert_pf_list_to_interface_data(v)
-            interface_node_ids = list(map(mac_to_node_id, macs))
-            labels = list()
-            for m in macs:
-                labels.append(Labels(mac=m, vlan_range='1-4096'))
-
-            # k is PCI id, v is list of EthernetCardPorts
-            smnic = w.add_component(name=w.name + '-slot' + v[0].fields['Slot'],
-                                    node_id=w.node_id + '-slot' + v[0].fields['Slot'],
-                                    model=v[0].fields['Model'],
-                                    network_service_node_id=w.node_id + '-slot' + v[0].fields['Slot'] + '-ns',
-                                    interface_node_ids=interface_node_ids,
-                                    interface_labels=labels,
-                                    ctype=ComponentType.SmartNIC,
-                                    capacities=Capacities(unit=1),
-                                    labels=Labels(bdf=bdfs, numa=numas),
-                                    details=v[0].fields['Description']
-                                    )
-            for intf in smnic.interface_list:
-                intf_lab = intf.get_property('labels')
-                intf_mac = intf_lab.mac
-                port_map[peers[macs.index(intf_mac)]] = intf
+    for worker in (site.workers if workers is None else workers):
+        __add_worker(topo, site.name, worker, loc, port_map)
 
     # create storage
     logging.debug('Adding storage')
@@ -493,7 +517,7 @@ def site_to_fim(site: Site, address: str, config: Dict = None) -> SubstrateTopol
                        site=site.name, ntype=NodeType.Switch, stitch_node=True)
 
     # if this is a lightweight site and AL2S_vlans are specified, we use VLAN service
-    if RalphAsset.LIGHTWEIGHT_SITE and site.dp_switch.fields.get('AL2S_SWITCH'):
+    if site.context.lightweight_site and site.dp_switch.fields.get('AL2S_SWITCH'):
         dp_service_type = ServiceType.VLAN
         # for OpenStack sites add VLANs and other info
         vlans = list()
@@ -598,6 +622,22 @@ def site_to_fim(site: Site, address: str, config: Dict = None) -> SubstrateTopol
     return topo
 
 
+def catalog_site_to_fim(site: Site, address: str, config: Dict = None,
+                        location_cache: LocationCache = None, keep_workers: bool = False) -> SubstrateTopology:
+    """
+    Catalog the site and produce its topology in one pass: each worker is converted as soon
+    as it is parsed while the next worker is fetched from Ralph in the background. Unless
+    keep_workers is set, workers are not kept in site.workers, so memory stays bounded
+    regardless of site size.
+    """
+    workers = site.iter_catalog_prefetch(keep_workers=keep_workers)
+    try:
+        return site_to_fim(site, address, config, location_cache=location_cache, workers=workers)
+    finally:
+        # stop the prefetch thread if conversion failed part way
+        workers.close()
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     print(__parse_speed_spec('10 Gbps'))
@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+import threading
+from typing import Tuple
+
+
+class LocationCache:
+    """
+    Persistent on-disk cache of postal address -> (lat, lon) so repeated scans
+    don't call out to the geocoder. In offline mode the geocoder is never
+    called and addresses missing from the cache raise LocationException.
+    """
+    DEFAULT_CACHE_FILE = os.path.join(os.getenv('HOME', '/tmp'), '.scan-location-cache.json')
+
+    def __init__(self, *, cache_file: str = None, offline: bool = False):
+        self.cache_file = cache_file or self.DEFAULT_CACHE_FILE
+        self.offline = offline
+        self.entries = dict()
+        # one cache may be shared by several scans running in threads
+        self.lock = threading.Lock()
+        try:
+            with open(self.cache_file, 'r') as f:
+                entries = json.load(f)
+            if not isinstance(entries, dict):
+                raise json.decoder.JSONDecodeError('not an object of addresses', '', 0)
+            self.entries = entries
+            logging.debug(f'Loaded {len(self.entries)} geocoded addresses from {self.cache_file}')
+        except FileNotFoundError:
+            pass
+        except json.decoder.JSONDecodeError:
+            logging.warning(f'Location cache {self.cache_file} is not properly JSON-formatted, ignoring it')
+        except (OSError, UnicodeDecodeError) as e:
+            logging.warning(f'Unable to read location cache {self.cache_file}, ignoring it: {e}')
+
+    def to_latlon(self, address: str) -> Tuple[float, float]:
+        """
+        Return lat/lon of a postal address, geocoding and saving it on a cache miss
+        """
+        if address in self.entries:
+            lat, lon = self.entries[address]
+            return lat, lon
+        # fim is only imported on a cache miss - a cache hit needs no geocoder
+        from fim.slivers.capacities_labels import Location, LocationException
+        if self.offline:
+            raise LocationException(f'Address {address} is not in location cache {self.cache_file} '
+                                    f'and geocoding is disabled')
+        lat, lon = Location(postal=address).to_latlon()
+        with self.lock:
+            self.entries[address] = [lat, lon]
+            try:
+                self.save()
+            except OSError as e:
+                logging.warning(f'Unable to save location cache {self.cache_file}: {e}')
+        return lat, lon
+
+    def location(self, address: str):
+        """
+        Return a fim Location for a postal address with lat/lon filled in
+        """
+        from fim.slivers.capacities_labels import Location
+        lat, lon = self.to_latlon(address)
+        return Location(postal=address, lat=lat, lon=lon)
+
+    def save(self):
+        tmp_file = self.cache_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.cache_file)
@@ -3,6 +3,7 @@ import re
 import logging
 
 from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.scan_context import ScanContext
 from fimutil.ralph.asset import RalphAsset, RalphAssetType
 
 
@@ -10,10 +11,11 @@ class SimpleModel(RalphAsset):
     """
     Some assets have a separate model entry that behaves like an asset.
     """
+    __slots__ = ()
     FIELD_MAP = '{Model: .category.name}'
 
-    def __init__(self, *, uri: str, ralph: RalphURI):
-        super().__init__(uri=uri, ralph=ralph)
+    def __init__(self, *, uri: str, ralph: RalphURI, context: ScanContext = None):
+        super().__init__(uri=uri, ralph=ralph, context=context)
         self.type = RalphAssetType.Model
 
     def parse(self):
@@ -24,13 +26,14 @@ class WorkerModel(SimpleModel):
     """
     Worker model has extra info like total RAM and cores that we need
     """
+    __slots__ = ()
     FIELD_MAP = '{Model: .category.name, RAM: .custom_fields.total_memory_ram, ' \
                 'CPU: .custom_fields.cpu_socket_count, Core: .cores_count}'
     # .*? to make the first match lazy
     DISK_REGEX = ".*?([\\d.]+)([TGM]B).*"
 
-    def __init__(self, *, uri: str, ralph: RalphURI):
-        super().__init__(uri=uri, ralph=ralph)
+    def __init__(self, *, uri: str, ralph: RalphURI, context: ScanContext = None):
+        super().__init__(uri=uri, ralph=ralph, context=context)
 
     def parse(self):
         super().parse()
@@ -64,12 +67,14 @@ class StorageModel(SimpleModel):
     """
     Storage model has extra info like total disks
     """
+    __slots__ = ()
     FIELD_MAP = '{Model: .category.name}'
+    PARSE_FIELDS = ('custom_fields',)
     # .*? to make the first match lazy
     DISK_REGEX = ".*?([\\d.]+)([TGMP]B).*"
 
-    def __init__(self, *, uri: str, ralph: RalphURI):
-        super().__init__(uri=uri, ralph=ralph)
+    def __init__(self, *, uri: str, ralph: RalphURI, context: ScanContext = None):
+        super().__init__(uri=uri, ralph=ralph, context=context)
 
     def parse(self):
         super().parse()
@@ -1,12 +1,14 @@
 from fimutil.ralph.asset import RalphAsset, RalphAssetType, RalphAssetMimatch
 
 from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.scan_context import ScanContext
 
 
 class NVMeDrive(RalphAsset):
     """
     This class knows how to parse necessary worker fields in Ralph
     """
+    __slots__ = ()
     FIELD_MAP = '{SN: .serial_number, Description: .model_name}'
     # "Description": "Dell Express Flash NVMe P4510 1TB SFF in PCIe SSD Slot 22 in Bay 2 (0000:21:00.0)",
     # "BDF": "0000:21:00.0"
@@ -17,8 +19,8 @@ class NVMeDrive(RalphAsset):
                     'Disk': ["Description", ".+ ([\\d]+[MGTP]B|[\\d]+[MGTP]) .*"],
                     'NUMA': ["Description", ".+ NUMA Node ([\\+\\-\\d]+).*"]}
 
-    def __init__(self, *, uri: str, ralph: RalphURI):
-        super().__init__(uri=uri, ralph=ralph)
+    def __init__(self, *, uri: str, ralph: RalphURI, context: ScanContext = None):
+        super().__init__(uri=uri, ralph=ralph, context=context)
         self.type = RalphAssetType.NVMe
 
     def parse(self):
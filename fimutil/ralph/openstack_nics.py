@@ -0,0 +1,113 @@
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, List
+
+
+class OpenStackNicBlock:
+    """
+    MAC addresses of a contiguous range of OpenStack vNIC indices of one worker,
+    kept as an array of 48-bit integers. vBDFs are derived from the indices.
+    """
+    __slots__ = ('worker', 'start', 'macs')
+
+    def __init__(self, *, worker: str, start: int, macs: array):
+        self.worker = worker
+        self.start = start
+        self.macs = macs
+
+    def __len__(self):
+        return len(self.macs)
+
+    def indices(self) -> range:
+        return range(self.start, self.start + len(self.macs))
+
+    def mac(self, index: int) -> str:
+        return self.mac_str(self.macs[index - self.start])
+
+    @staticmethod
+    def mac_str(mac: int) -> str:
+        h = f'{mac:012x}'
+        return f'{h[0:2]}:{h[2:4]}:{h[4:6]}:{h[6:8]}:{h[8:10]}:{h[10:12]}'
+
+    @staticmethod
+    def vbdf(index: int) -> str:
+        """
+        vBDF of a vNIC is a reflection of its index - 0000:<high byte>:<low byte>.0
+        """
+        return f'0000:{index >> 8:02x}:{index & 0xff:02x}.0'
+
+    def mac_strings(self) -> List[str]:
+        return [self.mac_str(mac) for mac in self.macs]
+
+    def vbdf_strings(self) -> List[str]:
+        return [self.vbdf(index) for index in self.indices()]
+
+
+class OpenStackNicAllocator:
+    """
+    Allocates OpenStack vNIC MAC addresses of a site a worker at a time. A MAC is
+    the site offset (2 octets, from config file), the worker index (1 octet, from the
+    worker name) and the vNIC index (3 octets). The offset is validated once; allocated
+    blocks are kept so the whole site can be checked for duplicate MACs.
+    """
+    # first octet must be even
+    MAC_OFFSET_REGEX = r'([a-fA-F0-9][aceACE02468])[:-]([a-fA-F0-9]{2})'
+    WORKER_NAME_REGEX = r'^[\w]+-w([\d]+).fabric-testbed.net$'
+    MAX_VNICS = 4096
+
+    def __init__(self, site_offset: str):
+        if not site_offset:
+            raise RuntimeError('OpenStack MAC address offset for the site is not set')
+        m = re.match(self.MAC_OFFSET_REGEX, site_offset)
+        if not m:
+            raise RuntimeError(f'OpenStack MAC address offset for the site must match the '
+                               f'following regex: {self.MAC_OFFSET_REGEX}')
+        self.prefix = int(m[1] + m[2], 16) << 32
+        self.worker_name_regex = re.compile(self.WORKER_NAME_REGEX)
+        self.blocks = list()
+        self.lock = threading.Lock()
+
+    def allocate(self, worker: str, *, start: int = 1, count: int = 1) -> OpenStackNicBlock:
+        """
+        Allocate MACs of vNIC indices start to start + count - 1 of a worker (FQDN)
+        """
+        m = self.worker_name_regex.match(worker or '')
+        if not m:
+            raise RuntimeError(f'Worker name {worker} doesnt match expected regex')
+        w_index = int(m[1])
+        if w_index > 0xff:
+            raise RuntimeError(f'Worker index of {worker} does not fit into a MAC address octet')
+        if start < 0 or start + count > self.MAX_VNICS:
+            raise RuntimeError(f'vNIC indices {start}-{start + count - 1} of {worker} are out of range, '
+                               f'at most {self.MAX_VNICS} are supported')
+        base = self.prefix | (w_index << 24)
+        block = OpenStackNicBlock(worker=worker, start=start, macs=array('Q', range(base + start, base + start + count)))
+        with self.lock:
+            self.blocks.append(block)
+        return block
+
+    def collisions(self) -> Dict[str, List[str]]:
+        with self.lock:
+            blocks = list(self.blocks)
+        return self.find_collisions(blocks)
+
+    @staticmethod
+    def find_collisions(blocks: Iterable[OpenStackNicBlock]) -> Dict[str, List[str]]:
+        """
+        Find MACs allocated more than once across blocks in one pass over all of them
+        sorted together. Returns the workers using each duplicate MAC
+        """
+        blocks = list(blocks)
+        macs = array('Q')
+        for block in blocks:
+            macs.extend(block.macs)
+        ordered = sorted(macs)
+        duplicates = {a for a, b in zip(ordered, ordered[1:]) if a == b}
+        ret = dict()
+        if not duplicates:
+            return ret
+        for block in blocks:
+            for mac in duplicates.intersection(block.macs):
+                ret.setdefault(OpenStackNicBlock.mac_str(mac), list()).append(block.worker)
+        return ret
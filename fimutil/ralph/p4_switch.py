@@ -2,6 +2,7 @@ import pyjq
 import logging
 
 from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.scan_context import ScanContext
 from fimutil.ralph.asset import RalphAsset, RalphAssetType, RalphAssetMimatch
 from fimutil.ralph.model import SimpleModel
 from fimutil.ralph.ethernetport import EthernetPort
@@ -11,10 +12,12 @@ class P4Switch(RalphAsset):
     """
     Dataplane switch
     """
+    __slots__ = ('model',)
     FIELD_MAP = '{Name: .hostname, SN: .sn, IP: .ipaddresses[0]}'
+    PARSE_FIELDS = ('model', 'ethernet')
 
-    def __init__(self, *, uri: str, ralph: RalphURI):
-        super().__init__(uri=uri, ralph=ralph)
+    def __init__(self, *, uri: str, ralph: RalphURI, context: ScanContext = None):
+        super().__init__(uri=uri, ralph=ralph, context=context)
         self.type = RalphAssetType.P4Switch
         self.model = None
 
@@ -23,7 +26,7 @@ class P4Switch(RalphAsset):
 
         # find model
         model_url = pyjq.one('.model.url', self.raw_json_obj)
-        self.model = SimpleModel(uri=model_url, ralph=self.ralph)
+        self.model = SimpleModel(uri=model_url, ralph=self.ralph, context=self.context)
         try:
             self.model.parse()
         except RalphAssetMimatch:
@@ -37,7 +40,7 @@ class P4Switch(RalphAsset):
 
         port_index = 1
         for port in port_urls:
-            port = EthernetPort(uri=port, ralph=self.ralph)
+            port = EthernetPort(uri=port, ralph=self.ralph, context=self.context)
             try:
                 port.parse()
             except RalphAssetMimatch:
@@ -55,7 +58,7 @@ class P4Switch(RalphAsset):
         """
         dp_ports = list()
         for n, comp in self.components.items():
-            if comp.__dict__.get('type') and comp.type == RalphAssetType.EthernetCardPF:
+            if getattr(comp, 'type', None) and comp.type == RalphAssetType.EthernetCardPF:
                 if comp.fields.get('Peer_port'):
                     dp_ports.append(comp.fields.get('Peer_port'))
 
@@ -1,39 +1,121 @@
-import urllib3
-import json
-import ssl
 import logging
+import time
+from dataclasses import dataclass
+from typing import List, Iterable
+from urllib.parse import urlencode, urlsplit, parse_qs
+
+from fimutil.common.http_client import HttpClient, HttpClientError
+from fimutil.common.rate_control import TokenBucket, AimdLimiter
+from fimutil.common.hedging import Hedger
+from fimutil.ralph.checkpoint import ScanCheckpoint
+
+
+@dataclass(frozen=True)
+class RequestSettings:
+    """
+    How RalphURI paces its requests. Optionally caps the request rate (max_rate
+    requests/second) and adapts the number of concurrent requests (up to max_concurrency)
+    to Ralph's latency and 429/5xx responses, so parallel scans don't overload it.
+    With hedge, a GET slower than the hedge_percentile of recent ones is duplicated
+    and the first response wins, for at most hedge_budget of all GETs.
+    """
+    max_rate: float = None
+    adaptive_concurrency: bool = False
+    max_concurrency: int = 32
+    latency_target: float = 2.0
+    hedge: bool = False
+    hedge_percentile: float = 0.95
+    hedge_budget: float = 0.05
 
 
 class RalphURI:
     """
     Load JSON file from a Ralph URI. Deal with authentication.
+    Requests are paced according to settings (see RequestSettings).
+    With a checkpoint, responses are journaled and served from it when resuming.
+    With sparse_fields, GETs that name the fields they need ask Ralph for only those
+    (Ralph versions whose API ignores the parameter simply return every field).
+    With http2, concurrent requests share one multiplexed HTTP/2 connection.
     """
+    # query parameter selecting returned fields
+    FIELDS_PARAM = 'fields'
 
-    def __init__(self, *, token: str, base_uri: str, disable_ssl: False):
+    def __init__(self, *, token: str, base_uri: str, disable_ssl: False, settings: RequestSettings = None,
+                 checkpoint: ScanCheckpoint = None, sparse_fields: bool = False,
+                 http2: bool = False):
         self.token = token
         if not base_uri.endswith('/'):
             base_uri += '/'
         self.base_uri = base_uri
         if disable_ssl:
             logging.warning('Disabling server SSL certificate validation')
-            cert_reqs = ssl.CERT_NONE
-            urllib3.disable_warnings()
-        else:
-            cert_reqs = ssl.CERT_REQUIRED
-
-        self.pool = urllib3.PoolManager(cert_reqs=cert_reqs)
+        if settings is None:
+            settings = RequestSettings()
+        self.settings = settings
+        self.http = HttpClient(name='Ralph', verify=not disable_ssl, max_connections=settings.max_concurrency,
+                               http2=http2, headers={'Authorization': f'Token {self.token}',
+                                                     'Content-Type': 'application/json'})
+        self.rate_limiter = TokenBucket(rate=settings.max_rate) if settings.max_rate else None
+        self.concurrency = AimdLimiter(maximum=settings.max_concurrency, latency_target=settings.latency_target) \
+            if settings.adaptive_concurrency else None
+        self.hedger = Hedger(percentile=settings.hedge_percentile, budget=settings.hedge_budget,
+                             max_workers=settings.max_concurrency) if settings.hedge else None
+        self.checkpoint = checkpoint
+        self.sparse_fields = sparse_fields
 
-    def get_json_object(self, uri: str):
+    def get_json_object(self, uri: str, fields: Iterable[str] = None):
+        """
+        GET a Ralph URI, fields are the top-level keys the caller needs
+        """
         # avoid http->https redirects, just replace directly in uri
         uri = uri.replace('http:', 'https:')
         if not uri.startswith(self.base_uri):
             raise RalphURIError(msg=f'Provided uri {uri} does not match base uri {self.base_uri}')
-        headers = {'Authorization': f'Token {self.token}', 'Content-Type': 'application/json'}
-        r = self.pool.request("GET", uri, headers=headers)
-        if r.status != 200:
-            raise RuntimeError(f'Unable to contact {uri=} due to error {r.status=}')
+        # 'next' links of list queries already carry the parameter
+        if self.sparse_fields and fields and self.FIELDS_PARAM not in parse_qs(urlsplit(uri).query):
+            uri += ('&' if '?' in uri else '?') + urlencode({self.FIELDS_PARAM: ','.join(fields)}, safe=',')
+        if self.checkpoint is not None:
+            json_obj = self.checkpoint.get_response(uri)
+            if json_obj is not None:
+                return json_obj
+        if self.hedger is not None:
+            json_obj = self.hedger.call(self._get_json, uri)
+        else:
+            json_obj = self._get_json(uri)
+        if self.checkpoint is not None:
+            self.checkpoint.save_response(uri, json_obj)
+        return json_obj
+
+    def get_all_results(self, uri: str, fields: Iterable[str] = None) -> List:
+        """
+        Get 'results' of a list query following all of its pages
+        """
+        results = list()
+        while uri:
+            page = self.get_json_object(uri, fields=fields)
+            results.extend(page.get('results', list()))
+            uri = page.get('next')
+        return results
+
+    def _get_json(self, uri: str):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        if self.concurrency is not None:
+            self.concurrency.acquire()
+        start = time.monotonic()
+        overloaded = True
+        try:
+            r = self.http.get(uri)
+            overloaded = r.status_code == 429 or r.status_code >= 500 or HttpClient.retry_count(r) > 0
+        except HttpClientError as e:
+            raise RuntimeError(f'Unable to contact {uri=} due to error {e}')
+        finally:
+            if self.concurrency is not None:
+                self.concurrency.release(latency=time.monotonic() - start, overloaded=overloaded)
+        if r.status_code != 200:
+            raise RuntimeError(f'Unable to contact {uri=} due to error {r.status_code=}')
 
-        return json.loads(r.data.decode("utf-8"))
+        return r.json()
 
 
 class RalphURIError(Exception):
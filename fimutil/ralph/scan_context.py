@@ -0,0 +1,61 @@
+import threading
+from typing import Dict, List
+
+from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.openstack_nics import OpenStackNicAllocator
+
+
+class ScanContext:
+    """
+    State of a single site scan - mode flags, static configuration, Ralph client
+    and the OpenStack NIC index and MAC allocators. It is handed from Site to every asset it
+    creates, so different sites can be scanned back to back or in parallel threads
+    of one process without interfering with each other.
+    """
+    # don't start at 1 - that's typically 'uplink'
+    OPENSTACK_NIC_INDEX_START = 10
+
+    def __init__(self, *, ralph: RalphURI = None, config: Dict = None, print_summary: bool = False,
+                 lightweight_site: bool = False, release_raw_json: bool = False, catalog_concurrency: int = 4,
+                 compact_labels: bool = False):
+        self.ralph = ralph
+        self.config = config
+        # print only a brief description of assets
+        self.print_summary = print_summary
+        # OpenStack site - vNICs instead of scanning ethernet ports
+        self.lightweight_site = lightweight_site
+        # drop raw JSON of assets once they are parsed
+        self.release_raw_json = release_raw_json
+        # how many catalog lookups (switches, storage, workers) run at once
+        self.catalog_concurrency = catalog_concurrency
+        # store runs of SR-IOV/vNIC labels in the model as ranges (see fimutil.common.label_ranges)
+        self.compact_labels = compact_labels
+        self._openstack_nic_index = self.OPENSTACK_NIC_INDEX_START
+        self._openstack_mac_allocators = dict()
+        self._lock = threading.Lock()
+
+    def next_openstack_nic_index(self) -> int:
+        """
+        Allocate the next OpenStack parent NIC index (one per worker) for this scan
+        """
+        with self._lock:
+            index = self._openstack_nic_index
+            self._openstack_nic_index += 1
+        return index
+
+    def openstack_mac_allocator(self, site_offset: str) -> OpenStackNicAllocator:
+        """
+        OpenStack vNIC MAC allocator of this scan for a site MAC offset
+        """
+        with self._lock:
+            if site_offset not in self._openstack_mac_allocators:
+                self._openstack_mac_allocators[site_offset] = OpenStackNicAllocator(site_offset)
+            return self._openstack_mac_allocators[site_offset]
+
+    def openstack_mac_collisions(self) -> Dict[str, List[str]]:
+        """
+        MACs allocated to more than one vNIC in this scan and the workers using them
+        """
+        with self._lock:
+            allocators = list(self._openstack_mac_allocators.values())
+        return OpenStackNicAllocator.find_collisions(block for a in allocators for block in a.blocks)
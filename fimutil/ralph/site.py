@@ -1,12 +1,24 @@
+import functools
 import logging
+import queue
+import shutil
+import tempfile
+import threading
 from abc import ABC
 from urllib.parse import urlencode
 import pyjq
-from typing import Dict
+from typing import Dict, Iterable, List, TextIO
 import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
+from fimutil.common.task_graph import TaskGraph
 from fimutil.ralph.p4_switch import P4Switch
 from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.scan_context import ScanContext
+from fimutil.ralph.asset import RalphAsset
 from fimutil.ralph.worker_node import WorkerNode
 from fimutil.ralph.storage import Storage
 from fimutil.ralph.dp_switch import DPSwitch
@@ -17,9 +29,11 @@ class Site:
     As site consists of some number of assets - for information model purposes
     typically some number of worker nodes, a storage node and a dataplane switch.
     """
-    def __init__(self, *, site_name: str, ralph: RalphURI, config: Dict = None, domain: str = '.fabric-testbed.net'):
+    def __init__(self, *, site_name: str, ralph: RalphURI, config: Dict = None, domain: str = '.fabric-testbed.net',
+                 context: ScanContext = None):
         """
-        Site name can be upper or lower case
+        Site name can be upper or lower case. Mode flags (brief summary, lightweight site, raw
+        JSON release) come from the scan context, which is shared with every asset of this site.
         """
         self.workers = list()
         self.storage = None
@@ -30,6 +44,7 @@ class Site:
         self.domain = domain
         self.ralph = ralph
         self.config = config
+        self.context = context if context is not None else ScanContext(ralph=ralph, config=config)
 
     def catalog(self):
         """
@@ -40,9 +55,109 @@ class Site:
         - dp switch: <site>-data-sw.fabric-testbed.net
         - PTP server: <site>-time.fabric-testbed.net
         """
+        for _ in self.iter_catalog():
+            pass
+
+    def iter_catalog_prefetch(self, *, keep_workers: bool = False, depth: int = 2):
+        """
+        Run iter_catalog() in a background thread and return an iterator over its workers,
+        so the caller can process a worker while the next ones (up to depth) are fetched.
+        Exceptions from cataloging are re-raised in the caller. Closing the iterator (or
+        leaving it early) stops the background thread.
+        """
+        q = queue.Queue(maxsize=depth)
+        done = object()
+        # set when the consumer stops early, so the producer does not block on a full queue
+        cancelled = threading.Event()
+
+        def put(item) -> bool:
+            while not cancelled.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            catalog = self.iter_catalog(keep_workers=keep_workers)
+            try:
+                for worker in catalog:
+                    if not put(worker):
+                        return
+            except BaseException as e:
+                put(e)
+                return
+            finally:
+                # stops the catalog task graph if the consumer gave up early
+                catalog.close()
+            put(done)
+
+        def consume():
+            producer = threading.Thread(target=produce, name=f'catalog-{self.name}', daemon=True)
+            producer.start()
+            try:
+                while True:
+                    item = q.get()
+                    if item is done:
+                        return
+                    if isinstance(item, BaseException):
+                        raise item
+                    yield item
+            finally:
+                cancelled.set()
+                producer.join()
+
+        return consume()
+
+    def iter_catalog(self, *, keep_workers: bool = True):
+        """
+        Same as catalog(), but yields each worker as soon as it is parsed (in discovery
+        order). Workers are added to self.workers only if keep_workers is set.
+        Discovery runs as a graph of tasks - the DP switch, P4 switch, PTP server, storage
+        and the worker list are looked up concurrently, and each worker is parsed as soon
+        as the DP switch and PTP lookups it depends on are done.
+        """
+        graph = TaskGraph(name=f'catalog-{self.name}', max_workers=self.context.catalog_concurrency)
+        graph.add('dp_switch', self.__catalog_dp_switch)
+        graph.add('p4_switch', self.__catalog_p4_switch)
+        graph.add('ptp', self.__catalog_ptp)
+        graph.add('storage', self.__catalog_storage)
+        graph.add('worker_urls', self.__find_worker_urls)
+        graph.start()
+        try:
+            worker_urls = graph.result('worker_urls')
+            for index, worker in enumerate(worker_urls):
+                # allocate OpenStack NIC indices in discovery order, not in order of parsing
+                nic_index = self.context.next_openstack_nic_index() if self.context.lightweight_site else None
+                graph.add(f'worker-{index}', functools.partial(self.__catalog_worker, worker, nic_index),
+                          deps=('worker_urls', 'dp_switch', 'ptp'))
+            for index in range(len(worker_urls)):
+                ralph_worker = graph.result(f'worker-{index}')
+                if keep_workers:
+                    self.workers.append(ralph_worker)
+                yield ralph_worker
+            graph.wait()
+        finally:
+            graph.cancel()
+        logging.info(f'Catalog critical path: {graph.critical_path_str()}')
+        if self.context.lightweight_site:
+            self.__check_openstack_macs()
+
+    def __check_openstack_macs(self):
+        """
+        vNIC MACs must be unique across the site (e.g. renc-w1 and renc-w01 would collide)
+        """
+        collisions = self.context.openstack_mac_collisions()
+        if collisions:
+            for mac, workers in sorted(collisions.items())[:10]:
+                logging.error(f'OpenStack vNIC MAC {mac} is allocated to more than one vNIC of {workers}')
+            raise RuntimeError(f'{len(collisions)} duplicate OpenStack vNIC MACs in site {self.name}')
+
+    def __catalog_dp_switch(self):
         query = {'hostname': f'{self.name.lower()}-data-sw' + self.domain}
         results = self.ralph.get_json_object(self.ralph.base_uri + 'data-center-assets/?' +
-                                             urlencode(query))
+                                             urlencode(query), fields=('url',))
 
         # config file can override dp switch URL
         dp_switch_url = None
@@ -61,28 +176,36 @@ class Site:
             logging.info(f'Identified DP switch {dp_switch_url=}')
             if not dp_switch_url:
                 raise ValueError
-            self.dp_switch = DPSwitch(uri=dp_switch_url, ralph=self.ralph)
-            self.dp_switch.parse()
+            self.dp_switch = self.__restore_asset(dp_switch_url)
+            if self.dp_switch is None:
+                self.dp_switch = DPSwitch(uri=dp_switch_url, ralph=self.ralph, context=self.context)
+                self.dp_switch.parse()
+                self.__asset_parsed(self.dp_switch)
         except ValueError:
             logging.warning('Unable to find a dataplane switch in site, continuing')
 
+    def __catalog_p4_switch(self):
         try:
             logging.info(f'Searching for P4 switch URL')
             query = {'hostname': f'{self.name.lower()}-p4-sw' + self.domain}
             results = self.ralph.get_json_object(self.ralph.base_uri + 'data-center-assets/?' +
-                                                 urlencode(query))
+                                                 urlencode(query), fields=('url',))
             p4_switch_url = pyjq.one('[ .results[0].url ]', results)[0]
             if not p4_switch_url:
                 raise ValueError
             logging.info(f'Identified P4 switch {p4_switch_url=}')
-            self.p4_switch = P4Switch(uri=p4_switch_url, ralph=self.ralph)
-            self.p4_switch.parse()
+            self.p4_switch = self.__restore_asset(p4_switch_url)
+            if self.p4_switch is None:
+                self.p4_switch = P4Switch(uri=p4_switch_url, ralph=self.ralph, context=self.context)
+                self.p4_switch.parse()
+                self.__asset_parsed(self.p4_switch)
         except ValueError:
             logging.warning('Unable to find a p4 switch in site, continuing')
 
+    def __catalog_ptp(self):
         query = {'hostname': f'{self.name.lower()}-time' + self.domain}
         results = self.ralph.get_json_object(self.ralph.base_uri + 'data-center-assets/?' +
-                                             urlencode(query))
+                                             urlencode(query), fields=('url',))
 
         if self.config and self.config.get(self.name) and self.config.get(self.name).get('ptp'):
             ptp_override = self.config.get(self.name).get('ptp')
@@ -102,10 +225,11 @@ class Site:
             except ValueError:
                 logging.warning('Unable to find PTP server in site, continuing')
 
+    def __find_worker_urls(self) -> List[str]:
         #query = {'hostname__regex': f'{self.name.lower()}-w[0123456789]' + self.domain}
         query = {'hostname__startswith': f'{self.name.lower()}-w','limit': 100}
         results = self.ralph.get_json_object(self.ralph.base_uri + 'data-center-assets/?' +
-                                             urlencode(query))
+                                             urlencode(query), fields=('url',))
 
         worker_urls = list()
         worker_urls.extend(pyjq.one('[ .results[].url ]', results))
@@ -120,31 +244,63 @@ class Site:
         #worker_urls.extend(pyjq.one('[ .results[].url ]', results))
 
         logging.info(f'Identified {len(worker_urls)} workers')
+        return worker_urls
 
-        for worker in worker_urls:
-            logging.info(f'Parsing {worker=}')
-            ralph_worker = WorkerNode(uri=worker, ralph=self.ralph, site=self.name,
-                                      dp_switch=self.dp_switch, config=self.config, ptp=self.ptp)
-            ralph_worker.parse()
-            self.workers.append(ralph_worker)
+    def __catalog_worker(self, worker: str, nic_index: int = None) -> WorkerNode:
+        ralph_worker = self.__restore_asset(worker, dp_switch=self.dp_switch, config=self.config)
+        if ralph_worker is not None:
+            return ralph_worker
+        logging.info(f'Parsing {worker=}')
+        ralph_worker = WorkerNode(uri=worker, ralph=self.ralph, site=self.name,
+                                  dp_switch=self.dp_switch, config=self.config, ptp=self.ptp,
+                                  context=self.context, nic_index=nic_index)
+        ralph_worker.parse()
+        self.__asset_parsed(ralph_worker)
+        return ralph_worker
 
+    def __catalog_storage(self):
         query = {'hostname': f'{self.name.lower()}-storage' + self.domain}
         results = self.ralph.get_json_object(self.ralph.base_uri + 'data-center-assets/?' +
-                                             urlencode(query))
+                                             urlencode(query), fields=('url',))
         storage_url = None
         try:
             storage_url = pyjq.one('[ .results[0].url ]', results)[0]
             logging.info(f'Identified storage {storage_url=}')
             if not storage_url:
                 raise ValueError
-            self.storage = Storage(uri=storage_url, ralph=self.ralph)
-            self.storage.parse()
+            self.storage = self.__restore_asset(storage_url)
+            if self.storage is None:
+                self.storage = Storage(uri=storage_url, ralph=self.ralph, context=self.context)
+                self.storage.parse()
+                self.__asset_parsed(self.storage)
             if self.config and self.config.get(self.name) and self.config.get(self.name).get("storage"):
                 storage_override = self.config.get(self.name).get("storage")
                 self.storage.model.fields['Disk'] = storage_override['Disk']
         except ValueError:
             logging.warning('Unable to find storage node in site, continuing')
 
+    def __asset_parsed(self, asset: RalphAsset):
+        """
+        Journal a freshly parsed asset, so a resumed scan doesn't parse it again
+        """
+        if self.ralph.checkpoint is not None:
+            self.ralph.checkpoint.save_asset(asset)
+        if self.context.release_raw_json:
+            asset.release_raw_json()
+
+    def __restore_asset(self, uri: str, **links) -> RalphAsset or None:
+        """
+        Asset parsed by the interrupted scan being resumed, None if there isn't one
+        """
+        if self.ralph.checkpoint is None:
+            return None
+        record = self.ralph.checkpoint.get_asset(uri)
+        if record is None:
+            return None
+        asset = RalphAsset.from_checkpoint(record, ralph=self.ralph, context=self.context, **links)
+        logging.info(f'Restored {asset.type} {uri} from checkpoint')
+        return asset
+
     def __str__(self):
         assets = list()
         if self.storage:
@@ -157,7 +313,12 @@ class Site:
             assets.append(str(w))
         return '\n'.join(assets)
 
-    def to_json(self):
+    def assets_json(self, worker_dp_ports: List[str] = None) -> Dict:
+        """
+        JSON-ready dict of site-wide assets (storage, dataplane and P4 switches) with
+        the dataplane switch ports the workers are connected to (those of self.workers
+        unless worker_dp_ports is given)
+        """
         ret = dict()
         if self.storage:
             ret["Storage"] = self.storage.fields.copy()
@@ -171,9 +332,12 @@ class Site:
             ret["P4"]["Connected_ports"] = p4_dp_ports
 
         # collect port information from all workers
-        dp_ports = list()
-        for w in self.workers:
-            dp_ports.extend(w.get_dp_ports())
+        if worker_dp_ports is None:
+            dp_ports = list()
+            for w in self.workers:
+                dp_ports.extend(w.get_dp_ports())
+        else:
+            dp_ports = list(worker_dp_ports)
         # see if any extra ports are mentioned in the config file
         if self.config and self.config.get(self.name) and self.config.get(self.name).get('connected_ports'):
             dp_ports.extend(self.config.get(self.name).get('connected_ports'))
@@ -181,8 +345,75 @@ class Site:
         dp_ports = list(set(dp_ports))
         dp_ports.sort()
         ret["DataPlane"]["Connected_ports"] = dp_ports
+        return ret
+
+    def to_json(self):
+        ret = self.assets_json()
         n = list()
         for w in self.workers:
             n.append(w.to_json())
         ret["Nodes"] = n
         return ret
+
+    def write_json(self, f: TextIO, *, json_lines: bool = False, workers: Iterable[WorkerNode] = None):
+        """
+        Write the same document as json.dump(to_json(), indent=2, sort_keys=True) into an open
+        text file, encoding one worker at a time. Workers are taken from the site unless a
+        separate iterable is given - e.g. iter_catalog(keep_workers=False), so that each worker
+        is written as soon as it is cataloged and none are kept in memory. Site assets list the
+        ports of all workers, so the workers are spooled to a temporary file until all are seen.
+        With json_lines every asset (storage, switches, each node and each of its components)
+        is written as a separate JSON object per line, tagged with 'Record'.
+        """
+        dp_ports = set()
+        nodes = 0
+        with tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+            for w in (self.workers if workers is None else workers):
+                dp_ports.update(w.get_dp_ports())
+                if json_lines:
+                    spool.write(_dumps({'Record': 'Node', **w.node_json()}) + '\n')
+                    for c in w.components_json():
+                        spool.write(_dumps({'Record': 'Component', 'Node': w.fields['Name'], **c}) + '\n')
+                else:
+                    spool.write(('\n    ' if nodes == 0 else ',\n    ') + _indented(w.to_json(), 2))
+                nodes += 1
+            assets = self.assets_json(worker_dp_ports=dp_ports)
+            spool.seek(0)
+
+            if json_lines:
+                for k in sorted(assets.keys()):
+                    f.write(_dumps({'Record': k, **assets[k]}) + '\n')
+                shutil.copyfileobj(spool, f)
+                return
+
+            # keys in the same (sorted) order as json.dump(sort_keys=True) of to_json()
+            assets['Nodes'] = None
+            f.write('{')
+            for i, k in enumerate(sorted(assets.keys())):
+                f.write('\n  ' if i == 0 else ',\n  ')
+                if k != 'Nodes':
+                    f.write(json.dumps(k) + ': ' + _indented(assets[k], 1))
+                    continue
+                f.write('"Nodes": [')
+                if nodes:
+                    shutil.copyfileobj(spool, f)
+                    f.write('\n  ')
+                f.write(']')
+            f.write('\n}')
+
+
+def _indented(obj, level: int) -> str:
+    """
+    Encode a JSON value as json.dumps(indent=2, sort_keys=True) would when it is nested
+    level deep in the document
+    """
+    return json.dumps(obj, indent=2, sort_keys=True).replace('\n', '\n' + '  ' * level)
+
+
+def _dumps(obj) -> str:
+    """
+    Encode a JSON value with sorted keys, using orjson when it is available
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode('utf-8')
+    return json.dumps(obj, sort_keys=True)
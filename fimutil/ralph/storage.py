@@ -1,6 +1,7 @@
 import pyjq
 
 from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.scan_context import ScanContext
 from fimutil.ralph.asset import RalphAsset, RalphAssetType, RalphAssetMimatch
 from fimutil.ralph.model import StorageModel
 
@@ -9,10 +10,12 @@ class Storage(RalphAsset):
     """
     Storage array has pretty minimal information
     """
+    __slots__ = ('model',)
     FIELD_MAP = '{Name: .hostname, SN: .sn}'
+    PARSE_FIELDS = ('model',)
 
-    def __init__(self, *, uri: str, ralph: RalphURI):
-        super().__init__(uri=uri, ralph=ralph)
+    def __init__(self, *, uri: str, ralph: RalphURI, context: ScanContext = None):
+        super().__init__(uri=uri, ralph=ralph, context=context)
         self.type = RalphAssetType.Storage
         self.model = None
 
@@ -21,7 +24,7 @@ class Storage(RalphAsset):
 
         # find model
         model_url = pyjq.one('.model.url', self.raw_json_obj)
-        self.model = StorageModel(uri=model_url, ralph=self.ralph)
+        self.model = StorageModel(uri=model_url, ralph=self.ralph, context=self.context)
         try:
             self.model.parse()
         except RalphAssetMimatch:
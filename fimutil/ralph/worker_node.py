@@ -3,17 +3,20 @@ import dataclasses
 import pyjq
 import logging
 import json
-import re
-import binascii
-from typing import Dict
+import os
+from typing import Dict, Any, List
+from urllib.parse import urlencode
 
 from fimutil.ralph.asset import RalphAsset, RalphAssetType, RalphJSONError, RalphAssetMimatch
 from fimutil.ralph.nvme import NVMeDrive
 from fimutil.ralph.ethernetport import EthernetCardPort
 from fimutil.ralph.gpu import GPU
 from fimutil.ralph.fpga import FPGA
+from fimutil.ralph.accelerators import ACCELERATORS
 from fimutil.ralph.model import WorkerModel
 from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.scan_context import ScanContext
+from fimutil.ralph.openstack_nics import OpenStackNicAllocator
 from fimutil.ralph.dp_switch import DPSwitch
 
 
@@ -21,17 +24,24 @@ class WorkerNode(RalphAsset):
     """
     This class knows how to parse necessary worker fields in Ralph
     """
+    __slots__ = ('model', 'site', 'config', 'ptp', 'dp_switch', 'buckets', 'nic_index')
+    # config and the dataplane switch belong to the site, buckets are rebuilt from components
+    CHECKPOINT_EXCLUDED = RalphAsset.CHECKPOINT_EXCLUDED + ('config', 'dp_switch', 'buckets')
     FIELD_MAP = '{Name: .hostname, SN: .sn}'
-    # don't start at 1 - that's typically 'uplink'
-    OPENSTACK_NIC_INDEX = 10
+    PARSE_FIELDS = ('model', 'custom_fields', 'disk', 'ethernet')
     OPENSTACK_VNIC_COUNT = 2000 # randomly set 2000 vNICs to be created
-    WORKER_NAME_REGEX = r'^[\w]+-w([\d]+).fabric-testbed.net$'
+    # shortest common hostname prefix worth a single bulk query
+    BULK_PREFIX_MIN = 6
+    WORKER_NAME_REGEX = OpenStackNicAllocator.WORKER_NAME_REGEX
     # first octet must be even
-    OPENSTACK_NIC_MAC_REG = r'([a-fA-F0-9][aceACE02468])[:-]([a-fA-F0-9]{2})'
+    OPENSTACK_NIC_MAC_REG = OpenStackNicAllocator.MAC_OFFSET_REGEX
+    # components are also kept bucketed by these types as they are added
+    COMPONENT_TYPES = (RalphAssetType.NVMe, RalphAssetType.EthernetCardPF, RalphAssetType.EthernetCardVF,
+                       RalphAssetType.GPU, RalphAssetType.FPGA)
 
     def __init__(self, *, uri: str, ralph: RalphURI, site: str = None, dp_switch: DPSwitch, config: Dict = None,
-                 ptp: bool = False):
-        super().__init__(uri=uri, ralph=ralph)
+                 ptp: bool = False, context: ScanContext = None, nic_index: int = None):
+        super().__init__(uri=uri, ralph=ralph, context=context)
         self.type = RalphAssetType.Node
         self.model = None
         self.site = site
@@ -39,6 +49,9 @@ class WorkerNode(RalphAsset):
         self.ptp = ptp # comes from site
         # so we can get VLAN info
         self.dp_switch = dp_switch
+        self.buckets = {t: dict() for t in self.COMPONENT_TYPES}
+        # OpenStack parent NIC index, allocated from the scan context at parse time unless given
+        self.nic_index = nic_index
 
     @staticmethod
     def generate_openstack_mac(site_offset: str, worker: str, count: int) -> str:
@@ -52,34 +65,84 @@ class WorkerNode(RalphAsset):
         """
 
         assert site_offset and worker
-        assert count < 4096
-
-        m = re.match(WorkerNode.OPENSTACK_NIC_MAC_REG, site_offset)
-        if not m:
-            raise RuntimeError(f'OpenStack MAC address offset for the site must match the '
-                               f'following regex: {WorkerNode.OPENSTACK_NIC_MAC_REG}')
-
-        mac_bytes = bytearray()
-        # prepend site offset
-        mac_bytes.extend(bytes.fromhex(m[1]+m[2]))
-        # add worker
-        m = re.match(WorkerNode.WORKER_NAME_REGEX, worker)
-        if not m:
-            raise RuntimeError(f'Worker name {worker} doesnt match expected regex')
-        w_index = int(m[1])
-        mac_bytes.extend(w_index.to_bytes(length=1, byteorder='big'))
-        # add counter (up to 4096)
-        mac_bytes.extend(count.to_bytes(length=3, byteorder='big'))
-        assert len(mac_bytes) == 6
-        mac_string = binascii.hexlify(mac_bytes, ':', 1)
-        return mac_string.decode('utf-8')
+        assert count < OpenStackNicAllocator.MAX_VNICS
+
+        # validates offset and worker on every call - use OpenStackNicAllocator for many vNICs
+        return OpenStackNicAllocator(site_offset).allocate(worker, start=count).mac(count)
+
+    def add_component(self, name: str, comp) -> None:
+        """
+        Add a component under a name, also filing it in the bucket of its type
+        """
+        self.components[name] = comp
+        self.buckets.setdefault(self.__component_type(comp), dict())[name] = comp
+
+    @staticmethod
+    def __component_type(comp) -> RalphAssetType:
+        if isinstance(comp, GPU):
+            return RalphAssetType.GPU
+        if isinstance(comp, FPGA):
+            return RalphAssetType.FPGA
+        return comp.type
+
+    def restored(self):
+        super().restored()
+        self.buckets = {t: dict() for t in self.COMPONENT_TYPES}
+        for name, comp in self.components.items():
+            self.buckets.setdefault(self.__component_type(comp), dict())[name] = comp
+        if self.context.lightweight_site:
+            # vNIC MACs of a restored worker still take part in the site duplicate check
+            mac_offset = self.config.get(self.site).get('mac_offset')
+            self.context.openstack_mac_allocator(mac_offset).allocate(self.fields['Name'], start=1,
+                                                                      count=self.OPENSTACK_VNIC_COUNT - 1)
+
+    def get_components(self, ctype: RalphAssetType) -> Dict[str, Any]:
+        """
+        Components of a given type by name, in the order they were added
+        """
+        return self.buckets.get(ctype, {})
+
+    def component_count(self, ctype: RalphAssetType) -> int:
+        return len(self.buckets.get(ctype, {}))
+
+    @classmethod
+    def find_workers(cls, ralph: RalphURI, *, hostnames: List[str] = None, prefix: str = None,
+                     context: ScanContext = None) -> List['WorkerNode']:
+        """
+        Resolve workers by hostnames and/or a hostname prefix with bulk data-center-assets
+        queries (hostnames are looked up by their common prefix) and return unparsed nodes
+        preloaded with their JSON, in hostname order. Hostnames that can't be found are logged.
+        """
+        found = dict()
+        queries = list()
+        if prefix:
+            queries.append(prefix)
+        if hostnames:
+            common = os.path.commonprefix(hostnames)
+            # a short common prefix would pull in most of the inventory - look hosts up one by one
+            queries.extend([common] if len(common) >= cls.BULK_PREFIX_MIN else hostnames)
+        for query in queries:
+            for result in ralph.get_all_results(ralph.base_uri + 'data-center-assets/?' +
+                                                urlencode({'hostname__startswith': query, 'limit': 100}),
+                                                fields=cls.sparse_fields()):
+                if (prefix and result['hostname'].startswith(prefix)) or (hostnames and result['hostname'] in hostnames):
+                    found[result['hostname']] = result
+        for hostname in hostnames or list():
+            if hostname not in found:
+                logging.error(f'Unable to find worker {hostname} in Ralph')
+        workers = list()
+        for hostname in sorted(found):
+            worker = cls(uri=found[hostname]['url'], ralph=ralph, dp_switch=None, context=context)
+            worker.raw_json_obj = found[hostname]
+            workers.append(worker)
+        return workers
 
     def parse(self):
         super().parse()
 
         # find model
         model_url = pyjq.one('.model.url', self.raw_json_obj)
-        self.model = WorkerModel(uri=model_url, ralph=self.ralph)
+        self.model = WorkerModel(uri=model_url, ralph=self.ralph, context=self.context)
         try:
             self.model.parse()
         except RalphAssetMimatch:
@@ -124,16 +187,16 @@ class WorkerNode(RalphAsset):
 
         disk_index = 1
         for disk in disk_urls:
-            drive = NVMeDrive(uri=disk, ralph=self.ralph)
+            drive = NVMeDrive(uri=disk, ralph=self.ralph, context=self.context)
             try:
                 drive.parse()
             except RalphAssetMimatch:
                 continue
-            self.components['nvme-' + str(disk_index)] = drive
+            self.add_component('nvme-' + str(disk_index), drive)
             disk_index += 1
 
         # in lightweight sites skip looking for ports, add OpenStack vNIC instead
-        if self.LIGHTWEIGHT_SITE:
+        if self.context.lightweight_site:
             logging.debug('Since this is a lightweight site, skipping looking for ethernet ports, '
                           'adding OpenStack parent port and vNICs instead')
             if self.config and self.config.get(self.site) and self.config.get(self.site).get('mac_offset'):
@@ -141,13 +204,19 @@ class WorkerNode(RalphAsset):
             else:
                 raise RuntimeError('For OpenStack sites you must specify "mac_offset" under site static configuration')
 
+            # one parent NIC index per worker, allocated from this scan only
+            if self.nic_index is None:
+                self.nic_index = self.context.next_openstack_nic_index()
+            nic_index = self.nic_index
+            # MACs of the parent (1) and all vNICs, validated and allocated at once
+            nics = self.context.openstack_mac_allocator(mac_offset).allocate(self.fields['Name'], start=1,
+                                                                             count=self.OPENSTACK_VNIC_COUNT - 1)
             port_index = 1
             # 'parent'
-            port = EthernetCardPort(uri='no-url', ralph=self.ralph)
+            port = EthernetCardPort(uri='no-url', ralph=self.ralph, context=self.context)
             port.force_values(model='OpenStack-vNIC', desc='OpenStack parent NIC', speed='1Gbps',
-                              bdf='0000:00:00.0', mac=self.generate_openstack_mac(mac_offset, self.fields['Name'], 1),
-                              peer_port=str(self.OPENSTACK_NIC_INDEX), numa='-1')
-            self.components['port-' + str(port_index)] = port
+                              bdf='0000:00:00.0', mac=nics.mac(1), peer_port=str(nic_index), numa='-1')
+            self.add_component('port-' + str(port_index), port)
             port_index += 1
             if not self.dp_switch.vlan_ranges:
                 raise RuntimeError('OpenStack sites should define at least local VLANs '
@@ -155,18 +224,14 @@ class WorkerNode(RalphAsset):
 
             # Add children with bdf=0000:00:00.0 and vBDF=0000:AB:CD.0 have VLAN 0 set (VLANs are saved on NetworkService)
             # NOTE: vfs have 'vBDF' set to their own and 'BDF' set to parent.
-            for vnic_idx in range(2, self.OPENSTACK_VNIC_COUNT):
-                port = EthernetCardPort(uri='no-url', ralph=self.ralph)
-                # make all vbdfs different and reflection of VLAN tag
-                vbdf_diff = binascii.hexlify(vnic_idx.to_bytes(2, 'big'), ':', 1).decode('utf-8')
+            # make all vbdfs different and reflection of VLAN tag
+            for mac, vbdf in zip(nics.mac_strings()[1:], nics.vbdf_strings()[1:]):
+                port = EthernetCardPort(uri='no-url', ralph=self.ralph, context=self.context)
                 port.force_values(model='OpenStack-vNIC', desc='OpenStack vNIC', speed='1Gbps', vlan='0',
-                                  bdf='0000:00:00.0', vbdf='0000:' + vbdf_diff + '.0',
-                                  ctype=RalphAssetType.EthernetCardVF,
-                                  mac=self.generate_openstack_mac(mac_offset, self.fields['Name'], vnic_idx),
-                                  peer_port=str(self.OPENSTACK_NIC_INDEX), numa='-1')
-                self.components['port-' + str(port_index)] = port
+                                  bdf='0000:00:00.0', vbdf=vbdf, ctype=RalphAssetType.EthernetCardVF,
+                                  mac=mac, peer_port=str(nic_index), numa='-1')
+                self.add_component('port-' + str(port_index), port)
                 port_index += 1
-            type(self).OPENSTACK_NIC_INDEX += 1
         else:
             # scan for physical NICs and virtual NICs
             try:
@@ -177,80 +242,88 @@ class WorkerNode(RalphAsset):
 
             port_index = 1
             for port in port_urls:
-                port = EthernetCardPort(uri=port, ralph=self.ralph)
+                port = EthernetCardPort(uri=port, ralph=self.ralph, context=self.context)
                 try:
                     port.parse()
                 except RalphAssetMimatch:
                     continue
-                self.components['port-' + str(port_index)] = port
+                self.add_component('port-' + str(port_index), port)
                 port_index += 1
 
-        gpus = GPU.find_gpus(self.raw_json_obj)
+        gpus, fpgas = ACCELERATORS.detect(custom_fields_dict)
         gpu_index = 1
         for gpu in gpus:
-            self.components['gpu-' + str(gpu_index)] = gpu
+            self.add_component('gpu-' + str(gpu_index), gpu)
             gpu_index += 1
 
-        fpgas = FPGA.find_fpgas(self.raw_json_obj)
         fpga_index = 1
         for fpga in fpgas:
-            self.components['fpga-' + str(fpga_index)] = fpga
+            self.add_component('fpga-' + str(fpga_index), fpga)
             fpga_index += 1
 
     def __str__(self):
         retl = list()
-        if RalphAsset.PRINT_SUMMARY:
+        if self.context.print_summary:
             retl.append(str(self.type) + " " + self.fields['Name'] + f" Flags: {{ PTP: {self.ptp} }}")
         else:
             retl.append(str(self.type) + "[" + self.uri + "]: " + json.dumps(self.fields) +
                         f" Flags: {{ PTP: {self.ptp} }}")
             retl.append('\t' + str(self.model))
-        vfcount = 0
-        for n, comp in self.components.items():
-            if comp.__dict__.get('type', None) is None:
-                # GPU or some other typeless thing
-                retl.append('\t' + n + " " + str(comp))
-            elif comp.type != RalphAssetType.EthernetCardVF:
-                # something with type that isn't a VF
-                retl.append('\t' + n + " " + str(comp))
-            else:
-                # a VF
-                vfcount += 1
+        for n, comp in self.__listed_components():
+            retl.append('\t' + n + " " + str(comp))
+        vfcount = self.component_count(RalphAssetType.EthernetCardVF)
         retl.append(f'\tDetected {vfcount} SR-IOV functions')
         ret = "\n".join(retl)
         return ret
 
     def to_json(self):
-        ret = {
+        ret = self.node_json()
+        ret['Components'] = list(self.components_json())
+        return ret
+
+    def node_json(self) -> Dict:
+        """
+        JSON-ready dict of the node itself, without components
+        """
+        return {
                 'Name': self.fields['Name'],
                 'PTP': self.ptp,
                 'SN': self.fields.get('SN', 'Not available'),
                 'Model': self.model.fields.copy()
         }
-        comps = list()
-        for n, comp in self.components.items():
-            if comp.__dict__.get('type') and comp.type != RalphAssetType.EthernetCardVF:
+
+    def components_json(self):
+        """
+        Generate JSON-ready dicts of node components one at a time (SR-IOV VFs are not reported)
+        """
+        for n, comp in self.__listed_components():
+            if getattr(comp, 'type', None):
                 d = comp.fields.copy()
                 d['Type'] = str(comp.type)
-                comps.append(d)
-            elif not comp.__dict__.get('type'):
+            else:
                 # GPU or FPGA
                 d = comp.__dict__.copy()
                 d['Type'] = str(RalphAssetType.GPU) if isinstance(comp, GPU) else str(RalphAssetType.FPGA)
-                comps.append(d)
-        ret['Components'] = comps
-        return ret
+            yield d
+
+    def __listed_components(self):
+        """
+        Components by name in the order they were added, except SR-IOV VFs
+        """
+        vfs = self.get_components(RalphAssetType.EthernetCardVF)
+        for n, comp in self.components.items():
+            if vfs.get(n) is not comp:
+                yield n, comp
 
     def get_dp_ports(self):
         """
         Return a list of names of DP switch ports this node is connected to
         """
         dp_ports = list()
-        for n, comp in self.components.items():
-            if comp.__dict__.get('type') and comp.type == RalphAssetType.EthernetCardPF:
-                if comp.fields.get('Peer_port'):
-                    dp_ports.append(comp.fields.get('Peer_port'))
-            if isinstance(comp, FPGA):
-                dp_ports.extend(comp.Ports)
+        for comp in self.get_components(RalphAssetType.EthernetCardPF).values():
+            if comp.fields.get('Peer_port'):
+                dp_ports.append(comp.fields.get('Peer_port'))
+        for comp in self.get_components(RalphAssetType.FPGA).values():
+            dp_ports.extend(comp.Ports)
 
         return dp_ports
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Run a long-lived inventory service that periodically rebuilds site, network and AL2S models
+and serves the latest ones over a local HTTP endpoint
+"""
+
+import argparse
+import logging
+import signal
+import sys
+
+from fimutil.inventory.service import InventoryService, InventoryServiceError
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-c", "--config", action="store",
+                        help="YAML config file. Defaults to $HOME/.inventory-service.conf or "
+                             "/etc/inventory-service.conf")
+    parser.add_argument("-d", "--debug", action="count",
+                        help="Turn on debugging")
+
+    args = parser.parse_args()
+
+    if args.debug is None:
+        logging.basicConfig(level=logging.INFO)
+    elif args.debug >= 1:
+        logging.basicConfig(level=logging.DEBUG)
+        # silence urllib
+        logging.getLogger('urllib3.connectionpool').setLevel(level=logging.INFO)
+
+    try:
+        service = InventoryService(config_file=args.config)
+    except InventoryServiceError as e:
+        print(e, file=sys.stderr)
+        sys.exit(-1)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        service.start()
+    except (KeyboardInterrupt, SystemExit):
+        logging.info('Shutting down')
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
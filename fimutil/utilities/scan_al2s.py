@@ -8,6 +8,7 @@ import logging
 import sys
 
 from fimutil.al2s.arm import Al2sARM
+from fimutil.common.model_output import UNCHANGED_EXIT_CODE
 
 
 def main():
@@ -19,7 +20,11 @@ def main():
     parser.add_argument("-d", "--debug", action="count",
                         help="Turn on debugging")
     parser.add_argument("-m", "--model", action="store",
-                        help="Produce an ARM model of a site and save into indicated file")
+                        help="Produce an ARM model of a site and save into indicated file "
+                             "(gzip/zstd compressed if it ends with .gz/.zst)")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="Do not rewrite the model if its content hash matches the previous one "
+                             "(saved in <model>.sha256), exit with code 3 instead")
 
     args = parser.parse_args()
 
@@ -42,8 +47,14 @@ def main():
     arm.delegate_topology(delegation1)
 
     logging.info(f'Model completed, saving to {args.model}')
-    arm.write_topology(file_name=args.model)
-    logging.info('Saving completed')
+    written = arm.write_topology(file_name=args.model, skip_unchanged=args.skip_unchanged)
+    if written:
+        logging.info('Saving completed')
+    else:
+        logging.info(f'Model unchanged, {args.model} not rewritten')
+    logging.info(f'AL2S: {arm.al2s.http.metrics}')
+    if not written:
+        sys.exit(UNCHANGED_EXIT_CODE)
 
 
 if __name__ == "__main__":
@@ -8,6 +8,7 @@ import logging
 import sys
 
 from fimutil.netam.arm import NetworkARM
+from fimutil.common.model_output import UNCHANGED_EXIT_CODE
 
 
 def main():
@@ -19,11 +20,20 @@ def main():
     parser.add_argument("-d", "--debug", action="count",
                         help="Turn on debugging")
     parser.add_argument("-m", "--model", action="store",
-                        help="Produce an ARM model of a site and save into indicated file")
+                        help="Produce an ARM model of a site and save into indicated file "
+                             "(gzip/zstd compressed if it ends with .gz/.zst)")
     parser.add_argument("--isis-link-validation", action="store_true",
                         help="Only include validated links in the IS-IS topology")
     parser.add_argument("--skip-device", action="store",
                         help="Skip the devices listed (comma separated)")
+    parser.add_argument("--pce-cache-ttl", action="store", type=int,
+                        help="Reuse SR-PCE link snapshot if younger than this many seconds "
+                             "(overrides sr_pce_cache_ttl in config)")
+    parser.add_argument("--pce-background-refresh", action="store_true",
+                        help="Use an expired SR-PCE link snapshot and refresh it in the background")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="Do not rewrite the model if its content hash matches the previous one "
+                             "(saved in <model>.sha256), exit with code 3 instead")
 
     args = parser.parse_args()
 
@@ -36,7 +46,8 @@ def main():
         print('You must specify the name of the file to save the model into', file=sys.stderr)
         sys.exit(-1)
 
-    arm = NetworkARM(config_file=args.config, isis_link_validation=args.isis_link_validation, skip_device=args.skip_device)
+    arm = NetworkARM(config_file=args.config, isis_link_validation=args.isis_link_validation, skip_device=args.skip_device,
+                     pce_cache_ttl=args.pce_cache_ttl, pce_background_refresh=args.pce_background_refresh)
 
     logging.info('Querying NSO')
     if args.isis_link_validation:
@@ -48,8 +59,17 @@ def main():
     arm.delegate_topology(delegation1)
 
     logging.info(f'Model completed, saving to {args.model}')
-    arm.write_topology(file_name=args.model)
-    logging.info('Saving completed')
+    written = arm.write_topology(file_name=args.model, skip_unchanged=args.skip_unchanged)
+    if written:
+        logging.info('Saving completed')
+    else:
+        logging.info(f'Model unchanged, {args.model} not rewritten')
+
+    logging.info(f'NSO: {arm.nso.http.metrics}')
+    if arm.sr_pce is not None:
+        logging.info(f'SR-PCE: {arm.sr_pce.http.metrics}')
+    if not written:
+        sys.exit(UNCHANGED_EXIT_CODE)
 
 
 if __name__ == "__main__":
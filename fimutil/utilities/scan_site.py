@@ -8,14 +8,15 @@ import logging
 import sys
 import json
 
-from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.ralph_uri import RalphURI, RequestSettings
 from fimutil.ralph.site import Site
-from fimutil.ralph.asset import RalphAsset
+from fimutil.ralph.scan_context import ScanContext
+from fimutil.ralph.location_cache import LocationCache
+from fimutil.ralph.checkpoint import ScanCheckpoint
+from fimutil.common.model_output import write_model, UNCHANGED_EXIT_CODE
 
-from fimutil.ralph.fim_helper import site_to_fim
-
-from fim.slivers.delegations import DelegationType, Pools
-from fim.slivers.capacities_labels import Location, LocationException
+# fim (and fim_helper which pulls in the fim.user topology stack) is imported only
+# on the code paths that need it, so -p/-j scans start quickly
 
 
 def main():
@@ -33,7 +34,11 @@ def main():
     parser.add_argument("-p", "--print", action="store_true",
                         help="Print output of a scan")
     parser.add_argument("-m", "--model", action="store",
-                        help="Produce an ARM model of a site and save into indicated file")
+                        help="Produce an ARM model of a site and save into indicated file "
+                             "(gzip/zstd compressed if it ends with .gz/.zst)")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="With -m do not rewrite the model if its content hash matches the previous one "
+                             "(saved in <model>.sha256), exit with code 3 instead")
     parser.add_argument("-a", "--address", action="store",
                         help="Provide address for the site")
     parser.add_argument("-n", "--no-ssl", action="store_true",
@@ -42,8 +47,42 @@ def main():
                         help="Print only a brief description of assets")
     parser.add_argument("-j", "--json", action="store",
                         help="Produce simplified output in JSON format and save to specified file")
+    parser.add_argument("--json-lines", action="store_true",
+                        help="With -j write JSON Lines instead, one asset or component per line")
     parser.add_argument("-l", "--lightweight", action="store_true",
                         help="This is a lightweight site supporting only OpenStack virtual NICs")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="With -m convert each worker into the model while the next one is fetched "
+                             "(workers are not kept unless -p or -j are also given)")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="Release raw Ralph JSON of each asset once it is parsed to reduce memory use")
+    parser.add_argument("--compact-labels", action="store_true",
+                        help="With -m store runs of SR-IOV and vNIC MACs, BDFs and VLANs in the model as ranges "
+                             "(the model is not readable by consumers that do not expand them)")
+    parser.add_argument("--max-rate", action="store", type=float,
+                        help="Limit Ralph requests to this many per second")
+    parser.add_argument("--adaptive-concurrency", action="store_true",
+                        help="Adapt the number of concurrent Ralph requests to its latency and 429/5xx responses")
+    parser.add_argument("--catalog-concurrency", action="store", type=int, default=4,
+                        help="How many site assets (switches, storage, workers) to fetch from Ralph at once. "
+                             "Defaults to 4")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Duplicate Ralph requests slower than 95%% of recent ones, first response wins")
+    parser.add_argument("--sparse-fields", action="store_true",
+                        help="Ask Ralph to return only the asset fields the scan uses")
+    parser.add_argument("--http2", action="store_true",
+                        help="Multiplex Ralph requests over one HTTP/2 connection (requires httpx[http2])")
+    parser.add_argument("--checkpoint", action="store",
+                        help="Journal scan progress into this file, so an interrupted scan can be resumed. "
+                             "Defaults to .scan-<site>-checkpoint.jsonl with --resume")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted scan from its checkpoint, fetching only what is missing "
+                             "(and keep journaling into it)")
+    parser.add_argument("--location-cache", action="store", default=LocationCache.DEFAULT_CACHE_FILE,
+                        help="File caching geocoded site postal addresses. "
+                             f"Defaults to {LocationCache.DEFAULT_CACHE_FILE}")
+    parser.add_argument("--offline-geocode", action="store_true",
+                        help="Never call the geocoder, resolve postal address only from the location cache")
     parser.add_argument("-c", "--config", action="store", default=".scan-config.json",
                         help="JSON-formatted additional configuration file, "
                              "including e.g. odd site-dataplane switch mapping. Defaults to .scan-config.json")
@@ -73,11 +112,12 @@ def main():
               file=sys.stderr)
         sys.exit(-1)
 
+    location_cache = LocationCache(cache_file=args.location_cache, offline=args.offline_geocode)
     if args.address is not None:
-        loc = Location(postal=args.address)
+        from fim.slivers.capacities_labels import LocationException
         print(f'Validating site postal address {args.address}')
         try:
-            lat, lon = loc.to_latlon()
+            lat, lon = location_cache.to_latlon(args.address)
             print(f'{lat=}, {lon=}')
         except LocationException as le:
             print(f'Unable to convert provided site postal address into coordinates. Please consider altering'
@@ -99,25 +139,51 @@ def main():
             logging.error(f'File {args.config} is not properly JSON-formatted, exiting')
             sys.exit(-1)
 
-    if args.brief:
-        RalphAsset.print_brief_summary()
-
-    if args.lightweight:
-        RalphAsset.lightweight_site()
-
-    ralph = RalphURI(token=args.token, base_uri=args.base_uri, disable_ssl=args.no_ssl)
-    site = Site(site_name=args.site, ralph=ralph, config=config)
+    checkpoint = None
+    if args.checkpoint or args.resume:
+        checkpoint = ScanCheckpoint(checkpoint_file=args.checkpoint or f'.scan-{args.site}-checkpoint.jsonl',
+                                    resume=args.resume)
+    settings = RequestSettings(max_rate=args.max_rate, adaptive_concurrency=args.adaptive_concurrency,
+                               hedge=args.hedge)
+    ralph = RalphURI(token=args.token, base_uri=args.base_uri, disable_ssl=args.no_ssl, settings=settings,
+                     checkpoint=checkpoint, sparse_fields=args.sparse_fields,
+                     http2=args.http2)
+    context = ScanContext(ralph=ralph, config=config, print_summary=args.brief,
+                          lightweight_site=args.lightweight, release_raw_json=args.low_memory,
+                          catalog_concurrency=args.catalog_concurrency, compact_labels=args.compact_labels)
+    site = Site(site_name=args.site, ralph=ralph, config=config, context=context)
 
     if args.lightweight:
         logging.info(f'Cataloging site {args.site} as a lightweight site - skipping all ethernet ports/cards')
     else:
         logging.info(f'Cataloging site {args.site}')
-    site.catalog()
-    logging.info('Cataloging complete')
+    pipeline = args.pipeline and args.model is not None
+    # when only a JSON file is requested, write each worker to it as soon as it is cataloged
+    stream_json = args.json is not None and args.model is None and not args.print
+    model_written = True
+    if stream_json:
+        with open(args.json, 'w') as f:
+            site.write_json(f, json_lines=args.json_lines, workers=site.iter_catalog(keep_workers=False))
+    elif not pipeline:
+        site.catalog()
+    if not pipeline:
+        logging.info('Cataloging complete')
+        if checkpoint is not None:
+            checkpoint.remove()
 
     if args.model is not None:
-        logging.info('Producing an ARM model')
-        topo = site_to_fim(site, args.address, config)
+        from fimutil.ralph.fim_helper import site_to_fim, catalog_site_to_fim
+        from fim.slivers.delegations import DelegationType, Pools
+        if pipeline:
+            logging.info('Producing an ARM model while cataloging')
+            topo = catalog_site_to_fim(site, args.address, config, location_cache=location_cache,
+                                       keep_workers=args.print or args.json is not None)
+            logging.info('Cataloging complete')
+            if checkpoint is not None:
+                checkpoint.remove()
+        else:
+            logging.info('Producing an ARM model')
+            topo = site_to_fim(site, args.address, config, location_cache=location_cache)
         logging.info('Generating delegations')
         delegation1 = 'primary'
 
@@ -126,15 +192,24 @@ def main():
                                label_pools=Pools(atype=DelegationType.LABEL),
                                capacity_pools=Pools(atype=DelegationType.CAPACITY))
         logging.info(f'Model completed, saving to {args.model}')
-        topo.serialize(file_name=args.model)
-        logging.info('Saving completed')
+        model_written = write_model(topo, args.model, skip_unchanged=args.skip_unchanged)
+        if model_written:
+            logging.info('Saving completed')
+        else:
+            logging.info(f'Model unchanged, {args.model} not rewritten')
 
     if args.print:
         print(site)
 
-    if args.json:
+    if args.json and not stream_json:
         with open(args.json, 'w') as f:
-            json.dump(site.to_json(), f, indent=2, sort_keys=True)
+            site.write_json(f, json_lines=args.json_lines)
+
+    logging.info(f'Ralph: {ralph.http.metrics}')
+    if ralph.hedger is not None:
+        logging.info(f'Ralph hedging: {ralph.hedger}')
+    if not model_written:
+        sys.exit(UNCHANGED_EXIT_CODE)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,8 @@ Scan workers given on command line printing to stdout all pertinent info
 
 import argparse
 import traceback
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import logging
 import sys
@@ -17,8 +19,20 @@ def main():
     parser = argparse.ArgumentParser()
     # split into different mutually exclusive operations
 
-    parser.add_argument("-w", "--worker", action="store",
-                        help="Scan single worker information (use FQDN)")
+    parser.add_argument("-w", "--worker", action="append",
+                        help="Scan worker information (use FQDN). Can be repeated or comma-separated")
+    parser.add_argument("-f", "--file", action="store",
+                        help="Scan workers listed in a file, one FQDN per line")
+    parser.add_argument("--prefix", action="store",
+                        help="Scan all workers whose hostname starts with this prefix, e.g. renc-w")
+    parser.add_argument("--concurrency", action="store", type=int, default=8,
+                        help="How many workers to parse at once. Defaults to 8")
+    parser.add_argument("-j", "--json", action="store_true",
+                        help="Print each worker as a line of JSON instead of text")
+    parser.add_argument("--sparse-fields", action="store_true",
+                        help="Ask Ralph to return only the asset fields the scan uses")
+    parser.add_argument("--http2", action="store_true",
+                        help="Multiplex Ralph requests over one HTTP/2 connection (requires httpx[http2])")
     parser.add_argument("-b", "--base_uri", action="store",
                         help="Base URL of API")
     parser.add_argument("-d", "--debug", action="count",
@@ -37,8 +51,15 @@ def main():
         # silence urllib
         logging.getLogger('urllib3.connectionpool').setLevel(level=logging.INFO)
 
-    if args.worker is None:
-        print('You must specify the worker', file=sys.stderr)
+    hostnames = list()
+    for worker in args.worker or list():
+        hostnames.extend(w.strip() for w in worker.split(',') if w.strip())
+    if args.file:
+        with open(args.file, 'r') as f:
+            hostnames.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+
+    if not hostnames and args.prefix is None:
+        print('You must specify the worker(s) with -w, -f or --prefix', file=sys.stderr)
         sys.exit(-1)
 
     if args.base_uri is None:
@@ -54,11 +75,37 @@ def main():
               file=sys.stderr)
         sys.exit(-1)
 
-    ralph = RalphURI(token=args.token, base_uri=args.base_uri, disable_ssl=args.no_ssl)
-    worker = WorkerNode(uri=args.base_uri + 'data-center-assets/?hostname=' + args.worker,
-                        ralph=ralph, dp_switch=None)
-    worker.parse()
-    print(worker)
+    ralph = RalphURI(token=args.token, base_uri=args.base_uri, disable_ssl=args.no_ssl,
+                     sparse_fields=args.sparse_fields, http2=args.http2)
+    workers = WorkerNode.find_workers(ralph, hostnames=hostnames, prefix=args.prefix)
+    logging.info(f'Found {len(workers)} workers')
+
+    def parse(worker):
+        worker.parse()
+        return worker
+
+    failed = bool(set(hostnames) - {worker.raw_json_obj['hostname'] for worker in workers})
+
+    # print each worker as soon as it is parsed
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = {executor.submit(parse, worker): worker for worker in workers}
+        for future in as_completed(futures):
+            try:
+                worker = future.result()
+            except Exception as e:
+                failed = True
+                logging.error(f'Unable to parse worker {futures[future].uri}: {e}')
+                logging.debug(traceback.format_exc())
+                continue
+            if args.json:
+                print(json.dumps(worker.to_json()), flush=True)
+            else:
+                print(worker, flush=True)
+
+    logging.info(f'Ralph: {ralph.http.metrics}')
+    if failed:
+        sys.exit(-1)
+
 
 if __name__ == "__main__":
     main()
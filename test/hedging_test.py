@@ -0,0 +1,45 @@
+import unittest
+import threading
+import time
+
+from fimutil.common.hedging import Hedger
+
+
+class HedgingTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.hedger = Hedger(percentile=0.5, budget=1.0, min_samples=2, max_workers=2)
+        self.hedger.latencies.extend([0.05, 0.05])
+
+    def tearDown(self) -> None:
+        self.hedger.executor.shutdown(wait=True)
+
+    def testSlowCallHedged(self):
+        calls = list()
+
+        def fetch():
+            calls.append(time.monotonic())
+            # the first call is slow, its hedge is not
+            if len(calls) == 1:
+                time.sleep(0.5)
+                return 'primary'
+            return 'hedge'
+
+        self.assertEqual(self.hedger.call(fetch), 'hedge')
+        self.assertEqual(self.hedger.to_json()['hedges'], 1)
+        self.assertEqual(self.hedger.to_json()['hedge_wins'], 1)
+
+    def testQueuedCallNotHedged(self):
+        release = threading.Event()
+        # keep all workers busy, so the next call waits in the queue well past the threshold
+        blockers = [self.hedger.executor.submit(release.wait) for _ in range(2)]
+        timer = threading.Timer(0.3, release.set)
+        timer.start()
+        self.assertEqual(self.hedger.call(lambda: 'done'), 'done')
+        timer.join()
+        for blocker in blockers:
+            blocker.result()
+        self.assertEqual(self.hedger.to_json()['hedges'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
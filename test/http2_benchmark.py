@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmark HttpClient's HTTP/1.1 connection pool against its HTTP/2 transport.
+Two local TLS stand-ins for Ralph (one HTTP/1.1, one HTTP/2) answer every GET with
+a small JSON asset after an injected latency; the same number of concurrent
+GETs is made through each transport, reporting throughput and the number of TLS
+connections the server had to accept. Requires httpx[http2] and the openssl command.
+
+$ python test/http2_benchmark.py --requests 2000 --concurrency 32 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import h2.config
+import h2.connection
+import h2.events
+
+from fimutil.common.http_client import HttpClient
+
+BODY = json.dumps({'url': 'https://ralph/api/ethernet/1/', 'mac': 'f2:ab:01:00:00:02',
+                   'model_name': 'Mellanox ConnectX-6 (0000:41:00.0)', 'speed': '100Gbps'}).encode('utf-8')
+
+
+def make_certificate(tmpdir: str):
+    cert = os.path.join(tmpdir, 'cert.pem')
+    key = os.path.join(tmpdir, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+class Http1Server:
+    """
+    Threaded HTTP/1.1 server with keep-alive, counting accepted connections
+    """
+    def __init__(self, *, cert: str, key: str, latency: float):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                with server.lock:
+                    server.connections += 1
+                super().setup()
+
+            def do_GET(self):
+                time.sleep(latency)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(BODY)))
+                self.end_headers()
+                self.wfile.write(BODY)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        context.set_alpn_protocols(['http/1.1'])
+        self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class Http2Server:
+    """
+    asyncio HTTP/2 server answering each stream after the injected latency,
+    counting accepted connections
+    """
+    def __init__(self, *, cert: str, key: str, latency: float):
+        self.latency = latency
+        self.connections = 0
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(cert, key)
+        self.context.set_alpn_protocols(['h2'])
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        threading.Thread(target=self._run, args=(started,), daemon=True).start()
+        started.wait()
+
+    def _run(self, started: threading.Event):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self._serve, '127.0.0.1', 0, ssl=self.context))
+        self.port = self.server.sockets[0].getsockname()[1]
+        started.set()
+        self.loop.run_forever()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        while True:
+            data = await reader.read(65535)
+            if not data:
+                break
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    asyncio.ensure_future(self._respond(conn, writer, event.stream_id))
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    writer.close()
+                    return
+            writer.write(conn.data_to_send())
+        writer.close()
+
+    async def _respond(self, conn: h2.connection.H2Connection, writer: asyncio.StreamWriter, stream_id: int):
+        await asyncio.sleep(self.latency)
+        conn.send_headers(stream_id, [(':status', '200'), ('content-type', 'application/json'),
+                                      ('content-length', str(len(BODY)))])
+        conn.send_data(stream_id, BODY, end_stream=True)
+        writer.write(conn.data_to_send())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def run(client: HttpClient, url: str, requests: int, concurrency: int) -> float:
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in executor.map(client.get_json, [url] * requests):
+            pass
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", action="store", type=int, default=2000,
+                        help="Number of GETs per transport. Defaults to 2000")
+    parser.add_argument("--concurrency", action="store", type=int, default=32,
+                        help="Number of GETs in flight. Defaults to 32")
+    parser.add_argument("--latency", action="store", type=float, default=0.05,
+                        help="Latency injected by the server in seconds. Defaults to 0.05")
+    parser.add_argument("--max-connections", action="store", type=int, default=10,
+                        help="HTTP/1.1 connection pool size. Defaults to 10 (as HttpClient)")
+    args = parser.parse_args()
+    # the HTTP/1.1 pool discarding surplus connections is part of what is measured
+    logging.getLogger('urllib3.connectionpool').setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cert, key = make_certificate(tmpdir)
+        servers = {'HTTP/1.1': Http1Server(cert=cert, key=key, latency=args.latency),
+                   'HTTP/2': Http2Server(cert=cert, key=key, latency=args.latency)}
+
+    print(f'{args.requests} GETs, {args.concurrency} in flight, {args.latency * 1000:.0f}ms server latency')
+    for transport, server in servers.items():
+        client = HttpClient(name=transport, verify=False, max_connections=args.max_connections,
+                            http2=transport == 'HTTP/2')
+        url = f'https://localhost:{server.port}/api/ethernet/1/'
+        # warm up connections
+        run(client, url, args.concurrency, args.concurrency)
+        elapsed = run(client, url, args.requests, args.concurrency)
+        print(f'{transport:8} {args.requests / elapsed:8.1f} requests/s, {server.connections:4} connections '
+              f'({client.metrics})')
+        client.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
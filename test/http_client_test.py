@@ -0,0 +1,72 @@
+import unittest
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from fimutil.common.http_client import HttpClient, HttpClientError, httpx
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Every other request to /flaky fails with 503, /missing is always 404
+    """
+    flaky_count = 0
+
+    def do_GET(self):
+        if self.path == '/missing':
+            self._reply(404, b'')
+            return
+        if self.path == '/flaky':
+            FlakyHandler.flaky_count += 1
+            if FlakyHandler.flaky_count % 2 == 1:
+                self._reply(503, b'')
+                return
+        self._reply(200, json.dumps({'path': self.path}).encode('utf-8'))
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpClientTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.client = HttpClient(name='test', backoff=0.01, max_concurrency=2)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testRetryAndMetrics(self):
+        self.assertEqual(self.client.get_json(self.base + '/flaky'), {'path': '/flaky'})
+        with self.assertRaises(HttpClientError):
+            self.client.get_json(self.base + '/missing')
+        metrics = self.client.metrics.to_json()
+        self.assertEqual(metrics['requests'], 2)
+        self.assertEqual(metrics['retries'], 1)
+        self.assertEqual(metrics['errors'], 1)
+
+    def testGatherJson(self):
+        urls = [f'{self.base}/{i}' for i in range(5)]
+        self.assertEqual(self.client.gather_json(urls), [{'path': f'/{i}'} for i in range(5)])
+
+    @unittest.skipIf(httpx is None, 'httpx is not installed')
+    def testHttp2Transport(self):
+        # plain HTTP - the server speaks HTTP/1.1 and httpx falls back to it
+        client = HttpClient(name='test', backoff=0.01, http2=True)
+        try:
+            self.assertEqual(client.get_json(self.base + '/flaky'), {'path': '/flaky'})
+            self.assertEqual(client.gather_json([self.base + '/1', self.base + '/2']), [{'path': '/1'}, {'path': '/2'}])
+            metrics = client.metrics.to_json()
+            self.assertEqual(metrics['requests'], 3)
+            self.assertEqual(metrics['retries'], 1)
+        finally:
+            client.close()
@@ -0,0 +1,36 @@
+import unittest
+import logging
+import subprocess
+import sys
+
+
+def import_times(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter with -X importtime and return
+    a dict of imported module name -> cumulative import time in microseconds
+    """
+    ret = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                         capture_output=True, text=True, check=True)
+    times = dict()
+    for line in ret.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class ImportTimeTest(unittest.TestCase):
+    # entry points that should not load fim until they build a model
+    LIGHT_ENTRY_POINTS = ['fimutil.utilities.scan_worker', 'fimutil.utilities.scan_site',
+                          'fimutil.utilities.generate_instance_flavors']
+
+    def testEntryPointsSkipFim(self):
+        for module in self.LIGHT_ENTRY_POINTS:
+            times = import_times(module)
+            logging.info(f'{module} imports in {times[module] / 1000:.1f}ms')
+            fim_modules = [m for m in times if m == 'fim' or m.startswith('fim.')]
+            self.assertEqual(fim_modules, [], f'{module} imports fim at startup')
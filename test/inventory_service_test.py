@@ -0,0 +1,155 @@
+import unittest
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+from fimutil.inventory.service import InventoryJob, _make_handler
+
+
+class StubTopology:
+    """
+    Stands in for a fim topology built by a scan
+    """
+    def __init__(self, graph: str, deleted: list):
+        self.graph_string = graph
+        self.graph = self
+        self.deleted = deleted
+
+    def single_delegation(self, *, delegation_id, label_pools, capacity_pools):
+        pass
+
+    def serialize(self) -> str:
+        return self.graph_string
+
+    def delete_graph(self):
+        self.deleted.append(self.graph_string)
+
+
+class StubService:
+    def __init__(self, jobs):
+        self.jobs = {job.name: job for job in jobs}
+
+
+class InventoryServiceTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.scans = 0
+        self.fail = False
+        self.deleted = list()
+
+        def scan():
+            self.scans += 1
+            if self.fail:
+                raise RuntimeError('Ralph is unavailable')
+            return StubTopology(self.model(self.scans), self.deleted), {'Nodes': self.scans}
+
+        self.job = InventoryJob(name='RENC', builder=scan, interval=3600, output_dir=self.tmpdir.name)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(StubService([self.job])))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.stop = threading.Event()
+
+    def tearDown(self) -> None:
+        self.stop.set()
+        self.job.wakeup.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def model(scan: int) -> str:
+        return f'<graphml><graph edgedefault="undirected"><node id="w{scan}"/></graph></graphml>'
+
+    def request(self, path: str, method: str = 'GET'):
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.url + path, method=method)) as r:
+                return r.status, r.headers['Content-Type'], r.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers['Content-Type'], e.read()
+
+    def wait_for_scans(self, scans: int):
+        # until the scan finished and its model was stored
+        deadline = time.monotonic() + 5
+        while (self.scans < scans or self.job.status()['refreshing']) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.scans, scans)
+
+    def testEndpoints(self):
+        # nothing scanned yet
+        status, _, body = self.request('/models/RENC')
+        self.assertEqual(status, 503)
+        self.job.refresh()
+        status, content_type, body = self.request('/models/renc')
+        self.assertEqual((status, content_type), (200, 'application/xml'))
+        self.assertEqual(body, self.model(1).encode('utf-8'))
+        status, content_type, body = self.request('/summaries/RENC')
+        self.assertEqual((status, content_type), (200, 'application/json'))
+        self.assertEqual(json.loads(body), {'Nodes': 1})
+        status, _, body = self.request('/status')
+        self.assertEqual(status, 200)
+        [job_status] = json.loads(body)
+        self.assertEqual((job_status['name'], job_status['model_available'], job_status['last_error']),
+                         ('RENC', True, None))
+        self.assertEqual(self.request('/models/STAR')[0], 404)
+        self.assertEqual(self.request('/nowhere')[0], 404)
+        self.assertEqual(self.request('/refresh/STAR', method='POST')[0], 404)
+        with open(self.job.model_file, 'r') as f:
+            self.assertEqual(f.read(), self.model(1))
+        # served from memory, the graph itself is released
+        self.assertEqual(self.deleted, [self.model(1)])
+
+    def testOneBuildAtATime(self):
+        building = list()
+        overlaps = list()
+
+        def scan():
+            building.append(1)
+            if len(building) > 1:
+                overlaps.append(len(building))
+            time.sleep(0.05)
+            building.pop()
+            return StubTopology(self.model(1), self.deleted), None
+
+        jobs = [InventoryJob(name=f'SITE{i}', builder=scan, interval=3600, output_dir=self.tmpdir.name,
+                             build_lock=self.job.build_lock) for i in range(4)]
+        threads = [threading.Thread(target=job.refresh) for job in jobs]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(overlaps, [])
+        self.assertTrue(all(job.status()['model_available'] for job in jobs))
+
+    def testRefreshScheduling(self):
+        threading.Thread(target=self.job.run, args=(self.stop,), daemon=True).start()
+        # refreshed once when started, then only every interval
+        self.wait_for_scans(1)
+        time.sleep(0.2)
+        self.assertEqual(self.scans, 1)
+        # unless asked to refresh now
+        status, _, body = self.request('/refresh/renc', method='POST')
+        self.assertEqual(status, 202)
+        self.assertEqual(json.loads(body)['name'], 'RENC')
+        self.wait_for_scans(2)
+        self.assertEqual(self.request('/models/RENC')[2], self.model(2).encode('utf-8'))
+
+    def testScanFailure(self):
+        self.job.refresh()
+        self.fail = True
+        self.job.refresh()
+        # the previous model is still served, the error is reported
+        status, _, body = self.request('/models/RENC')
+        self.assertEqual((status, body), (200, self.model(1).encode('utf-8')))
+        [job_status] = json.loads(self.request('/status')[2])
+        self.assertEqual(job_status['last_error'], 'Ralph is unavailable')
+        self.assertFalse(job_status['refreshing'])
+        self.fail = False
+        self.job.refresh()
+        [job_status] = json.loads(self.request('/status')[2])
+        self.assertIsNone(job_status['last_error'])
+        self.assertTrue(os.path.exists(self.job.json_file))
@@ -0,0 +1,71 @@
+import unittest
+import json
+import os
+import tempfile
+from unittest import mock
+
+from fim.slivers.capacities_labels import LocationException
+
+from fimutil.ralph.location_cache import LocationCache
+
+ADDRESS = '100 Europa Dr., Chapel Hill, NC 27517'
+GEOCODER = 'fim.slivers.capacities_labels.Location.to_latlon'
+
+
+class LocationCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmpdir.name, 'locations.json')
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def testCacheHit(self):
+        with open(self.cache_file, 'w') as f:
+            json.dump({ADDRESS: [35.9, -79.0]}, f)
+        with mock.patch(GEOCODER) as geocoder:
+            self.assertEqual(LocationCache(cache_file=self.cache_file).to_latlon(ADDRESS), (35.9, -79.0))
+            # offline mode is served from the cache too
+            self.assertEqual(LocationCache(cache_file=self.cache_file, offline=True).to_latlon(ADDRESS),
+                             (35.9, -79.0))
+            geocoder.assert_not_called()
+
+    def testCacheMissStored(self):
+        cache = LocationCache(cache_file=self.cache_file)
+        with mock.patch(GEOCODER, return_value=(35.9, -79.0)) as geocoder:
+            self.assertEqual(cache.to_latlon(ADDRESS), (35.9, -79.0))
+            self.assertEqual(cache.to_latlon(ADDRESS), (35.9, -79.0))
+            geocoder.assert_called_once()
+        with open(self.cache_file, 'r') as f:
+            self.assertEqual(json.load(f), {ADDRESS: [35.9, -79.0]})
+        # and found by the next scan
+        with mock.patch(GEOCODER) as geocoder:
+            self.assertEqual(LocationCache(cache_file=self.cache_file).to_latlon(ADDRESS), (35.9, -79.0))
+            geocoder.assert_not_called()
+
+    def testOfflineMiss(self):
+        cache = LocationCache(cache_file=self.cache_file, offline=True)
+        with mock.patch(GEOCODER) as geocoder:
+            with self.assertRaises(LocationException):
+                cache.to_latlon(ADDRESS)
+            geocoder.assert_not_called()
+        self.assertFalse(os.path.exists(self.cache_file))
+
+    def testCorruptCache(self):
+        for content in ('{"100 Europa', '["not", "addresses"]', b'\xff\xfe\x00'):
+            with open(self.cache_file, 'wb') as f:
+                f.write(content if isinstance(content, bytes) else content.encode('utf-8'))
+            cache = LocationCache(cache_file=self.cache_file)
+            self.assertEqual(cache.entries, {})
+            with mock.patch(GEOCODER, return_value=(35.9, -79.0)):
+                self.assertEqual(cache.to_latlon(ADDRESS), (35.9, -79.0))
+            # replaced with a good cache
+            self.assertEqual(LocationCache(cache_file=self.cache_file).entries, {ADDRESS: [35.9, -79.0]})
+
+    def testUnreadableCache(self):
+        # a directory can be neither read nor replaced - geocoding still works, just isn't cached
+        os.mkdir(self.cache_file)
+        cache = LocationCache(cache_file=self.cache_file)
+        self.assertEqual(cache.entries, {})
+        with mock.patch(GEOCODER, return_value=(35.9, -79.0)):
+            self.assertEqual(cache.to_latlon(ADDRESS), (35.9, -79.0))
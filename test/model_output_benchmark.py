@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark plain, gzip and zstd model files - write time, file size and load time
+(decompression plus parsing, with fim if it is installed, otherwise as XML).
+Uses an existing GraphML model given with --model, otherwise a synthetic one shaped
+like a site model with the given number of workers and OpenStack vNICs per worker.
+
+$ python test/model_output_benchmark.py --model renc.graphml
+$ python test/model_output_benchmark.py --workers 20 --vnics 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import quoteattr
+
+try:
+    from fim.user.topology import SubstrateTopology
+except ImportError:
+    SubstrateTopology = None
+
+from fimutil.common.model_output import write_model, read_model, zstandard
+from fimutil.ralph.openstack_nics import OpenStackNicAllocator
+
+
+class GraphString:
+    """
+    Stands in for a fim topology that serializes into a given GraphML string
+    """
+    def __init__(self, graph: str):
+        self.graph = graph
+
+    def serialize(self) -> str:
+        return self.graph
+
+
+def synthetic_model(workers: int, vnics: int) -> str:
+    allocator = OpenStackNicAllocator('f2:ab')
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">',
+             '<key id="labels" for="node" attr.name="Labels" attr.type="string"/>',
+             '<graph edgedefault="undirected">']
+    for w in range(1, workers + 1):
+        nics = allocator.allocate(f'renc-w{w}.fabric-testbed.net', start=1, count=vnics)
+        labels = json.dumps({'mac': nics.mac_strings(), 'bdf': nics.vbdf_strings(), 'vlan': ['0'] * vnics})
+        lines.append(f'<node id="w{w}"><data key="labels">{labels}</data></node>')
+        lines.append(f'<node id="w{w}-nic"><data key="labels">{{"local_name": "p1"}}</data></node>')
+        lines.append(f'<edge source="w{w}" target={quoteattr(f"w{w}-nic")}/>')
+    lines.append('</graph></graphml>')
+    return '\n'.join(lines)
+
+
+def load(file_name: str):
+    graph = read_model(file_name)
+    if SubstrateTopology is not None:
+        return SubstrateTopology(graph_string=graph)
+    return ET.fromstring(graph)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", action="store",
+                        help="GraphML model to benchmark with instead of a synthetic one")
+    parser.add_argument("--workers", action="store", type=int, default=20,
+                        help="Workers of the synthetic model. Defaults to 20")
+    parser.add_argument("--vnics", action="store", type=int, default=2000,
+                        help="vNICs per worker of the synthetic model. Defaults to 2000")
+    parser.add_argument("--repeat", action="store", type=int, default=3,
+                        help="Take the best of this many runs. Defaults to 3")
+    args = parser.parse_args()
+
+    if args.model:
+        graph = read_model(args.model)
+    else:
+        graph = synthetic_model(args.workers, args.vnics)
+    topology = GraphString(graph)
+
+    extensions = ['.graphml', '.graphml.gz']
+    if zstandard is not None:
+        extensions.append('.graphml.zst')
+    print(f'{len(graph.encode("utf-8"))} byte model, loading with {"fim" if SubstrateTopology else "ElementTree"}')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for extension in extensions:
+            file_name = os.path.join(tmpdir, 'model' + extension)
+            write_time = load_time = float('inf')
+            for _ in range(args.repeat):
+                start = time.monotonic()
+                write_model(topology, file_name)
+                write_time = min(write_time, time.monotonic() - start)
+                start = time.monotonic()
+                load(file_name)
+                load_time = min(load_time, time.monotonic() - start)
+            print(f'{extension:14} write {write_time:7.3f}s  size {os.path.getsize(file_name):11} bytes  '
+                  f'load {load_time:7.3f}s')
+
+
+if __name__ == "__main__":
+    sys.exit(main())
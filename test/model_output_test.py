@@ -0,0 +1,84 @@
+import unittest
+import os
+import tempfile
+
+from fimutil.common.model_output import write_model, read_model, model_compression, model_digest, \
+    DIGEST_EXTENSION, zstandard
+
+
+class GraphString:
+    def __init__(self, graph: str):
+        self.graph = graph
+
+    def serialize(self) -> str:
+        return self.graph
+
+
+class ModelOutputTest(unittest.TestCase):
+
+    def testRoundTrip(self):
+        graph = '<graphml>' + '<node id="w1"/>' * 10000 + '</graphml>'
+        extensions = ['.graphml', '.graphml.gz'] + (['.graphml.zst'] if zstandard is not None else [])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for extension in extensions:
+                file_name = os.path.join(tmpdir, 'model' + extension)
+                write_model(GraphString(graph), file_name)
+                self.assertEqual(read_model(file_name), graph)
+                self.assertFalse(os.path.exists(file_name + '.tmp'))
+                if model_compression(file_name):
+                    self.assertLess(os.path.getsize(file_name), len(graph) // 10)
+
+    def testSkipUnchanged(self):
+        graph = ('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">'
+                 '<key id="d0" for="node" attr.name="GraphID"/><key id="d1" for="node" attr.name="Name"/>'
+                 '<graph edgedefault="undirected">'
+                 '<node id="a"><data key="d0">g1</data><data key="d1">w1</data></node>'
+                 '<node id="b"><data key="d0">g1</data><data key="d1">w2</data></node>'
+                 '<edge source="a" target="b"/></graph></graphml>')
+        # same model in a different order, with other key ids and a new GraphID
+        reordered = ('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">'
+                     '<key id="d5" for="node" attr.name="Name"/><key id="d6" for="node" attr.name="GraphID"/>'
+                     '<graph edgedefault="undirected">'
+                     '<node id="b"><data key="d5">w2</data><data key="d6">g2</data></node>'
+                     '<edge source="b" target="a"/>'
+                     '<node id="a"><data key="d6">g2</data><data key="d5">w1</data></node></graph></graphml>')
+        changed = graph.replace('>w2<', '>w3<')
+        self.assertEqual(model_digest(graph), model_digest(reordered))
+        self.assertNotEqual(model_digest(graph), model_digest(changed))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_name = os.path.join(tmpdir, 'model.graphml.gz')
+            self.assertTrue(write_model(GraphString(graph), file_name, skip_unchanged=True))
+            self.assertTrue(os.path.exists(file_name + DIGEST_EXTENSION))
+            self.assertFalse(write_model(GraphString(reordered), file_name, skip_unchanged=True))
+            self.assertEqual(read_model(file_name), graph)
+            self.assertTrue(write_model(GraphString(changed), file_name, skip_unchanged=True))
+            self.assertEqual(read_model(file_name), changed)
+            # a plain write does not leave a stale digest behind
+            self.assertTrue(write_model(GraphString(graph), file_name))
+            self.assertFalse(os.path.exists(file_name + DIGEST_EXTENSION))
+
+    def testDigestBuildOrder(self):
+        header = ('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">'
+                  '<key id="d0" for="node" attr.name="NodeID"/><key id="d1" for="node" attr.name="Name"/>'
+                  '<key id="d2" for="edge" attr.name="Class"/>'
+                  '<graph edgedefault="directed">')
+        nodes = {'w1': ('W1', 'worker1'), 'w2': ('W2', 'worker2'), 'sw': ('SW', 'dp-switch')}
+
+        def build(order):
+            # GraphML ids are handed out in the order nodes are added, as fim does
+            ids = {name: str(i) for i, name in enumerate(order)}
+            graph = header
+            for name in order:
+                node_id, label = nodes[name]
+                graph += f'<node id="{ids[name]}"><data key="d0">{node_id}</data><data key="d1">{label}</data></node>'
+            for name in order:
+                if name != 'sw':
+                    graph += f'<edge source="{ids[name]}" target="{ids["sw"]}"><data key="d2">has</data></edge>'
+            return graph + '</graph></graphml>'
+
+        first, second = build(['w1', 'w2', 'sw']), build(['sw', 'w2', 'w1'])
+        self.assertNotEqual(first, second)
+        self.assertEqual(model_digest(first), model_digest(second))
+        # the direction of an edge still counts in a directed graph
+        flipped = first.replace('<edge source="0" target="2">', '<edge source="2" target="0">')
+        self.assertNotEqual(model_digest(first), model_digest(flipped))
@@ -1,6 +1,11 @@
 import unittest
+import json
+import os
+import tempfile
+import time
+from unittest import mock
 
-from fimutil.netam.nso import NsoClient
+from fimutil.netam.nso import NsoClient, NetAmNsoError
 from fimutil.netam.sr_pce import SrPceClient
 from fimutil.netam.arm import NetworkARM
 
@@ -18,12 +23,80 @@ class NetAmTest(unittest.TestCase):
             ifaces = nso.isis_interfaces(dev_name)
             l = len(ifaces)
 
+    def testNsoInterfacesFallback(self):
+        nso = NsoClient(config={'nso_url': 'http://localhost', 'nso_user': 'u', 'nso_pass': 'p'})
+        ifaces = [{'name': 'HundredGigE0/0/0/24', 'admin-status': 'up'}]
+        base = f'tailf-ncs:devices/device=renc-data-sw/{NsoClient.INTERFACES_PATH}'
+        selected = f'{base}?fields={NsoClient.INTERFACE_FIELDS}'
+        # selector honored
+        with mock.patch.object(nso, '_get_response', return_value=(200, {'ietf-interfaces:interface': ifaces})) as get:
+            self.assertEqual(nso.interfaces('renc-data-sw'), ifaces)
+            get.assert_called_once_with(selected)
+        # selector mishandled or a transient failure - the device is queried again without it, selector kept
+        for failure in [(200, {}), NetAmNsoError('GET: 503 Service Unavailable', status_code=503),
+                        NetAmNsoError('GET: Connection reset by peer'), (500, {'ietf-restconf:errors': {}})]:
+            with mock.patch.object(nso, '_get_response', side_effect=[failure]) as get_response, \
+                    mock.patch.object(nso, '_get', return_value={'ietf-interfaces:interface': ifaces}) as get:
+                self.assertEqual(nso.interfaces('renc-data-sw'), ifaces)
+                get_response.assert_called_once_with(selected)
+                get.assert_called_once_with(base)
+            self.assertTrue(nso.interface_fields_supported)
+        # selector rejected - no longer used for any device
+        with mock.patch.object(nso, '_get_response', side_effect=[(400, {'ietf-restconf:errors': {}})]), \
+                mock.patch.object(nso, '_get', return_value={'ietf-interfaces:interface': ifaces}) as get:
+            self.assertEqual(nso.interfaces('renc-data-sw'), ifaces)
+            get.assert_called_once_with(base)
+        self.assertFalse(nso.interface_fields_supported)
+        with mock.patch.object(nso, '_get_response') as get_response, \
+                mock.patch.object(nso, '_get', return_value={'ietf-interfaces:interface': ifaces}) as get:
+            self.assertEqual(nso.interfaces('renc-data-sw'), ifaces)
+            get_response.assert_not_called()
+            get.assert_called_once_with(base)
+        # the status code is kept with errors of rejected queries
+        nso.interface_fields_supported = True
+        response = mock.Mock(status_code=400, text='<html>Bad Request', json=mock.Mock(side_effect=ValueError))
+        with mock.patch.object(nso.http, 'get', return_value=response):
+            with mock.patch.object(nso, '_get', return_value={'ietf-interfaces:interface': ifaces}):
+                self.assertEqual(nso.interfaces('renc-data-sw'), ifaces)
+        self.assertFalse(nso.interface_fields_supported)
+
     def testSrPceClient(self):
         sr_pce = SrPceClient()
         sr_pce.get_topology_json()
         links_json = sr_pce.get_ipv4_links()
         assert len(links_json) >= 1 and len(links_json) % 2 == 0
 
+    def testSrPceCachedLinks(self):
+        sr_pce = SrPceClient(config={'sr_pce_url': 'http://localhost', 'sr_pce_user': 'u', 'sr_pce_pass': 'p'})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_file = os.path.join(tmpdir, 'links.json')
+            with open(cache_file, 'w') as fd:
+                json.dump({'timestamp': time.time(), 'digest': 'abc',
+                           'ipv4_links': {'10.0.0.1-10.0.0.2': ['10.0.0.1', '10.0.0.2']}}, fd)
+            # fresh snapshot is used without contacting SR-PCE
+            links = sr_pce.get_ipv4_links_cached(cache_file=cache_file, ttl=3600)
+            self.assertEqual(links, {'10.0.0.1-10.0.0.2': ('10.0.0.1', '10.0.0.2')})
+            self.assertIsNone(sr_pce.json_topology)
+
+    def testSrPceDetachedRefresh(self):
+        sr_pce = SrPceClient(config={'sr_pce_url': 'http://localhost', 'sr_pce_user': 'u', 'sr_pce_pass': 'p'},
+                             config_file='netam.conf')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_file = os.path.join(tmpdir, 'links.json')
+            with open(cache_file, 'w') as fd:
+                json.dump({'timestamp': time.time() - 7200, 'digest': 'abc',
+                           'ipv4_links': {'10.0.0.1-10.0.0.2': ['10.0.0.1', '10.0.0.2']}}, fd)
+            # an expired snapshot is returned at once and refreshed by a process that doesn't hold this one up
+            with mock.patch('subprocess.Popen') as popen:
+                links = sr_pce.get_ipv4_links_cached(cache_file=cache_file, ttl=3600, background_refresh=True,
+                                                     detached=True)
+            self.assertEqual(links, {'10.0.0.1-10.0.0.2': ('10.0.0.1', '10.0.0.2')})
+            self.assertIsNone(sr_pce.refresh_thread)
+            cmd = popen.call_args.args[0]
+            self.assertEqual(cmd[1:5], ['-m', 'fimutil.netam.sr_pce', '--refresh-links-snapshot', cache_file])
+            self.assertEqual(cmd[5:], ['-c', os.path.abspath('netam.conf')])
+            self.assertTrue(popen.call_args.kwargs['start_new_session'])
+
     def testBuildNetworkARM(self):
         arm = NetworkARM()
         arm.build_topology()
@@ -35,3 +108,78 @@ class NetAmTest(unittest.TestCase):
         arm.build_topology()
         arm.delegate_topology("primary")
         arm.write_topology(file_name="/tmp/network-arm.graphml")
+
+    def testSitesMetadataIndex(self):
+        sites_metadata = {
+            'RENC': {
+                'p2p_links': {
+                    'HundredGigE 0/0/0/24': {'port-capacity': 100, 'link-capacity': 80, 'ltype': 'l2path'},
+                    'Bundle-Ether 1': {'link-reserve-capacity': 10}
+                },
+                'facility_ports': {'RENCI-DTN': {'stitch_port': 'HundredGigE 0/0/0/25', 'vlan_range': '100-200'}},
+                'al2s_ports': {'RENC-AL2S': {'stitch_port': 'HundredGigE0/0/0/26'}}
+            },
+            'UKY': 'not a site'
+        }
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sites_config = os.path.join(tmpdir, 'sites.yaml')
+            with open(sites_config, 'w') as fd:
+                json.dump(sites_metadata, fd)
+            config_file = os.path.join(tmpdir, 'netam.conf')
+            with open(config_file, 'w') as fd:
+                json.dump({'nso_url': 'http://localhost', 'nso_user': 'u', 'nso_pass': 'p',
+                           'sites_config': sites_config}, fd)
+            arm = NetworkARM(config_file=config_file)
+        # NSO port names have no space, the sites config may have one
+        self.assertEqual(arm._get_port_link_cap('RENC', 'HundredGigE0/0/0/24'),
+                         {'port-capacity': 100, 'link-capacity': 80})
+        self.assertEqual(arm._get_port_link_cap('RENC', 'HundredGigE 0/0/0/24'),
+                         {'port-capacity': 100, 'link-capacity': 80})
+        self.assertEqual(arm._get_port_link_cap('RENC', 'Bundle-Ether1'), {'link-reserve-capacity': 10})
+        self.assertEqual(arm._get_port_link_cap('RENC', 'HundredGigE0/0/0/99'), {})
+        self.assertEqual(arm._get_port_link_cap('UKY', 'HundredGigE0/0/0/24'), {})
+        self.assertEqual(arm._get_link_type('RENC', 'HundredGigE0/0/0/24'), 'l2path')
+        self.assertEqual(arm._get_link_type('RENC', 'Bundle-Ether1'), 'l1path')
+        self.assertEqual(arm._get_link_type('STAR', 'HundredGigE0/0/0/24'), 'l1path')
+        self.assertEqual([name for name, _ in arm.facility_stitches['RENC']['HundredGigE0/0/0/25']], ['RENCI-DTN'])
+        self.assertEqual([name for name, _ in arm.al2s_stitches['RENC']['HundredGigE0/0/0/26']], ['RENC-AL2S'])
+        self.assertNotIn('UKY', arm.port_link_caps)
+
+    def testParallelDeviceFetch(self):
+        sites_metadata = {site: {'p2p_links': {'HundredGigE0/0/0/24': {'port-capacity': 100}}}
+                          for site in ('RENC', 'UKY', 'LBNL', 'STAR')}
+        devs = [{'name': f'{site.lower()}-data-sw'} for site in sites_metadata]
+
+        def interfaces(dev_name):
+            # devices listed first answer last, so completion order differs from device order
+            time.sleep(0.01 * (len(devs) - [d['name'] for d in devs].index(dev_name)))
+            return [{'name': 'Loopback0', 'ietf-ip:ipv4': {'address': [{'ip': f'10.0.0.{len(dev_name)}'}]}},
+                    {'name': 'HundredGigE0/0/0/24', 'statistics': {}},
+                    {'name': 'MgmtEth0/RP0/CPU0/0'}]
+
+        def isis_interfaces(dev_name):
+            return [{'name': 'HundredGigE0/0/0/24'}]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sites_config = os.path.join(tmpdir, 'sites.yaml')
+            with open(sites_config, 'w') as fd:
+                json.dump(sites_metadata, fd)
+            config_file = os.path.join(tmpdir, 'netam.conf')
+            with open(config_file, 'w') as fd:
+                json.dump({'nso_url': 'http://localhost', 'nso_user': 'u', 'nso_pass': 'p',
+                           'sites_config': sites_config}, fd)
+            arm = NetworkARM(config_file=config_file)
+        results = []
+        for max_workers in (1, 8):
+            arm.config['nso_max_workers'] = max_workers
+            with mock.patch.object(arm.nso, 'devices', side_effect=lambda: [dict(d) for d in devs]), \
+                    mock.patch.object(arm.nso, 'interfaces', side_effect=interfaces), \
+                    mock.patch.object(arm.nso, 'isis_interfaces', side_effect=isis_interfaces):
+                results.append(arm._get_device_interfaces())
+        # concurrent queries produce exactly what serial queries do
+        self.assertEqual(results[0], results[1])
+        self.assertEqual([d['name'] for d in results[1]], [d['name'] for d in devs])
+        self.assertEqual([iface['name'] for iface in results[1][0]['interfaces']],
+                         ['Loopback0', 'HundredGigE0/0/0/24'])
+        self.assertTrue(results[1][0]['interfaces'][1]['isis'])
+        self.assertEqual(results[1][0]['loopback_ipv4'], '10.0.0.12')
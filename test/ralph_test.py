@@ -1,7 +1,23 @@
 import unittest
+import io
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
 
-from fimutil.ralph.ralph_uri import RalphURI
+from fimutil.ralph.ralph_uri import RalphURI, RequestSettings
+from fimutil.ralph.asset import RalphAsset, RalphAssetType
 from fimutil.ralph.worker_node import WorkerNode
+from fimutil.ralph.ethernetport import EthernetCardPort
+from fimutil.ralph.scan_context import ScanContext
+from fimutil.ralph.checkpoint import ScanCheckpoint
+from fimutil.ralph.site import Site
+from fimutil.ralph.dp_switch import DPSwitch
+from fimutil.ralph.accelerators import AcceleratorDetector
+from fimutil.ralph.gpu import GPU, GPU_MODELS
+from fimutil.ralph.openstack_nics import OpenStackNicAllocator
+from fimutil.common.label_ranges import compress, expand
 
 
 class RalphTest(unittest.TestCase):
@@ -9,3 +25,278 @@ class RalphTest(unittest.TestCase):
     def testRalphComponents(self):
         self.ru = RalphURI(token="token", base_uri="https://something")
         self.wn = WorkerNode(uri="https://something", ralph=self.ru)
+
+    def testCompactAssets(self):
+        port = EthernetCardPort(uri='no-url', ralph=None)
+        port.force_values(model='OpenStack-vNIC', desc='OpenStack vNIC', speed='1Gbps', mac='f2:ab:01:00:00:02')
+        # slotted assets carry no per-instance __dict__
+        self.assertFalse(hasattr(port, '__dict__'))
+        port.raw_json_obj = {'mac': 'f2:ab:01:00:00:02'}
+        port.release_raw_json()
+        self.assertIsNone(port.raw_json_obj)
+        self.assertEqual(port.fields['MAC'], 'f2:ab:01:00:00:02')
+
+    def testScanContext(self):
+        brief = ScanContext(print_summary=True)
+        other = ScanContext()
+        port = EthernetCardPort(uri='no-url', ralph=None, context=brief)
+        port.force_values(model='OpenStack-vNIC', desc='OpenStack vNIC', speed='1Gbps')
+        self.assertEqual(str(port), 'EthernetCardPF: OpenStack vNIC')
+        # NIC indices are allocated per scan, not per process
+        self.assertEqual(brief.next_openstack_nic_index(), 10)
+        self.assertEqual(brief.next_openstack_nic_index(), 11)
+        self.assertEqual(other.next_openstack_nic_index(), 10)
+
+    def testRequestSettings(self):
+        ralph = RalphURI(token='token', base_uri='https://ralph/api/', disable_ssl=False)
+        self.assertIsNone(ralph.rate_limiter)
+        self.assertIsNone(ralph.concurrency)
+        self.assertIsNone(ralph.hedger)
+        ralph = RalphURI(token='token', base_uri='https://ralph/api/', disable_ssl=False,
+                         settings=RequestSettings(max_rate=5, adaptive_concurrency=True, max_concurrency=4,
+                                                  hedge=True, hedge_budget=0.1))
+        self.assertIsNotNone(ralph.rate_limiter)
+        self.assertIsNotNone(ralph.concurrency)
+        self.assertEqual(ralph.hedger.budget, 0.1)
+        ralph.hedger.executor.shutdown()
+
+    def testScanCheckpoint(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            checkpoint_file = os.path.join(tmpdir, 'checkpoint.jsonl')
+            checkpoint = ScanCheckpoint(checkpoint_file=checkpoint_file)
+            checkpoint.save_response('https://ralph/api/1', {'results': [1]})
+            port = EthernetCardPort(uri='https://ralph/api/2', ralph=None)
+            port.force_values(model='OpenStack-vNIC', desc='OpenStack vNIC', speed='1Gbps')
+            checkpoint.save_asset(port)
+            # interrupted in the middle of a line
+            checkpoint.f.write('{"Record": "resp')
+            checkpoint.f.close()
+            resumed = ScanCheckpoint(checkpoint_file=checkpoint_file, resume=True)
+            self.assertEqual(resumed.get_response('https://ralph/api/1'), {'results': [1]})
+            self.assertIsNone(resumed.get_response('https://ralph/api/3'))
+            self.assertEqual(resumed.get_asset('https://ralph/api/2')['Slots']['fields']['Value']['Model'],
+                             'OpenStack-vNIC')
+            resumed.remove()
+            self.assertFalse(os.path.exists(checkpoint_file))
+
+    @staticmethod
+    def _catalog_responses(base):
+        """
+        Ralph responses for a site with a dataplane switch and one worker with a GPU and a NIC
+        """
+        assets = base + 'data-center-assets/'
+        return {
+            assets + '?hostname=test-data-sw.fabric-testbed.net': {'results': [{'url': assets + '1/'}]},
+            assets + '?hostname=test-p4-sw.fabric-testbed.net': {'results': []},
+            assets + '?hostname=test-time.fabric-testbed.net': {'results': []},
+            assets + '?hostname=test-storage.fabric-testbed.net': {'results': []},
+            assets + '?hostname__startswith=test-w&limit=100': {'results': [{'url': assets + '2/'}]},
+            assets + '1/': {'hostname': 'test-data-sw.fabric-testbed.net', 'sn': 'SW1', 'ipaddresses': [],
+                            'custom_fields': {'dataplane_vlan_ranges': '100-102'},
+                            'model': {'url': base + 'models/1/'}, 'ethernet': []},
+            base + 'models/1/': {'category': {'name': 'Cisco NCS 5700'}},
+            assets + '2/': {'hostname': 'test-w1.fabric-testbed.net', 'sn': 'W1',
+                            'model': {'url': base + 'models/2/'}, 'disk': [],
+                            'custom_fields': {'gpu1': 'Tesla T4', 'gpu1_pci_id': '25:00.0'},
+                            'ethernet': [{'url': base + 'ethernet/3/'}]},
+            base + 'models/2/': {'category': {'name': 'Dell R7525'}, 'cores_count': 64,
+                                 'custom_fields': {'total_memory_ram': '512G', 'cpu_socket_count': '2'}},
+            base + 'ethernet/3/': {'mac': '0c:42:a1:00:00:01', 'speed': '100Gbps',
+                                   'model_name': 'Mellanox Technologies MT28908 Family [ConnectX-6] '
+                                                 'in PCIe Slot 3 (0000:41:00.0)',
+                                   'label': 'Connected to port HundredGigE0/0/0/1 on test-data-sw'}
+        }
+
+    def testCatalogResume(self):
+        base = 'https://ralph/api/'
+        responses = self._catalog_responses(base)
+        fetched = list()
+
+        def fake_get_json(uri):
+            fetched.append(uri)
+            if uri in failing:
+                raise RuntimeError(f'Unable to contact {uri=}')
+            return responses[uri]
+
+        def scan(checkpoint):
+            ralph = RalphURI(token='token', base_uri=base, disable_ssl=False, checkpoint=checkpoint)
+            site = Site(site_name='TEST', ralph=ralph, context=ScanContext(ralph=ralph, catalog_concurrency=1))
+            with mock.patch.object(ralph, '_get_json', side_effect=fake_get_json):
+                site.catalog()
+            return site
+
+        failing = set()
+        expected = scan(None).to_json()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            checkpoint_file = os.path.join(tmpdir, 'checkpoint.jsonl')
+            # the worker port can't be fetched, the dataplane switch is parsed and journaled
+            failing = {base + 'ethernet/3/'}
+            with self.assertRaises(RuntimeError):
+                scan(ScanCheckpoint(checkpoint_file=checkpoint_file))
+            failing = set()
+            fetched.clear()
+            # the switch is restored, not parsed again - only the missing port is fetched
+            with mock.patch.object(DPSwitch, 'parse', side_effect=AssertionError('parsed again')):
+                site = scan(ScanCheckpoint(checkpoint_file=checkpoint_file, resume=True))
+            self.assertEqual(fetched, [base + 'ethernet/3/'])
+            self.assertEqual(site.to_json(), expected)
+            self.assertEqual(site.dp_switch.vlan_ranges, [100, 101, 102])
+            # a second resume restores the worker too, with its components
+            fetched.clear()
+            with mock.patch.object(WorkerNode, 'parse', side_effect=AssertionError('parsed again')):
+                site = scan(ScanCheckpoint(checkpoint_file=checkpoint_file, resume=True))
+            self.assertEqual(fetched, [])
+            self.assertEqual(site.to_json(), expected)
+            worker = site.workers[0]
+            self.assertIs(worker.dp_switch, site.dp_switch)
+            self.assertEqual(worker.get_dp_ports(), ['HundredGigE0/0/0/1'])
+            self.assertIsInstance(worker.components['gpu-1'], GPU)
+
+    def testWriteJson(self):
+        base = 'https://ralph/api/'
+        responses = self._catalog_responses(base)
+        ralph = RalphURI(token='token', base_uri=base, disable_ssl=False)
+        with mock.patch.object(ralph, '_get_json', side_effect=lambda uri: responses[uri]):
+            site = Site(site_name='TEST', ralph=ralph, context=ScanContext(ralph=ralph, catalog_concurrency=1))
+            site.catalog()
+            expected = json.dumps(site.to_json(), indent=2, sort_keys=True)
+            f = io.StringIO()
+            site.write_json(f)
+            self.assertEqual(f.getvalue(), expected)
+            # streamed while cataloging, no workers kept
+            site = Site(site_name='TEST', ralph=ralph, context=ScanContext(ralph=ralph, catalog_concurrency=1))
+            f = io.StringIO()
+            site.write_json(f, workers=site.iter_catalog(keep_workers=False))
+            self.assertEqual(f.getvalue(), expected)
+            self.assertEqual(site.workers, [])
+            f = io.StringIO()
+            site.write_json(f, json_lines=True, workers=[])
+            self.assertEqual([json.loads(line)['Record'] for line in f.getvalue().splitlines()], ['DataPlane'])
+        # no workers at all
+        f = io.StringIO()
+        site.write_json(f)
+        self.assertEqual(f.getvalue(), json.dumps(site.to_json(), indent=2, sort_keys=True))
+
+    def testWorkerComponentOrder(self):
+        ralph = RalphURI(token='token', base_uri='https://ralph/api/', disable_ssl=False)
+        worker = WorkerNode(uri='https://ralph/api/data-center-assets/2/', ralph=ralph, dp_switch=None,
+                            context=ScanContext(ralph=ralph, print_summary=True))
+        worker.fields['Name'] = 'test-w1.fabric-testbed.net'
+        ports = list()
+        for i, ctype in enumerate((RalphAssetType.EthernetCardPF, RalphAssetType.EthernetCardVF,
+                                   RalphAssetType.EthernetCardPF)):
+            port = EthernetCardPort(uri='no-url', ralph=ralph)
+            port.force_values(model='ConnectX-6', desc='port', speed='100Gbps', bdf=f'0000:41:00.{i}',
+                              mac=f'0c:42:a1:00:00:0{i}', ctype=ctype)
+            ports.append(port)
+        other = RalphAsset(uri='no-url', ralph=ralph)
+        # added out of the usual parse order, with a component type that has no bucket
+        worker.add_component('gpu-1', GPU(Model='Tesla T4', Description='GPU', BDF=['25:00.0'], NUMA=['0']))
+        worker.add_component('port-1', ports[0])
+        worker.add_component('port-2', ports[1])
+        worker.add_component('other-1', other)
+        worker.add_component('port-3', ports[2])
+        self.assertEqual([(c['Type'], c.get('BDF')) for c in worker.components_json()],
+                         [(str(RalphAssetType.GPU), ['25:00.0']),
+                          (str(RalphAssetType.EthernetCardPF), '0000:41:00.0'),
+                          (str(RalphAssetType.Abstract), None),
+                          (str(RalphAssetType.EthernetCardPF), '0000:41:00.2')])
+        self.assertEqual([line.split()[0] for line in str(worker).splitlines()[1:]],
+                         ['gpu-1', 'port-1', 'other-1', 'port-3', 'Detected'])
+        self.assertIn('Detected 1 SR-IOV functions', str(worker))
+
+    def testCatalogPrefetchStop(self):
+        ralph = RalphURI(token='token', base_uri='https://ralph/api/', disable_ssl=False)
+        site = Site(site_name='TEST', ralph=ralph, context=ScanContext(ralph=ralph))
+        closed = list()
+
+        def fake_iter_catalog(*, keep_workers):
+            try:
+                for i in range(1000):
+                    yield i
+            finally:
+                closed.append(True)
+
+        with mock.patch.object(site, 'iter_catalog', side_effect=fake_iter_catalog):
+            # the consumer stops after one worker while the producer is blocked on a full queue
+            workers = site.iter_catalog_prefetch(depth=1)
+            self.assertEqual(next(workers), 0)
+            workers.close()
+            self.assertEqual(closed, [True])
+            self.assertFalse([t for t in threading.enumerate() if t.name == 'catalog-TEST'])
+            # same when the consumer fails part way
+            closed.clear()
+            with self.assertRaises(ValueError):
+                for worker in site.iter_catalog_prefetch(depth=1):
+                    raise ValueError(worker)
+            self.assertEqual(closed, [True])
+            self.assertFalse([t for t in threading.enumerate() if t.name == 'catalog-TEST'])
+
+    def testSparseFields(self):
+        self.assertEqual(DPSwitch.sparse_fields(),
+                         ('custom_fields', 'ethernet', 'hostname', 'ipaddresses', 'model', 'sn', 'url'))
+        self.assertEqual(WorkerNode.sparse_fields(),
+                         ('custom_fields', 'disk', 'ethernet', 'hostname', 'model', 'sn', 'url'))
+
+    def testAcceleratorDetector(self):
+        detector = AcceleratorDetector(gpu_models=['Tesla T4'], fpga_models=['Alveo U280'])
+        custom_fields = {'gpu1': 'NVIDIA Tesla T4', 'gpu1_pci_id': '25:00.0 25:00.1', 'gpu2': 'NVIDIA L40S',
+                         'fpga1': 'Xilinx Alveo U280', 'fpga1_pci_id': '0000:e1:00.0', 'fpga1_sn': 'XFL1',
+                         'fpga1_port_2': 'to port HundredGigE0/0/0/2 of switch',
+                         'fpga1_port_1': 'to port HundredGigE0/0/0/1 of switch', 'usable_disk': None}
+        gpus, fpgas = detector.detect(custom_fields)
+        self.assertEqual([g.Model for g in gpus], ['Tesla T4'])
+        self.assertEqual(gpus[0].BDF, ['25:00.0', '25:00.1'])
+        self.assertEqual(fpgas[0].Ports, ['HundredGigE0/0/0/1', 'HundredGigE0/0/0/2'])
+        # models can be added at runtime
+        detector.add_model(GPU, 'L40S')
+        gpus, _ = detector.detect(custom_fields)
+        self.assertEqual([g.Model for g in gpus], ['Tesla T4', 'L40S'])
+        # without leaking into the module tables or other detectors
+        default = AcceleratorDetector()
+        default.add_model(GPU, 'L40S')
+        self.assertNotIn('L40S', GPU_MODELS)
+        self.assertEqual(AcceleratorDetector().detect(custom_fields)[0][0].Model, 'Tesla T4')
+        self.assertEqual(len(AcceleratorDetector().detect(custom_fields)[0]), 1)
+
+    def testAcceleratorDetectorOverlappingModels(self):
+        # like checking every field for every model name - nested and overlapping names are all found
+        detector = AcceleratorDetector(gpu_models=['A40 PCIe', 'Tesla T4', 'A40', 'T4 PCIe'], fpga_models=['A40'])
+        custom_fields = {'gpu1': 'NVIDIA A40 PCIe', 'gpu2': 'NVIDIA Tesla T4 PCIe', 'gpu3': 'A40 and A40',
+                         'fpga1_pci_id': '0000:e1:00.0', 'fpga1_sn': 'XFL1', 'fpga2_sn': 'XFL2'}
+        gpus, fpgas = detector.detect(custom_fields)
+        self.assertEqual([(g.Description, g.Model) for g in gpus],
+                         [('NVIDIA A40 PCIe', 'A40 PCIe'), ('NVIDIA A40 PCIe', 'A40'),
+                          ('NVIDIA Tesla T4 PCIe', 'Tesla T4'), ('NVIDIA Tesla T4 PCIe', 'T4 PCIe'),
+                          ('A40 and A40', 'A40')])
+        # a model in both tables is reported as both, gpu1 only has the FPGA fields it needs
+        self.assertEqual([(f.Description, f.SN) for f in fpgas], [])
+        custom_fields['gpu1_pci_id'] = '0000:e1:00.0'
+        _, fpgas = detector.detect(custom_fields)
+        self.assertEqual([(f.Description, f.SN) for f in fpgas], [('NVIDIA A40 PCIe', 'XFL1')])
+
+    def testOpenStackNicAllocator(self):
+        allocator = OpenStackNicAllocator('f2:ab')
+        nics = allocator.allocate('renc-w3.fabric-testbed.net', start=1, count=1999)
+        self.assertEqual(nics.mac(1), 'f2:ab:03:00:00:01')
+        self.assertEqual(nics.mac_strings()[-1], 'f2:ab:03:00:07:cf')
+        self.assertEqual(nics.vbdf_strings()[257], '0000:01:02.0')
+        self.assertEqual(nics.mac(7), WorkerNode.generate_openstack_mac('f2:ab', 'renc-w3.fabric-testbed.net', 7))
+        self.assertEqual(allocator.collisions(), {})
+        allocator.allocate('renc-w03.fabric-testbed.net', start=5, count=2)
+        self.assertEqual(allocator.collisions(), {
+            'f2:ab:03:00:00:05': ['renc-w3.fabric-testbed.net', 'renc-w03.fabric-testbed.net'],
+            'f2:ab:03:00:00:06': ['renc-w3.fabric-testbed.net', 'renc-w03.fabric-testbed.net']})
+        with self.assertRaises(RuntimeError):
+            OpenStackNicAllocator('f3:ab')
+
+    def testLabelRanges(self):
+        nics = OpenStackNicAllocator('f2:ab').allocate('renc-w3.fabric-testbed.net', start=2, count=1998)
+        self.assertEqual(compress(nics.mac_strings(), 'mac'), ['f2:ab:03:00:00:02*1998'])
+        self.assertEqual(expand(compress(nics.vbdf_strings(), 'bdf'), 'bdf'), nics.vbdf_strings())
+        vlans = ['0', '0', '0', '0', '100', '101', '7', '102']
+        self.assertEqual(compress(vlans, 'int'), ['0*4/0', '100', '101', '7', '102'])
+        # real VF BDFs roll over from function 7 to the next device
+        bdfs = [f'0000:41:{d:02x}.{f}' for d in range(2) for f in range(8)][2:] + ['0000:C1:00.0']
+        self.assertEqual(compress(bdfs, 'bdf'), ['0000:41:00.2*14', '0000:C1:00.0'])
+        self.assertEqual(expand(compress(bdfs, 'bdf'), 'bdf'), bdfs)